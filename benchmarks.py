@@ -0,0 +1,277 @@
+import argparse
+import datetime
+import random
+import threading
+import time
+import tracemalloc
+from decimal import Decimal
+
+import main
+from main import Money
+
+def timed(label, fn, repeat=5):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{label:<45} {best * 1000:>10.2f} ms   result={result}")
+    return best
+
+def bench_money_sum(args):
+    rng = random.Random(args.seed)
+    rows = [Decimal(rng.randint(1, 10_000_000)).scaleb(-2) for _ in range(args.rows)]
+    moneys = [Money.from_db(value) for value in rows]
+    cents = [money.cents for money in moneys]
+
+    print(f"Summing {args.rows:,} balances")
+    before = timed("before: float(Decimal) per row, float sum", lambda: round(sum(float(value) for value in rows), 2))
+    timed("before: Decimal sum", lambda: sum(rows, Decimal(0)))
+    timed("after: Money.from_db per row, then total", lambda: Money.total([Money.from_db(value) for value in rows]))
+    timed("after: Money objects with +", lambda: sum(moneys, Money(0)))
+    after = timed("after: Money.total", lambda: Money.total(moneys))
+    timed("after: raw integer cents sum", lambda: Money(sum(cents)))
+    print(f"Money.total speed-up over per-row float conversion: {before / after:.1f}x")
+
+def ensure_bench_user(username, password, deposit=None):
+    if main.get_user_id_by_username(username) is None:
+        main.register_user(username, password, f"Benchmark {username}", f"{username}@bench.invalid", "+10000000000", "Benchmark", datetime.date(1990, 1, 1))
+    user_id = main.get_user_id_by_username(username)
+    if deposit is not None:
+        account = main.get_user_account(user_id)
+        account.deposit(deposit)
+    return user_id
+
+def print_statement_stats():
+    for stat in main.prepared_statements.stats():
+        if stat["hits"]:
+            print(f"  {stat['name']:<28} hits={stat['hits']:>7} prepares={stat['prepares']:>4} avg={stat['avg_ms']:.3f} ms")
+
+def run_with_and_without_prepared(label, iterations, operation):
+    results = {}
+    for enabled in (False, True):
+        main.prepared_statements.enabled = enabled
+        main.prepared_statements.reset_stats()
+        main.connection_pool.close_all()
+        operation()
+        start = time.perf_counter()
+        for index in range(iterations):
+            operation(index)
+        elapsed = time.perf_counter() - start
+        results[enabled] = iterations / elapsed
+        mode = "prepared" if enabled else "plain SQL"
+        print(f"{label} ({mode}): {results[enabled]:.1f} ops/s over {iterations} iterations")
+        print_statement_stats()
+    print(f"{label} throughput gain: {results[True] / results[False]:.2f}x")
+
+def bench_prepared_transfer(args):
+    main.create_tables()
+    user_a = ensure_bench_user("bench_transfer_a", "benchpass", Money.parse(1_000_000))
+    user_b = ensure_bench_user("bench_transfer_b", "benchpass", Money.parse(1_000_000))
+    account_a = main.get_user_account(user_a).account_number
+    account_b = main.get_user_account(user_b).account_number
+    main.velocity_screen.limits = []
+
+    def transfer(index=0):
+        if index % 2:
+            main.transfer_funds(user_b, account_a, Money(1))
+        else:
+            main.transfer_funds(user_a, account_b, Money(1))
+
+    run_with_and_without_prepared("transfer_funds", args.iterations, transfer)
+
+def bench_prepared_login(args):
+    main.create_tables()
+    ensure_bench_user("bench_login", "benchpass")
+
+    def login(index=0):
+        main.login_user("bench_login", "benchpass")
+
+    run_with_and_without_prepared("login_user", args.iterations, login)
+
+def bench_memory_transfer(args):
+    storage = main.MemoryStorage(password_rounds=4)
+    for username in ("bench_memory_a", "bench_memory_b"):
+        storage.register_user(username, "benchpass", f"Benchmark {username}", f"{username}@bench.invalid", "+10000000000", "Benchmark", datetime.date(1990, 1, 1))
+    user_a = storage.get_user_id_by_username("bench_memory_a")
+    user_b = storage.get_user_id_by_username("bench_memory_b")
+    storage.deposit_funds(user_a, Money.parse(1_000_000))
+    storage.deposit_funds(user_b, Money.parse(1_000_000))
+    account_a = storage.get_user_account(user_a).account_number
+    account_b = storage.get_user_account(user_b).account_number
+    main.velocity_screen.limits = []
+
+    start = time.perf_counter()
+    for index in range(args.iterations):
+        if index % 2:
+            storage.transfer_funds(user_b, account_a, Money(1))
+        else:
+            storage.transfer_funds(user_a, account_b, Money(1))
+    elapsed = time.perf_counter() - start
+    total = storage.get_user_account(user_a).balance + storage.get_user_account(user_b).balance
+    print(f"transfer_funds (memory): {args.iterations / elapsed:.1f} ops/s over {args.iterations} iterations; total balance ${total:.2f}")
+
+def bench_identity_lookup(args):
+    main.create_tables()
+    ensure_bench_user("bench_lookup", "benchpass")
+    cache = main.identity_caches["user_id_by_username"]
+    default_size = cache.max_size
+    results = {}
+    for size in (0, default_size):
+        cache.max_size = size
+        cache.clear()
+        start = time.perf_counter()
+        for _ in range(args.iterations):
+            main.get_user_id_by_username("bench_lookup")
+        elapsed = time.perf_counter() - start
+        results[size] = args.iterations / elapsed
+        mode = "cached" if size else "uncached"
+        print(f"get_user_id_by_username ({mode}): {results[size]:.1f} ops/s over {args.iterations} iterations")
+    print(f"  {cache.stats()}")
+    print(f"Identity cache throughput gain: {results[default_size] / results[0]:.1f}x")
+
+def bench_pos_authorizations(args):
+    storage = main.MemoryStorage(password_rounds=4) if args.memory else main.storage
+    if not args.memory:
+        main.create_tables()
+    cards = []
+    for index in range(args.cardholders):
+        username = f"bench_pos_{index}"
+        if storage.get_user_id_by_username(username) is None:
+            storage.register_user(username, "benchpass", f"Benchmark {username}", f"{username}@bench.invalid", "+10000000000", "Benchmark", datetime.date(1990, 1, 1))
+        user_id = storage.get_user_id_by_username(username)
+        storage.deposit_funds(user_id, Money.parse(1_000_000))
+        if not list(storage.iter_cards(user_id)):
+            storage.generate_card(user_id, 'credit' if index % 4 == 0 else 'debit')
+        cards.extend((card.card_number, card.expiry_date, card.cvv) for card in storage.iter_cards(user_id))
+    if not args.memory:
+        print(f"Card index warmed with {main.card_index.warm()} cards")
+
+    results = {"approved": 0, "declined": 0}
+    lock = threading.Lock()
+
+    def terminal(seed):
+        rng = random.Random(seed)
+        approved = declined = 0
+        for _ in range(args.iterations):
+            card_number, expiry, cvv = rng.choice(cards)
+            success, _ = storage.authorize(card_number, expiry, cvv, Money(rng.randint(100, 5000)), f"Merchant {rng.randint(1, 50)}")
+            if success:
+                approved += 1
+            else:
+                declined += 1
+        with lock:
+            results["approved"] += approved
+            results["declined"] += declined
+
+    threads = [threading.Thread(target=terminal, args=(args.seed + index,)) for index in range(args.terminals)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    total = results["approved"] + results["declined"]
+    print(f"{total} authorizations from {args.terminals} terminals in {elapsed:.2f}s: {total / elapsed:.1f} auth/s "
+          f"({results['approved']} approved, {results['declined']} declined)")
+    if not args.memory:
+        print(f"Card index hits={main.card_index.hits} misses={main.card_index.misses}")
+        print_statement_stats()
+
+def bench_row_memory(args):
+    rng = random.Random(args.seed)
+    types = ("deposit", "withdrawal", "transfer_in", "transfer_out", "bill_payment", "card_payment")
+    start = datetime.datetime(2024, 1, 1)
+
+    def driver_rows():
+        for index in range(args.rows):
+            yield rng.choice(types), Decimal(rng.randint(1, 10_000_000)).scaleb(-2), start + datetime.timedelta(seconds=index * 37)
+
+    print(f"Holding a {args.rows:,}-row transaction history export in memory")
+    results = {}
+    for label, build in (
+        ("before: list of driver tuples", lambda: list(driver_rows())),
+        ("after: list of TransactionRow", lambda: [main.TransactionRow(*row) for row in driver_rows()]),
+        ("after: TransactionBatch columns", lambda: main.TransactionBatch(driver_rows())),
+    ):
+        rng.seed(args.seed)
+        tracemalloc.start()
+        rows = build()
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        started = time.perf_counter()
+        for row in rows:
+            [column.formatter(value) for column, value in zip(main.TRANSACTION_COLUMNS, row)]
+        elapsed = time.perf_counter() - started
+        results[label] = current
+        print(f"{label:<45} {current / 1_048_576:>8.1f} MiB  {current / args.rows:>6.1f} B/row   format {elapsed:.2f} s")
+        del rows
+    before = results["before: list of driver tuples"]
+    after = results["after: TransactionBatch columns"]
+    print(f"Column batch saves {(before - after) / 1_048_576:.1f} MiB ({before / after:.1f}x smaller)")
+
+def seed_interest_accounts(count, batch=1_000_000):
+    conn = main.get_db_connection(budget="batch")
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT COUNT(*) FROM users WHERE username LIKE 'bench_interest_%';")
+        seeded = cur.fetchone()[0]
+        while seeded < count:
+            last = min(seeded + batch, count)
+            cur.execute("""
+                WITH seeded AS (
+                    INSERT INTO users (username, password_hash, full_name)
+                    SELECT 'bench_interest_' || n, 'x', 'Benchmark interest ' || n FROM generate_series(%s, %s) AS n
+                    RETURNING id
+                )
+                INSERT INTO accounts (user_id, account_number, balance)
+                SELECT id, 'bi' || id, (id::bigint * 7919 %% 20000000) / 100.0 FROM seeded;
+            """, (seeded + 1, last))
+            conn.commit()
+            seeded = last
+            print(f"Seeded {seeded:,} of {count:,} benchmark accounts", flush=True)
+        cur.execute("SELECT COUNT(*) FROM accounts;")
+        total_accounts = cur.fetchone()[0]
+        cur.execute("SELECT COALESCE(MAX(accrual_date) + 1, DATE '2000-01-01') FROM interest_runs;")
+        accrual_date = cur.fetchone()[0]
+        return total_accounts, accrual_date
+    finally:
+        cur.close()
+        conn.close()
+
+def bench_interest_accrual(args):
+    main.create_tables()
+    total_accounts, accrual_date = seed_interest_accounts(args.accounts)
+    print(f"Accruing interest for {accrual_date} over {total_accounts:,} accounts in chunks of {args.chunk_size:,}")
+    success, message = main.accrue_interest(accrual_date, args.chunk_size)
+    print(message)
+
+BENCHMARKS = {
+    "money-sum": bench_money_sum,
+    "prepared-transfer": bench_prepared_transfer,
+    "prepared-login": bench_prepared_login,
+    "memory-transfer": bench_memory_transfer,
+    "identity-lookup": bench_identity_lookup,
+    "pos-authorizations": bench_pos_authorizations,
+    "row-memory": bench_row_memory,
+    "interest-accrual": bench_interest_accrual,
+}
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="ZeldaCLI micro-benchmarks")
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS))
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--terminals", type=int, default=16, help="Concurrent POS terminals for pos-authorizations.")
+    parser.add_argument("--cardholders", type=int, default=50, help="Cardholders for pos-authorizations.")
+    parser.add_argument("--memory", action="store_true", help="Run pos-authorizations against the in-memory storage engine.")
+    parser.add_argument("--accounts", type=int, default=1_000_000, help="Accounts to seed for interest-accrual.")
+    parser.add_argument("--chunk-size", type=int, default=10_000, help="Accounts per statement for interest-accrual.")
+    args = parser.parse_args()
+    BENCHMARKS[args.benchmark](args)
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,270 @@
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import random
+import threading
+import time
+import uuid
+
+import main
+from main import Money
+
+DEFAULT_PROFILE = {
+    "login": 5,
+    "register": 1,
+    "deposit": 15,
+    "withdraw": 10,
+    "transfer": 30,
+    "request": 10,
+    "respond": 10,
+    "pay_bill": 10,
+    "loan_payment": 9,
+}
+SESSION_PASSWORD = "loadsim-password"
+
+def parse_profile(value):
+    if os.path.exists(value):
+        with open(value) as profile_file:
+            profile = json.load(profile_file)
+    else:
+        profile = {}
+        for part in value.split(","):
+            name, _, weight = part.partition("=")
+            profile[name.strip()] = float(weight)
+    unknown = set(profile) - set(DEFAULT_PROFILE)
+    if unknown:
+        raise argparse.ArgumentTypeError(f"Unknown operations in profile: {', '.join(sorted(unknown))}")
+    return {name: weight for name, weight in profile.items() if weight > 0}
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def register_session(run_id, index, initial_balance):
+    username = f"ls{run_id}_{index}"
+    success, message = main.register_user(username, SESSION_PASSWORD, f"Load Session {index}", f"{username}@loadsim.invalid",
+                                          "+10000000000", "Load simulator", datetime.date(1990, 1, 1))
+    if not success:
+        raise RuntimeError(f"Could not register {username}: {message}")
+    user_id = main.get_user_id_by_username(username)
+    account = main.get_user_account(user_id)
+    if initial_balance and not account.deposit(initial_balance):
+        raise RuntimeError(f"Could not fund {username}")
+    main.apply_for_loan(user_id, Money.parse(100_000), 0.05, 120)
+    return {"user_id": user_id, "username": username, "account_number": account.account_number}
+
+def setup_worker(run_id, indexes, initial_balance):
+    return [register_session(run_id, index, Money(initial_balance)) for index in indexes]
+
+class Session:
+    def __init__(self, session, peers, run_id, rng):
+        self.user_id = session["user_id"]
+        self.username = session["username"]
+        self.peers = [peer for peer in peers if peer["user_id"] != self.user_id]
+        self.run_id = run_id
+        self.rng = rng
+        self.net_external = 0
+        self.extra_user_ids = []
+        self.loan_id = None
+
+    def amount(self):
+        return Money(self.rng.randint(100, 5000))
+
+    def peer(self):
+        return self.rng.choice(self.peers)
+
+    def op_login(self):
+        user_id, _, message = main.login_user(self.username, SESSION_PASSWORD)
+        return user_id is not None, message
+
+    def op_register(self):
+        username = f"ls{self.run_id}_x{uuid.uuid4().hex[:10]}"
+        success, message = main.register_user(username, SESSION_PASSWORD, "Load Extra", f"{username}@loadsim.invalid",
+                                              "+10000000000", "Load simulator", datetime.date(1990, 1, 1))
+        if success:
+            self.extra_user_ids.append(main.get_user_id_by_username(username))
+        return success, message
+
+    def op_deposit(self):
+        amount = self.amount()
+        account = main.get_user_account(self.user_id)
+        if account is None or not account.deposit(amount):
+            return False, "deposit failed"
+        self.net_external += amount.cents
+        main.record_transaction(account.account_id, 'deposit', amount)
+        return True, "deposited"
+
+    def op_withdraw(self):
+        amount = self.amount()
+        account = main.get_user_account(self.user_id)
+        if account is None:
+            return False, "withdraw rejected"
+        success, reason = account.withdraw(amount)
+        if not success:
+            return False, reason
+        self.net_external -= amount.cents
+        main.record_transaction(account.account_id, 'withdraw', amount)
+        return True, "withdrew"
+
+    def op_transfer(self):
+        return main.transfer_funds(self.user_id, self.peer()["account_number"], self.amount(), main.new_idempotency_key())
+
+    def op_request(self):
+        return main.request_money(self.user_id, self.peer()["username"], self.amount())
+
+    def op_respond(self):
+        pending = list(main.iter_money_requests(self.user_id))
+        if not pending:
+            return False, "no pending requests"
+        action = 'accept' if self.rng.random() < 0.7 else 'decline'
+        return main.respond_to_money_request(self.rng.choice(pending).request_id, self.user_id, action, main.new_idempotency_key())
+
+    def op_pay_bill(self):
+        amount = self.amount()
+        success, message = main.add_bill(self.user_id, "Load bill", datetime.date.today(), amount)
+        if not success:
+            return success, message
+        bill_id = max(bill.bill_id for bill in main.get_user_bills(self.user_id) if bill.status == 'pending')
+        success, message = main.pay_bill(self.user_id, bill_id, main.new_idempotency_key())
+        if success:
+            self.net_external -= amount.cents
+        return success, message
+
+    def op_loan_payment(self):
+        if self.loan_id is None:
+            loans = [loan for loan in main.iter_loans(self.user_id) if loan.status == 'active']
+            if not loans:
+                return False, "no active loan"
+            self.loan_id = loans[0].loan_id
+        return main.make_loan_payment(self.user_id, self.loan_id, Money(self.rng.randint(100, 1000)), main.new_idempotency_key())
+
+def run_session(session, peers, run_id, profile, operations, think_time, seed, results, lock):
+    rng = random.Random(seed)
+    simulated = Session(session, peers, run_id, rng)
+    names = list(profile)
+    weights = [profile[name] for name in names]
+    latencies = {name: [] for name in names}
+    failures = {name: 0 for name in names}
+    errors = 0
+    for _ in range(operations):
+        name = rng.choices(names, weights)[0]
+        start = time.perf_counter()
+        try:
+            success, _ = getattr(simulated, f"op_{name}")()
+        except Exception:
+            success = False
+            errors += 1
+        latencies[name].append(time.perf_counter() - start)
+        if not success:
+            failures[name] += 1
+        if think_time:
+            time.sleep(rng.uniform(0, think_time))
+    with lock:
+        for name in names:
+            results["latencies"].setdefault(name, []).extend(latencies[name])
+            results["failures"][name] = results["failures"].get(name, 0) + failures[name]
+        results["errors"] += errors
+        results["net_external"] += simulated.net_external
+        results["extra_user_ids"].extend(simulated.extra_user_ids)
+
+def run_worker(run_id, sessions, peers, profile, operations, think_time, seed):
+    results = {"latencies": {}, "failures": {}, "errors": 0, "net_external": 0, "extra_user_ids": []}
+    lock = threading.Lock()
+    threads = [
+        threading.Thread(target=run_session, args=(session, peers, run_id, profile, operations, think_time, seed + session["user_id"], results, lock))
+        for session in sessions
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    main.connection_pool.close_all()
+    return results
+
+def check_invariants(user_ids, expected_total_cents):
+    conn = main.get_db_connection()
+    if conn is None:
+        print("Could not connect to the database to check invariants.")
+        return False
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT COALESCE(SUM(balance), 0), COALESCE(MIN(balance), 0) FROM accounts WHERE user_id = ANY(%s);", (user_ids,))
+        total, minimum = cur.fetchone()
+        cur.execute("SELECT COUNT(*) FROM accounts WHERE balance < 0;")
+        negative_accounts = cur.fetchone()[0]
+    finally:
+        cur.close()
+        conn.close()
+    total = Money.from_db(total)
+    expected = Money(expected_total_cents)
+    print(f"Total balance: ${total:.2f} (expected ${expected:.2f})")
+    print(f"Lowest simulated balance: ${Money.from_db(minimum):.2f}; accounts below zero: {negative_accounts}")
+    conserved = total == expected
+    print(f"Money conserved: {'yes' if conserved else 'NO'}")
+    print(f"No negative balances: {'yes' if negative_accounts == 0 else 'NO'}")
+    return conserved and negative_accounts == 0
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Simulate many concurrent ZeldaCLI customers and check ledger invariants.")
+    parser.add_argument("--sessions", type=int, default=100)
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--operations", type=int, default=50, help="Operations per session.")
+    parser.add_argument("--profile", type=parse_profile, default=DEFAULT_PROFILE,
+                        help="Workload weights as a JSON file or 'transfer=30,deposit=15,...'.")
+    parser.add_argument("--initial-balance", type=int, default=100_000, help="Starting balance per session, in cents.")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Maximum random pause between operations, in seconds.")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    main.create_tables()
+    run_id = uuid.uuid4().hex[:8]
+    processes = max(1, min(args.processes, args.sessions))
+    chunks = [list(range(args.sessions))[index::processes] for index in range(processes)]
+    context = multiprocessing.get_context("spawn")
+
+    print(f"Run {run_id}: registering {args.sessions} sessions across {processes} processes...")
+    with context.Pool(processes) as pool:
+        sessions = [session for chunk in pool.starmap(setup_worker, [(run_id, chunk, args.initial_balance) for chunk in chunks]) for session in chunk]
+        session_chunks = [sessions[index::processes] for index in range(processes)]
+
+        print(f"Running {args.operations} operations per session with profile {args.profile}...")
+        start = time.perf_counter()
+        worker_results = pool.starmap(run_worker, [
+            (run_id, chunk, sessions, args.profile, args.operations, args.think_time, args.seed)
+            for chunk in session_chunks
+        ])
+        elapsed = time.perf_counter() - start
+
+    latencies = {}
+    failures = {}
+    errors = 0
+    net_external = 0
+    user_ids = [session["user_id"] for session in sessions]
+    for result in worker_results:
+        for name, values in result["latencies"].items():
+            latencies.setdefault(name, []).extend(values)
+        for name, count in result["failures"].items():
+            failures[name] = failures.get(name, 0) + count
+        errors += result["errors"]
+        net_external += result["net_external"]
+        user_ids.extend(result["extra_user_ids"])
+
+    total_operations = sum(len(values) for values in latencies.values())
+    print(f"\n{total_operations} operations in {elapsed:.2f}s: {total_operations / elapsed:.1f} ops/s ({errors} raised exceptions)")
+    print(f"{'operation':<14}{'count':>8}{'failed':>8}{'ops/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name in sorted(latencies):
+        values = sorted(latencies[name])
+        print(f"{name:<14}{len(values):>8}{failures.get(name, 0):>8}{len(values) / elapsed:>10.1f}"
+              f"{percentile(values, 0.50) * 1000:>10.1f}{percentile(values, 0.95) * 1000:>10.1f}"
+              f"{percentile(values, 0.99) * 1000:>10.1f}{values[-1] * 1000:>10.1f}")
+
+    print()
+    expected_total = args.initial_balance * args.sessions + net_external
+    return 0 if check_invariants(user_ids, expected_total) else 1
+
+if __name__ == "__main__":
+    raise SystemExit(main_cli())
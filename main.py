@@ -1,18 +1,357 @@
 import os
+import abc
+import argparse
+import atexit
+import base64
+import contextlib
+import csv
+import getpass
+import gzip
+import hashlib
+import hmac
+import itertools
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import multiprocessing
+import operator
+import queue
+from collections import OrderedDict
+from array import array
+import subprocess
+import sys
 import psycopg2
+from psycopg2 import sql
+from psycopg2.extras import Json, execute_values, wait_select
 from dotenv import load_dotenv
 import bcrypt
+import contextvars
 import random
 import datetime
 import re
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+import json
+import secrets
+import select
+import shutil
+import socket
+import socketserver
+import tempfile
+import threading
+import time
+import uuid
 load_dotenv()
 
+MONEY_REQUEST_CHANNEL = "money_requests"
+MONEY_ISOLATION_LEVEL = os.getenv("MONEY_ISOLATION_LEVEL", "READ COMMITTED").upper()
+MONEY_MAX_RETRIES = int(os.getenv("MONEY_MAX_RETRIES", "5"))
+MONEY_RETRY_BASE_DELAY = float(os.getenv("MONEY_RETRY_BASE_DELAY", "0.05"))
+RETRYABLE_DB_ERRORS = (psycopg2.errors.SerializationFailure, psycopg2.errors.DeadlockDetected)
+CONNECTION_DB_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError)
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+REPLICA_RETRY_SECONDS = float(os.getenv("REPLICA_RETRY_SECONDS", "30"))
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+TRANSACTION_PARTITION_MONTHS_AHEAD = int(os.getenv("TRANSACTION_PARTITION_MONTHS_AHEAD", "3"))
+TRANSACTION_HISTORY_DAYS = int(os.getenv("TRANSACTION_HISTORY_DAYS", "90"))
+PUBLIC_FEED_DAYS = int(os.getenv("PUBLIC_FEED_DAYS", "30"))
+OUTPUT_FORMATS = ("table", "csv", "json")
+OUTPUT_FORMAT = os.getenv("OUTPUT_FORMAT", "table")
+PAGER = os.getenv("PAGER", "less -FRX")
+STREAM_FETCH_SIZE = int(os.getenv("STREAM_FETCH_SIZE", "500"))
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "3"))
+DB_POOL_PING_AFTER = float(os.getenv("DB_POOL_PING_AFTER", "30"))
+DB_CONNECT_RETRIES = int(os.getenv("DB_CONNECT_RETRIES", "2"))
+DB_CONNECT_RETRY_DELAY = float(os.getenv("DB_CONNECT_RETRY_DELAY", "0.2"))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "3"))
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "15"))
+DEGRADED_CACHE_SIZE = int(os.getenv("DEGRADED_CACHE_SIZE", "1000"))
+DEGRADED_CACHE_ROWS = int(os.getenv("DEGRADED_CACHE_ROWS", "500"))
+DEGRADED_CACHE_TTL = float(os.getenv("DEGRADED_CACHE_TTL", "3600"))
+STATEMENT_TIMEOUTS = {
+    "lookup": int(os.getenv("STATEMENT_TIMEOUT_LOOKUP_MS", "2000")),
+    "default": int(os.getenv("STATEMENT_TIMEOUT_DEFAULT_MS", "15000")),
+    "export": int(os.getenv("STATEMENT_TIMEOUT_EXPORT_MS", "300000")),
+    "batch": int(os.getenv("STATEMENT_TIMEOUT_BATCH_MS", "1800000")),
+}
+USE_PREPARED_STATEMENTS = os.getenv("USE_PREPARED_STATEMENTS", "1") == "1"
+VELOCITY_LIMITS = os.getenv("VELOCITY_LIMITS", "minute:5:2000,hour:30:10000,day:100:25000")
+VELOCITY_FLAG_RATIO = float(os.getenv("VELOCITY_FLAG_RATIO", "0.8"))
+SCREENING_LOG_FILE = os.getenv("SCREENING_LOG_FILE", "screening.log")
+AUDIT_QUEUE_SIZE = int(os.getenv("AUDIT_QUEUE_SIZE", "10000"))
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "500"))
+AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", "1.0"))
+AUDIT_ENQUEUE_TIMEOUT = float(os.getenv("AUDIT_ENQUEUE_TIMEOUT", "0.05"))
+DAEMON_RUNTIME_DIR = os.getenv("XDG_RUNTIME_DIR") or os.path.join(tempfile.gettempdir(), f"zeldacli-{getpass.getuser()}")
+DAEMON_SOCKET = os.getenv("DAEMON_SOCKET", os.path.join(DAEMON_RUNTIME_DIR, "zeldacli.sock"))
+CLIENT_SESSION_FILE = os.getenv("CLIENT_SESSION_FILE", os.path.join(os.path.expanduser("~"), ".zeldacli_session"))
+SESSION_SECRET = os.getenv("SESSION_SECRET", "")
+SESSION_SECRET_FILE = os.getenv("SESSION_SECRET_FILE", os.path.join(os.path.expanduser("~"), ".zeldacli_session_key"))
+SESSION_TTL = float(os.getenv("SESSION_TTL", "43200"))
+SESSION_REVOCATION_TTL = float(os.getenv("SESSION_REVOCATION_TTL", "30"))
+SESSION_SECRET_MIN_BYTES = 32
+IDENTITY_CACHE_SIZE = int(os.getenv("IDENTITY_CACHE_SIZE", "10000"))
+IDENTITY_CACHE_TTL = float(os.getenv("IDENTITY_CACHE_TTL", "300"))
+DASHBOARD_CACHE_TTL = float(os.getenv("DASHBOARD_CACHE_TTL", "60"))
+DASHBOARD_BILLS = int(os.getenv("DASHBOARD_BILLS", "3"))
+INTEREST_TIERS = os.getenv("INTEREST_TIERS", "0:0.005,10000:0.01,100000:0.015")
+CARD_CREDIT_LIMIT = os.getenv("CARD_CREDIT_LIMIT", "5000")
+CARD_MAX_FAILED_CHECKS = int(os.getenv("CARD_MAX_FAILED_CHECKS", "3"))
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "postgres")
+DATABASE_SHARD_URLS = [url.strip() for url in os.getenv("DATABASE_SHARD_URLS", "").split(",") if url.strip()]
+SHARD_ROUTE_TTL = float(os.getenv("SHARD_ROUTE_TTL", "5"))
+SHARD_PREPARED_TIMEOUT = float(os.getenv("SHARD_PREPARED_TIMEOUT", "60"))
+SHARD_SWEEP_INTERVAL = float(os.getenv("SHARD_SWEEP_INTERVAL", "30"))
+SHARD_ROUTE_ATTEMPTS = 3
+SHARD_BUCKETS = 256
+SHARD_ID_STRIDE = 16
+SHARD_GID_PREFIX = "zelda_"
+SHARD_UNROUTABLE = ""
+VELOCITY_WINDOWS = {"minute": (60, 6), "hour": (3600, 12), "day": (86400, 24)}
+VELOCITY_GUARD_STRIPES = 64
+CREDIT_TRANSACTION_TYPES = ("deposit", "transfer_in", "interest")
+
+screening_logger = logging.getLogger("zeldacli.screening")
+if SCREENING_LOG_FILE and not screening_logger.handlers:
+    screening_handler = logging.FileHandler(SCREENING_LOG_FILE, delay=True)
+    screening_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+    screening_logger.addHandler(screening_handler)
+    screening_logger.setLevel(logging.INFO)
+    screening_logger.propagate = False
+
+audit_logger = logging.getLogger("zeldacli.audit")
+daemon_logger = logging.getLogger("zeldacli.daemon")
+
+current_session = contextvars.ContextVar("current_session", default=None)
+current_shard = contextvars.ContextVar("current_shard", default=None)
+
+@contextlib.contextmanager
+def on_shard(dsn):
+    token = current_shard.set(dsn)
+    try:
+        yield dsn
+    finally:
+        current_shard.reset(token)
+
+def iter_on_shard(dsn, rows):
+    try:
+        while True:
+            with on_shard(dsn):
+                try:
+                    row = next(rows)
+                except StopIteration:
+                    return
+            yield row
+    finally:
+        close_rows = getattr(rows, "close", None)
+        if close_rows is not None:
+            close_rows()
+
+class Money:
+    __slots__ = ("cents",)
+
+    def __init__(self, cents=0):
+        self.cents = int(cents)
+
+    @classmethod
+    def parse(cls, value):
+        if isinstance(value, Money):
+            return value
+        if isinstance(value, int):
+            return cls(value * 100)
+        try:
+            amount = Decimal(str(value).strip())
+        except InvalidOperation:
+            raise ValueError(f"Invalid money amount: {value!r}")
+        if not amount.is_finite():
+            raise ValueError(f"Invalid money amount: {value!r}")
+        return cls(int((amount * 100).to_integral_value(rounding=ROUND_HALF_UP)))
+
+    @classmethod
+    def from_db(cls, value):
+        if value is None:
+            return None
+        return cls(int(value.scaleb(2)))
+
+    @classmethod
+    def total(cls, amounts):
+        return cls(sum(amount.cents for amount in amounts))
+
+    def to_decimal(self):
+        return Decimal(self.cents).scaleb(-2)
+
+    def _coerce(self, other):
+        if isinstance(other, Money):
+            return other.cents
+        if isinstance(other, int):
+            return other * 100
+        if isinstance(other, (float, Decimal)):
+            cents = Decimal(other).scaleb(2)
+            if not cents.is_finite() or cents != cents.to_integral_value():
+                return NotImplemented
+            return int(cents)
+        return NotImplemented
+
+    def __add__(self, other):
+        other_cents = self._coerce(other)
+        if other_cents is NotImplemented:
+            return NotImplemented
+        return Money(self.cents + other_cents)
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        other_cents = self._coerce(other)
+        if other_cents is NotImplemented:
+            return NotImplemented
+        return Money(self.cents - other_cents)
+
+    def __rsub__(self, other):
+        other_cents = self._coerce(other)
+        if other_cents is NotImplemented:
+            return NotImplemented
+        return Money(other_cents - self.cents)
+
+    def __mul__(self, factor):
+        if isinstance(factor, int):
+            return Money(self.cents * factor)
+        if isinstance(factor, (float, Decimal)):
+            return Money(int((Decimal(self.cents) * Decimal(str(factor))).to_integral_value(rounding=ROUND_HALF_UP)))
+        return NotImplemented
+
+    __rmul__ = __mul__
+
+    def __neg__(self):
+        return Money(-self.cents)
+
+    def __abs__(self):
+        return Money(abs(self.cents))
+
+    def __bool__(self):
+        return self.cents != 0
+
+    def __eq__(self, other):
+        other_cents = self._coerce(other)
+        if other_cents is NotImplemented:
+            return NotImplemented
+        return self.cents == other_cents
+
+    def __hash__(self):
+        return hash(self.to_decimal())
+
+    def __lt__(self, other):
+        other_cents = self._coerce(other)
+        if other_cents is NotImplemented:
+            return NotImplemented
+        return self.cents < other_cents
+
+    def __le__(self, other):
+        other_cents = self._coerce(other)
+        if other_cents is NotImplemented:
+            return NotImplemented
+        return self.cents <= other_cents
+
+    def __gt__(self, other):
+        other_cents = self._coerce(other)
+        if other_cents is NotImplemented:
+            return NotImplemented
+        return self.cents > other_cents
+
+    def __ge__(self, other):
+        other_cents = self._coerce(other)
+        if other_cents is NotImplemented:
+            return NotImplemented
+        return self.cents >= other_cents
+
+    def __str__(self):
+        sign = "-" if self.cents < 0 else ""
+        units, cents = divmod(abs(self.cents), 100)
+        return f"{sign}{units}.{cents:02d}"
+
+    def __repr__(self):
+        return f"Money('{self}')"
+
+    def __format__(self, spec):
+        if spec in ("", ".2f"):
+            return str(self)
+        return format(self.to_decimal(), spec)
+
+psycopg2.extensions.register_adapter(Money, lambda money: psycopg2.extensions.adapt(money.to_decimal()))
+
+class Record:
+    __slots__ = ()
+
+    def __init_subclass__(cls):
+        cls.fields = operator.attrgetter(*cls.__slots__)
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    def __iter__(self):
+        return iter(self.fields(self))
+
+    def __len__(self):
+        return len(self.__slots__)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(f'{name}={getattr(self, name)!r}' for name in self.__slots__)})"
+
+class TransactionRow(Record):
+    __slots__ = ("type", "amount", "timestamp")
+
+class PublicTransactionRow(Record):
+    __slots__ = ("type", "amount", "timestamp", "username")
+
+class CardRow(Record):
+    __slots__ = ("card_type", "card_number", "expiry_date", "cvv")
+
+class LoanRow(Record):
+    __slots__ = ("loan_id", "amount", "interest_rate", "term_months", "start_date", "remaining_balance", "status")
+
+class BillRow(Record):
+    __slots__ = ("bill_id", "bill_name", "due_date", "amount", "status")
+
+class MoneyRequestRow(Record):
+    __slots__ = ("request_id", "from_username", "amount", "request_date")
+
+class DashboardSummary(Record):
+    __slots__ = ("account_number", "balance", "pending_requests", "pending_amount", "upcoming_bills", "active_loans", "loan_balance", "card_count")
+
+class TransactionBatch:
+    epoch = datetime.datetime(1970, 1, 1)
+
+    def __init__(self, rows=()):
+        self.type_names = []
+        self.type_codes = {}
+        self.types = array("B")
+        self.amounts = array("q")
+        self.timestamps = array("q")
+        for row in rows:
+            self.append(row)
+
+    def append(self, row):
+        type, amount, timestamp = row
+        code = self.type_codes.get(type)
+        if code is None:
+            code = self.type_codes[type] = len(self.type_names)
+            self.type_names.append(type)
+        self.types.append(code)
+        self.amounts.append(Money.parse(amount).cents)
+        self.timestamps.append((timestamp - self.epoch) // datetime.timedelta(microseconds=1))
+
+    def __len__(self):
+        return len(self.amounts)
+
+    def __iter__(self):
+        for code, cents, microseconds in zip(self.types, self.amounts, self.timestamps):
+            yield TransactionRow(self.type_names[code], Money(cents), self.epoch + datetime.timedelta(microseconds=microseconds))
+
 class BankAccount:
-    def __init__(self, account_id, user_id, account_number, balance=0.0):
+    def __init__(self, account_id, user_id, account_number, balance=None):
         self.account_id = account_id
         self.user_id = user_id
         self.account_number = account_number
-        self.balance = balance
+        self.balance = balance if balance is not None else Money(0)
 
     def save_balance(self):
         conn = get_db_connection()
@@ -35,41 +374,806 @@ class BankAccount:
             cur.close()
             conn.close()
 
+    def apply_balance_change(self, delta):
+        conn = get_db_connection()
+        if conn is None:
+            return False
+        cur = conn.cursor()
+        try:
+            cur.execute("UPDATE accounts SET balance = balance + %s WHERE id = %s AND balance + %s >= 0 RETURNING balance;",
+                        (delta, self.account_id, delta))
+            row = cur.fetchone()
+            conn.commit()
+            if row is None:
+                return False
+            self.balance = Money.from_db(row[0])
+            return True
+        except psycopg2.Error as e:
+            conn.rollback()
+            print_message(f"Database error updating balance: {e}", "error")
+            return False
+        finally:
+            cur.close()
+            conn.close()
+
     def deposit(self, amount):
+        amount = Money.parse(amount)
         if amount > 0:
-            self.balance += amount
-            self.save_balance()
-            return True
+            return self.apply_balance_change(amount)
         else:
             return False
 
     def withdraw(self, amount):
-        if 0 < amount <= self.balance:
-            self.balance -= amount
-            self.save_balance()
-            return True
-        else:
-            return False
+        amount = Money.parse(amount)
+        if not 0 < amount <= self.balance:
+            return False, "Invalid withdrawal amount or insufficient balance."
+        with velocity_screen.guard(self.user_id):
+            allowed, reason = velocity_screen.check(self.user_id, amount, 'withdraw')
+            if not allowed:
+                return False, reason
+            if not self.apply_balance_change(-amount):
+                return False, "Invalid withdrawal amount or insufficient balance."
+            velocity_screen.record(self.user_id, amount)
+            return True, ""
 
     def get_balance(self):
         return self.balance
 
+class SlidingWindowCounter:
+    __slots__ = ("bucket_seconds", "counts", "amounts", "last_bucket", "count", "amount")
+
+    def __init__(self, window_seconds, buckets):
+        self.bucket_seconds = window_seconds // buckets
+        self.counts = array("q", [0]) * buckets
+        self.amounts = array("q", [0]) * buckets
+        self.last_bucket = 0
+        self.count = 0
+        self.amount = 0
+
+    def _advance(self, bucket):
+        size = len(self.counts)
+        if bucket - self.last_bucket >= size:
+            for index in range(size):
+                self.counts[index] = 0
+                self.amounts[index] = 0
+            self.count = 0
+            self.amount = 0
+        else:
+            for expired in range(self.last_bucket + 1, bucket + 1):
+                index = expired % size
+                self.count -= self.counts[index]
+                self.amount -= self.amounts[index]
+                self.counts[index] = 0
+                self.amounts[index] = 0
+        self.last_bucket = bucket
+
+    def totals(self, now):
+        bucket = int(now // self.bucket_seconds)
+        if bucket > self.last_bucket:
+            self._advance(bucket)
+        return self.count, self.amount
+
+    def add(self, cents, at):
+        bucket = int(at // self.bucket_seconds)
+        if bucket > self.last_bucket:
+            self._advance(bucket)
+        elif bucket <= self.last_bucket - len(self.counts):
+            return
+        index = bucket % len(self.counts)
+        self.counts[index] += 1
+        self.amounts[index] += cents
+        self.count += 1
+        self.amount += cents
+
+def parse_velocity_limits(value):
+    limits = []
+    for part in value.split(","):
+        if not part.strip():
+            continue
+        window, max_count, max_amount = part.strip().split(":")
+        window_seconds, buckets = VELOCITY_WINDOWS[window]
+        limits.append((window, window_seconds, buckets, int(max_count), Money.parse(max_amount)))
+    return limits
+
+class VelocityScreen:
+    def __init__(self, limits, flag_ratio=VELOCITY_FLAG_RATIO):
+        self.limits = limits
+        self.flag_ratio = flag_ratio
+        self._counters = {}
+        self._guards = [threading.RLock() for _ in range(VELOCITY_GUARD_STRIPES)]
+        self._lock = threading.Lock()
+
+    def _new_counters(self):
+        return [SlidingWindowCounter(window_seconds, buckets) for _, window_seconds, buckets, _, _ in self.limits]
+
+    def _counters_for(self, user_id):
+        counters = self._counters.get(user_id)
+        if counters is None:
+            counters = self._counters[user_id] = self._new_counters()
+        return counters
+
+    def guard(self, user_id):
+        if not self.limits:
+            return contextlib.nullcontext()
+        return self._guards[hash(user_id) % len(self._guards)]
+
+    def check(self, user_id, amount, operation, now=None):
+        if not self.limits:
+            return True, ""
+        now = now if now is not None else time.monotonic()
+        cents = Money.parse(amount).cents
+        with self._lock:
+            counters = self._counters_for(user_id)
+            for (window, _, _, max_count, max_amount), counter in zip(self.limits, counters):
+                count, total = counter.totals(now)
+                if count + 1 > max_count or total + cents > max_amount.cents:
+                    screening_logger.warning("blocked operation=%s user_id=%s amount=%s window=%s count=%s total=%s",
+                                             operation, user_id, Money(cents), window, count, Money(total))
+                    return False, f"Velocity limit reached: at most {max_count} withdrawals/transfers or ${max_amount:.2f} per {window}."
+                if count + 1 > max_count * self.flag_ratio or total + cents > max_amount.cents * self.flag_ratio:
+                    screening_logger.info("flagged operation=%s user_id=%s amount=%s window=%s count=%s total=%s",
+                                          operation, user_id, Money(cents), window, count, Money(total))
+        return True, ""
+
+    def record(self, user_id, amount, at=None):
+        if not self.limits:
+            return
+        at = at if at is not None else time.monotonic()
+        cents = Money.parse(amount).cents
+        with self._lock:
+            for counter in self._counters_for(user_id):
+                counter.add(cents, at)
+
+    def warm(self, user_id=None):
+        if not self.limits:
+            return 0
+        longest_window = max(window_seconds for _, window_seconds, _, _, _ in self.limits)
+        query = """
+            SELECT a.user_id, t.amount, EXTRACT(EPOCH FROM LOCALTIMESTAMP - t.timestamp)::float8
+            FROM transactions t
+            JOIN accounts a ON t.account_id = a.id
+            WHERE t.type IN ('withdraw', 'transfer_out', 'card_payment')
+              AND t.timestamp >= LOCALTIMESTAMP - make_interval(secs => %s)
+        """
+        params = (longest_window,)
+        if user_id is not None:
+            query += " AND a.user_id = %s"
+            params = (longest_window, user_id)
+        warmed = 0
+        with self.guard(user_id) if user_id is not None else contextlib.nullcontext():
+            counters = {}
+            now = time.monotonic()
+            for row_user_id, amount, age in stream_query(query, params, readonly=False):
+                user_counters = counters.get(row_user_id)
+                if user_counters is None:
+                    user_counters = counters[row_user_id] = self._new_counters()
+                for counter in user_counters:
+                    counter.add(Money.from_db(amount).cents, now - age)
+                warmed += 1
+            with self._lock:
+                if user_id is None:
+                    self._counters = counters
+                else:
+                    self._counters.pop(user_id, None)
+                    self._counters.update(counters)
+        return warmed
+
+velocity_screen = VelocityScreen(parse_velocity_limits(VELOCITY_LIMITS))
+
+class AuditLog:
+    def __init__(self, max_queue=AUDIT_QUEUE_SIZE, batch_size=AUDIT_BATCH_SIZE, flush_interval=AUDIT_FLUSH_INTERVAL,
+                 enqueue_timeout=AUDIT_ENQUEUE_TIMEOUT):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._pending = []
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._metrics_lock = threading.Lock()
+        self._metrics = {
+            "enqueued": 0,
+            "written": 0,
+            "dropped": 0,
+            "blocked": 0,
+            "batches": 0,
+            "failed_flushes": 0,
+            "rejected": 0,
+            "max_depth": 0,
+            "last_flush_ms": 0.0,
+        }
+
+    def _count(self, name, amount=1):
+        with self._metrics_lock:
+            self._metrics[name] += amount
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._flush_loop, name="audit-flusher", daemon=True)
+                self._thread.start()
+
+    def record(self, event_type, user_id=None, username=None, **details):
+        self.start()
+        event = (event_type[:50], user_id, username[:50] if username else username, Json(details, dumps=lambda value: json.dumps(value, default=str)), datetime.datetime.now())
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self._count("blocked")
+            try:
+                self._queue.put(event, timeout=self.enqueue_timeout)
+            except queue.Full:
+                self._count("dropped")
+                return False
+        depth = self._queue.qsize()
+        with self._metrics_lock:
+            self._metrics["enqueued"] += 1
+            self._metrics["max_depth"] = max(self._metrics["max_depth"], depth)
+        return True
+
+    def _flush_loop(self):
+        while not self._stop.is_set():
+            deadline = time.monotonic() + self.flush_interval
+            while len(self._pending) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    self._pending.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            if self._pending and not self._write_pending():
+                self._stop.wait(self.flush_interval)
+
+    def _drain(self):
+        while len(self._pending) < self.batch_size:
+            try:
+                self._pending.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+
+    def _write_pending(self):
+        start = time.perf_counter()
+        conn = get_db_connection()
+        if conn is None:
+            self._count("failed_flushes")
+            return False
+        cur = conn.cursor()
+        try:
+            try:
+                self._insert(cur, self._pending)
+                written = len(self._pending)
+            except (psycopg2.DataError, psycopg2.IntegrityError):
+                conn.rollback()
+                written = self._insert_bisecting(cur, self._pending)
+            conn.commit()
+        except psycopg2.Error as e:
+            conn.rollback()
+            self._count("failed_flushes")
+            audit_logger.error("Database error writing audit events: %s", e)
+            return False
+        finally:
+            cur.close()
+            conn.close()
+        with self._metrics_lock:
+            self._metrics["written"] += written
+            self._metrics["batches"] += 1
+            self._metrics["last_flush_ms"] = (time.perf_counter() - start) * 1000
+        self._pending = []
+        return True
+
+    def _insert(self, cur, events):
+        execute_values(cur, "INSERT INTO audit_events (event_type, user_id, username, details, created_at) VALUES %s;",
+                       events, page_size=self.batch_size)
+
+    def _insert_bisecting(self, cur, events):
+        cur.execute("SAVEPOINT audit_events_batch;")
+        try:
+            self._insert(cur, events)
+        except (psycopg2.DataError, psycopg2.IntegrityError) as e:
+            cur.execute("ROLLBACK TO SAVEPOINT audit_events_batch;")
+            if len(events) == 1:
+                self._count("rejected")
+                audit_logger.error("Dropped audit event %s for user_id=%s rejected by the database: %s", events[0][0], events[0][1], e)
+                return 0
+            middle = len(events) // 2
+            return self._insert_bisecting(cur, events[:middle]) + self._insert_bisecting(cur, events[middle:])
+        cur.execute("RELEASE SAVEPOINT audit_events_batch;")
+        return len(events)
+
+    def shutdown(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        while True:
+            self._drain()
+            if not self._pending or not self._write_pending():
+                break
+
+    def metrics(self):
+        with self._metrics_lock:
+            metrics = dict(self._metrics)
+        metrics["queue_depth"] = self._queue.qsize()
+        metrics["pending_batch"] = len(self._pending)
+        return metrics
+
+audit_log = AuditLog()
+atexit.register(audit_log.shutdown)
+
 class User:
     def __init__(self, user_id, username, password_hash):
         self.user_id = user_id
         self.username = username
         self.password_hash = password_hash
 
-def get_db_connection():
-    try:
-        conn = psycopg2.connect(os.getenv("DATABASE_URL"))
+class ZeldaConnection(psycopg2.extensions.connection):
+    is_replica = False
+    pool = None
+    dsn_key = None
+    in_pool = False
+    idle_since = 0.0
+    statement_timeout = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared_statements = set()
+
+    def commit(self):
+        super().commit()
+        if not self.is_replica:
+            replica_router.pin_primary(current_session.get())
+            dashboard_cache.invalidate(current_session.get())
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.release(self)
+        else:
+            super().close()
+
+class ConnectionPool:
+    def __init__(self, max_idle=DB_POOL_SIZE):
+        self.max_idle = max_idle
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def get(self, dsn, is_replica=False):
+        while True:
+            with self._lock:
+                idle = self._idle.get(dsn)
+                conn = idle.pop() if idle else None
+            if conn is None:
+                break
+            if self.is_alive(conn):
+                conn.in_pool = False
+                return conn
+            psycopg2.extensions.connection.close(conn)
+        conn = psycopg2.connect(dsn, connection_factory=ZeldaConnection, connect_timeout=DB_CONNECT_TIMEOUT)
+        conn.is_replica = is_replica
+        conn.dsn_key = dsn
+        conn.pool = self if self.max_idle > 0 else None
         return conn
-    except psycopg2.Error as e:
-        print_message(f"Database connection error: {e}", "error")
+
+    def is_alive(self, conn):
+        if conn.closed or conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            return False
+        if time.monotonic() - conn.idle_since < DB_POOL_PING_AFTER:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1;")
+            conn.rollback()
+        except psycopg2.Error:
+            return False
+        return True
+
+    def release(self, conn):
+        if conn.in_pool or conn.closed:
+            return
+        try:
+            if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            if conn.autocommit or conn.isolation_level is not None:
+                conn.set_session(isolation_level='DEFAULT', readonly='DEFAULT', autocommit=False)
+        except psycopg2.Error:
+            psycopg2.extensions.connection.close(conn)
+            return
+        with self._lock:
+            idle = self._idle.setdefault(conn.dsn_key, [])
+            if len(idle) < self.max_idle:
+                conn.in_pool = True
+                conn.idle_since = time.monotonic()
+                idle.append(conn)
+                return
+        psycopg2.extensions.connection.close(conn)
+
+    def close_all(self):
+        with self._lock:
+            idle_connections = [conn for idle in self._idle.values() for conn in idle]
+            self._idle = {}
+        for conn in idle_connections:
+            psycopg2.extensions.connection.close(conn)
+
+connection_pool = ConnectionPool()
+
+class PreparedStatement:
+    __slots__ = ("name", "query", "prepared_query", "hits", "prepares", "total_time")
+
+    def __init__(self, name, query):
+        self.name = name
+        self.query = query
+        parts = query.split("%s")
+        self.prepared_query = parts[0] + "".join(f"${index}{part}" for index, part in enumerate(parts[1:], start=1))
+        self.hits = 0
+        self.prepares = 0
+        self.total_time = 0.0
+
+class PreparedStatementRegistry:
+    def __init__(self, enabled=USE_PREPARED_STATEMENTS):
+        self.enabled = enabled
+        self._statements = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, query):
+        self._statements[name] = PreparedStatement(name, query.strip().rstrip(";"))
+
+    def execute(self, cur, name, params=()):
+        statement = self._statements[name]
+        start = time.perf_counter()
+        if not self.enabled:
+            cur.execute(statement.query, params)
+        else:
+            conn = cur.connection
+            prepared = getattr(conn, "prepared_statements", None)
+            if prepared is None or name not in prepared:
+                cur.execute(f"PREPARE {name} AS {statement.prepared_query};")
+                if prepared is not None:
+                    prepared.add(name)
+                with self._lock:
+                    statement.prepares += 1
+            try:
+                if params:
+                    cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))});", params)
+                else:
+                    cur.execute(f"EXECUTE {name};")
+            except psycopg2.errors.InvalidSqlStatementName:
+                if prepared is not None:
+                    prepared.discard(name)
+                raise
+            if prepared is None:
+                cur.execute(f"DEALLOCATE {name};")
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            statement.hits += 1
+            statement.total_time += elapsed
+
+    def stats(self):
+        with self._lock:
+            return [
+                {
+                    "name": statement.name,
+                    "hits": statement.hits,
+                    "prepares": statement.prepares,
+                    "total_ms": statement.total_time * 1000,
+                    "avg_ms": statement.total_time * 1000 / statement.hits if statement.hits else 0.0,
+                    "query": statement.query,
+                }
+                for statement in self._statements.values()
+            ]
+
+    def reset_stats(self):
+        with self._lock:
+            for statement in self._statements.values():
+                statement.hits = 0
+                statement.prepares = 0
+                statement.total_time = 0.0
+
+prepared_statements = PreparedStatementRegistry()
+prepared_statements.register("account_id_by_user_id", "SELECT id FROM accounts WHERE user_id = %s")
+prepared_statements.register("user_account", "SELECT id, account_number, balance, loan_balance FROM accounts WHERE user_id = %s")
+prepared_statements.register("login_lookup", "SELECT id, password_hash, full_name FROM users WHERE username = %s")
+prepared_statements.register("insert_transaction", """
+    WITH ledger AS (
+        INSERT INTO transactions (account_id, type, amount, is_public, category) VALUES (%s, %s, %s, %s, %s) RETURNING account_id
+    )
+    INSERT INTO daily_balances (account_id, day, closing_balance)
+    SELECT accounts.id, CURRENT_DATE, accounts.balance FROM accounts JOIN ledger ON accounts.id = ledger.account_id
+    ON CONFLICT (account_id, day) DO UPDATE SET closing_balance = EXCLUDED.closing_balance
+""")
+prepared_statements.register("debit_account", "UPDATE accounts SET balance = balance - %s WHERE id = %s")
+prepared_statements.register("credit_account", "UPDATE accounts SET balance = balance + %s WHERE id = %s")
+prepared_statements.register("lock_transfer_accounts", "SELECT id, user_id, account_number, balance FROM accounts WHERE user_id = %s OR account_number = %s ORDER BY id FOR UPDATE")
+prepared_statements.register("lock_accounts_by_user_ids", "SELECT id, user_id, balance FROM accounts WHERE user_id = ANY(%s) ORDER BY id FOR UPDATE")
+prepared_statements.register("authorize_debit", """
+    WITH request AS (
+        SELECT %s::numeric AS amount, %s::integer AS account_id, %s::integer AS card_id, %s::varchar AS merchant
+    ),
+    card AS (
+        SELECT cards.id FROM cards JOIN request ON cards.id = request.card_id
+        WHERE NOT cards.locked
+        FOR SHARE OF cards
+    ),
+    debited AS (
+        UPDATE accounts SET balance = accounts.balance - request.amount
+        FROM request, card
+        WHERE accounts.id = request.account_id AND accounts.balance >= request.amount
+        RETURNING accounts.id, accounts.balance, request.amount, request.merchant
+    ),
+    checks_reset AS (
+        UPDATE cards SET failed_checks = 0
+        FROM request
+        WHERE cards.id = request.card_id AND cards.failed_checks > 0 AND EXISTS (SELECT 1 FROM debited)
+    ),
+    ledger AS (
+        INSERT INTO transactions (account_id, type, amount, category)
+        SELECT id, 'card_payment', amount, LEFT(merchant, 50) FROM debited
+    ),
+    closing AS (
+        INSERT INTO daily_balances (account_id, day, closing_balance)
+        SELECT id, CURRENT_DATE, balance FROM debited
+        ON CONFLICT (account_id, day) DO UPDATE SET closing_balance = EXCLUDED.closing_balance
+    ),
+    logged AS (
+        INSERT INTO card_authorizations (card_id, amount, merchant, approved, decline_reason)
+        SELECT card_id, amount, LEFT(merchant, 100), EXISTS (SELECT 1 FROM debited),
+               CASE WHEN EXISTS (SELECT 1 FROM debited) THEN NULL
+                    WHEN NOT EXISTS (SELECT 1 FROM card) THEN 'locked'
+                    ELSE 'insufficient_funds' END
+        FROM request
+        RETURNING approved, decline_reason
+    )
+    SELECT approved, decline_reason FROM logged
+""")
+prepared_statements.register("authorize_credit", """
+    WITH request AS (
+        SELECT %s::numeric AS amount, %s::integer AS account_id, %s::integer AS card_id, %s::varchar AS merchant
+    ),
+    card AS (
+        SELECT cards.id FROM cards JOIN request ON cards.id = request.card_id
+        WHERE NOT cards.locked
+        FOR SHARE OF cards
+    ),
+    charged AS (
+        UPDATE cards SET credit_used = cards.credit_used + request.amount, failed_checks = 0
+        FROM request, card
+        WHERE cards.id = card.id AND cards.credit_used + request.amount <= cards.credit_limit
+        RETURNING cards.credit_limit - cards.credit_used AS available
+    ),
+    logged AS (
+        INSERT INTO card_authorizations (card_id, amount, merchant, approved, decline_reason)
+        SELECT card_id, amount, LEFT(merchant, 100), EXISTS (SELECT 1 FROM charged),
+               CASE WHEN EXISTS (SELECT 1 FROM charged) THEN NULL
+                    WHEN NOT EXISTS (SELECT 1 FROM card) THEN 'locked'
+                    ELSE 'credit_limit' END
+        FROM request
+        RETURNING approved, decline_reason
+    )
+    SELECT approved, decline_reason FROM logged
+""")
+prepared_statements.register("decline_authorization", """
+    WITH request AS (
+        SELECT %s::integer AS card_id, %s::numeric AS amount, %s::varchar AS merchant, %s::varchar AS reason,
+               %s::boolean AS failed_check, %s::integer AS max_failed_checks
+    ),
+    checked AS (
+        UPDATE cards SET failed_checks = cards.failed_checks + 1, locked = cards.failed_checks + 1 >= request.max_failed_checks
+        FROM request
+        WHERE cards.id = request.card_id AND request.failed_check
+        RETURNING cards.locked
+    ),
+    logged AS (
+        INSERT INTO card_authorizations (card_id, amount, merchant, approved, decline_reason)
+        SELECT card_id, amount, LEFT(merchant, 100), FALSE, reason FROM request
+    )
+    SELECT locked FROM checked
+""")
+
+class ReplicaRouter:
+    def __init__(self, dsns, retry_seconds=REPLICA_RETRY_SECONDS, pin_seconds=READ_YOUR_WRITES_SECONDS):
+        self.dsns = list(dsns)
+        self.retry_seconds = retry_seconds
+        self.pin_seconds = pin_seconds
+        self._next = 0
+        self._down_until = {}
+        self._pinned_until = {}
+        self._lock = threading.Lock()
+
+    def pin_primary(self, session):
+        if not self.dsns:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._pinned_until = {key: until for key, until in self._pinned_until.items() if until > now}
+            self._pinned_until[session] = now + self.pin_seconds
+
+    def is_pinned(self, session):
+        with self._lock:
+            return self._pinned_until.get(session, 0) > time.monotonic()
+
+    def healthy_replicas(self):
+        now = time.monotonic()
+        with self._lock:
+            start = self._next
+            self._next = (self._next + 1) % len(self.dsns)
+            ordered = self.dsns[start:] + self.dsns[:start]
+            return [dsn for dsn in ordered if self._down_until.get(dsn, 0) <= now]
+
+    def mark_down(self, dsn):
+        with self._lock:
+            self._down_until[dsn] = time.monotonic() + self.retry_seconds
+
+    def connect(self):
+        for dsn in self.healthy_replicas():
+            try:
+                return connection_pool.get(dsn, is_replica=True)
+            except psycopg2.Error:
+                self.mark_down(dsn)
+        return None
+
+replica_router = ReplicaRouter(DATABASE_REPLICA_URLS)
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_seconds=CIRCUIT_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.failures = 0
+        self.total_failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.total_failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def is_open(self):
+        return self.state != self.CLOSED
+
+    def rejecting(self):
+        return self.state == self.HALF_OPEN or (self.state == self.OPEN and self.retry_in() > 0)
+
+    def retry_in(self):
+        return max(0.0, self.reset_seconds - (time.monotonic() - self.opened_at))
+
+class CircuitBreakers:
+    def __init__(self):
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def get(self, dsn=None):
+        dsn = dsn or current_shard.get() or os.getenv("DATABASE_URL")
+        with self._lock:
+            breaker = self._breakers.get(dsn)
+            if breaker is None:
+                breaker = self._breakers[dsn] = CircuitBreaker()
+        return breaker
+
+db_circuits = CircuitBreakers()
+
+def user_db_circuit(user_id):
+    if storage.name == "sharded":
+        return db_circuits.get(storage.shard_for_user(user_id))
+    return db_circuits.get()
+
+def apply_statement_timeout(conn, budget):
+    timeout = STATEMENT_TIMEOUTS.get(budget, STATEMENT_TIMEOUTS["default"])
+    if conn.statement_timeout == timeout:
+        return conn
+    with conn.cursor() as cur:
+        cur.execute("SET statement_timeout = %s;", (timeout,))
+    if not conn.autocommit:
+        psycopg2.extensions.connection.commit(conn)
+    conn.statement_timeout = timeout
+    return conn
+
+def open_db_connection(dsn, pooled, budget, attempts):
+    for attempt in range(attempts):
+        try:
+            if not pooled:
+                conn = psycopg2.connect(dsn, connection_factory=ZeldaConnection, connect_timeout=DB_CONNECT_TIMEOUT)
+            else:
+                conn = connection_pool.get(dsn)
+            try:
+                apply_statement_timeout(conn, budget)
+            except BaseException:
+                psycopg2.extensions.connection.close(conn)
+                raise
+            return conn, None
+        except psycopg2.OperationalError as e:
+            error = e
+            if attempt + 1 < attempts:
+                time.sleep(min(DB_CONNECT_RETRY_DELAY * 2 ** attempt, 2.0) * random.uniform(0.5, 1.0))
+        except psycopg2.Error as e:
+            error = e
+            break
+    return None, error
+
+def get_db_connection(readonly=False, pooled=True, budget="default"):
+    dsn = current_shard.get()
+    if dsn == SHARD_UNROUTABLE:
+        print_message("No shard is mapped for this user. Run 'python main.py init-shards'.", "error")
         return None
+    if dsn is None and readonly and replica_router.dsns and not replica_router.is_pinned(current_session.get()):
+        conn = replica_router.connect()
+        if conn is not None:
+            try:
+                return apply_statement_timeout(conn, budget)
+            except psycopg2.Error:
+                psycopg2.extensions.connection.close(conn)
+    dsn = dsn or os.getenv("DATABASE_URL")
+    breaker = db_circuits.get(dsn)
+    if not breaker.allow():
+        return None
+    attempts = 1 if breaker.state == CircuitBreaker.HALF_OPEN else DB_CONNECT_RETRIES + 1
+    try:
+        conn, error = open_db_connection(dsn, pooled, budget, attempts)
+    except BaseException:
+        breaker.record_failure()
+        raise
+    if conn is not None:
+        breaker.record_success()
+        return conn
+    breaker.record_failure()
+    if breaker.is_open():
+        print_message(f"Database unavailable, switching to read-only mode for {breaker.retry_in():.0f}s: {str(error).strip()}", "error")
+    else:
+        print_message(f"Database connection error: {str(error).strip()}", "error")
+    return None
+
+def widen_money_columns(cur):
+    cur.execute("""
+        DO $$
+        DECLARE
+            col RECORD;
+        BEGIN
+            FOR col IN
+                SELECT table_name, column_name
+                FROM information_schema.columns
+                WHERE table_schema = current_schema()
+                  AND data_type = 'numeric' AND numeric_precision = 10 AND numeric_scale = 2
+            LOOP
+                EXECUTE format('ALTER TABLE %I ALTER COLUMN %I TYPE DECIMAL(18, 2)', col.table_name, col.column_name);
+            END LOOP;
+        END $$;
+    """)
+
+def link_card_accounts(cur):
+    cur.execute("""
+        ALTER TABLE cards ADD COLUMN IF NOT EXISTS account_id INTEGER REFERENCES accounts(id);
+        ALTER TABLE cards ADD COLUMN IF NOT EXISTS credit_limit DECIMAL(18, 2);
+        ALTER TABLE cards ADD COLUMN IF NOT EXISTS credit_used DECIMAL(18, 2) NOT NULL DEFAULT 0;
+        ALTER TABLE cards ADD COLUMN IF NOT EXISTS failed_checks INTEGER NOT NULL DEFAULT 0;
+        ALTER TABLE cards ADD COLUMN IF NOT EXISTS locked BOOLEAN NOT NULL DEFAULT FALSE;
+        UPDATE cards SET account_id = accounts.id FROM accounts WHERE cards.account_id IS NULL AND accounts.user_id = cards.user_id;
+        UPDATE cards SET credit_limit = %s WHERE card_type = 'credit' AND credit_limit IS NULL;
+    """, (Money.parse(CARD_CREDIT_LIMIT),))
 
 def create_tables():
-    conn = get_db_connection()
+    conn = get_db_connection(budget="batch")
     if conn is None:
         return False
     cur = conn.cursor()
@@ -89,23 +1193,26 @@ def create_tables():
                 id SERIAL PRIMARY KEY,
                 user_id INTEGER REFERENCES users(id),
                 account_number VARCHAR(20) UNIQUE NOT NULL,
-                balance DECIMAL(10, 2) NOT NULL,
-                loan_balance DECIMAL(10, 2) DEFAULT 0.0
+                balance DECIMAL(18, 2) NOT NULL,
+                loan_balance DECIMAL(18, 2) DEFAULT 0.0
             );
+            CREATE SEQUENCE IF NOT EXISTS transactions_id_seq;
             CREATE TABLE IF NOT EXISTS transactions (
-                id SERIAL PRIMARY KEY,
+                id INTEGER NOT NULL DEFAULT nextval('transactions_id_seq'),
                 account_id INTEGER REFERENCES accounts(id),
                 type VARCHAR(20) NOT NULL,
-                amount DECIMAL(10, 2) NOT NULL,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                amount DECIMAL(18, 2) NOT NULL,
+                timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
                 is_public BOOLEAN DEFAULT FALSE,
-                category VARCHAR(50)
-            );
+                category VARCHAR(50),
+                PRIMARY KEY (id, timestamp)
+            ) PARTITION BY RANGE (timestamp);
+            ALTER SEQUENCE transactions_id_seq OWNED BY transactions.id;
             CREATE TABLE IF NOT EXISTS recurring_transfers (
                 id SERIAL PRIMARY KEY,
                 from_account_id INTEGER REFERENCES accounts(id),
                 to_account_number VARCHAR(20) NOT NULL,
-                amount DECIMAL(10, 2) NOT NULL,
+                amount DECIMAL(18, 2) NOT NULL,
                 frequency VARCHAR(20) NOT NULL,
                 next_transfer_date DATE NOT NULL,
                 description TEXT,
@@ -116,7 +1223,7 @@ def create_tables():
                 user_id INTEGER REFERENCES users(id),
                 bill_name VARCHAR(100) NOT NULL,
                 due_date DATE NOT NULL,
-                amount DECIMAL(10, 2) NOT NULL,
+                amount DECIMAL(18, 2) NOT NULL,
                 status VARCHAR(20) DEFAULT 'pending'
             );
             CREATE TABLE IF NOT EXISTS cards (
@@ -131,17 +1238,17 @@ def create_tables():
             CREATE TABLE IF NOT EXISTS loans (
                 id SERIAL PRIMARY KEY,
                 user_id INTEGER REFERENCES users(id),
-                amount DECIMAL(10, 2) NOT NULL,
+                amount DECIMAL(18, 2) NOT NULL,
                 interest_rate DECIMAL(5, 4) NOT NULL,
                 term_months INTEGER NOT NULL,
                 start_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                remaining_balance DECIMAL(10, 2) NOT NULL,
+                remaining_balance DECIMAL(18, 2) NOT NULL,
                 status VARCHAR(20) DEFAULT 'active'
             );
             CREATE TABLE IF NOT EXISTS loan_payments (
                 id SERIAL PRIMARY KEY,
                 loan_id INTEGER REFERENCES loans(id),
-                amount DECIMAL(10, 2) NOT NULL,
+                amount DECIMAL(18, 2) NOT NULL,
                 timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 is_public BOOLEAN DEFAULT FALSE
             );
@@ -149,7 +1256,7 @@ def create_tables():
                 id SERIAL PRIMARY KEY,
                 from_user_id INTEGER REFERENCES users(id),
                 to_user_id INTEGER REFERENCES users(id),
-                amount DECIMAL(10, 2) NOT NULL,
+                amount DECIMAL(18, 2) NOT NULL,
                 status VARCHAR(20) DEFAULT 'pending',
                 request_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             );
@@ -160,7 +1267,69 @@ def create_tables():
                 message TEXT NOT NULL,
                 timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             );
+            CREATE TABLE IF NOT EXISTS idempotency_keys (
+                idempotency_key VARCHAR(64) PRIMARY KEY,
+                user_id INTEGER REFERENCES users(id),
+                operation VARCHAR(50) NOT NULL,
+                success BOOLEAN,
+                message TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+            CREATE TABLE IF NOT EXISTS daily_balances (
+                account_id INTEGER REFERENCES accounts(id),
+                day DATE NOT NULL,
+                closing_balance DECIMAL(18, 2) NOT NULL,
+                PRIMARY KEY (account_id, day)
+            );
+            CREATE TABLE IF NOT EXISTS interest_runs (
+                accrual_date DATE PRIMARY KEY,
+                last_account_id INTEGER NOT NULL DEFAULT 0,
+                accounts_credited BIGINT NOT NULL DEFAULT 0,
+                total_interest DECIMAL(18, 2) NOT NULL DEFAULT 0,
+                started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                completed_at TIMESTAMP
+            );
+            CREATE TABLE IF NOT EXISTS interest_accruals (
+                accrual_date DATE NOT NULL,
+                account_id INTEGER REFERENCES accounts(id),
+                amount DECIMAL(18, 2) NOT NULL,
+                PRIMARY KEY (accrual_date, account_id)
+            );
+            CREATE TABLE IF NOT EXISTS audit_events (
+                id BIGSERIAL PRIMARY KEY,
+                event_type VARCHAR(50) NOT NULL,
+                user_id INTEGER,
+                username VARCHAR(50),
+                details JSONB,
+                created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+            );
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id VARCHAR(32) PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                expires_at TIMESTAMP NOT NULL,
+                revoked_at TIMESTAMP
+            );
+            CREATE INDEX IF NOT EXISTS sessions_user_id_idx ON sessions (user_id);
+        """)
+        widen_money_columns(cur)
+        link_card_accounts(cur)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS card_authorizations (
+                id BIGSERIAL PRIMARY KEY,
+                card_id INTEGER REFERENCES cards(id),
+                amount DECIMAL(18, 2) NOT NULL,
+                merchant VARCHAR(100),
+                approved BOOLEAN NOT NULL,
+                created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+            );
+            ALTER TABLE card_authorizations ADD COLUMN IF NOT EXISTS decline_reason VARCHAR(30);
         """)
+        if transactions_is_partitioned(cur):
+            ensure_transaction_partitions(cur)
+        else:
+            print_message("The transactions table is not partitioned yet. Run 'python main.py migrate-transactions' to partition it.", "info")
+        cur.execute("CREATE INDEX IF NOT EXISTS transactions_account_timestamp_idx ON transactions (account_id, timestamp DESC);")
         conn.commit()
         return True
     except psycopg2.Error as e:
@@ -171,126 +1340,903 @@ def create_tables():
         cur.close()
         conn.close()
 
-def transfer_funds(from_user_id, to_account_number, amount):
-    if amount <= 0:
-        return False, "Transfer amount must be positive."
+def month_start(date_value, months_offset=0):
+    month_index = date_value.year * 12 + date_value.month - 1 + months_offset
+    return datetime.date(month_index // 12, month_index % 12 + 1, 1)
 
-    from_account = get_user_account(from_user_id)
-    if not from_account:
-        return False, "Your account not found."
+def transaction_partition_name(month):
+    return f"transactions_p{month.year:04d}{month.month:02d}"
 
-    if from_account.balance < amount:
-        return False, "Insufficient balance."
+def transactions_is_partitioned(cur):
+    cur.execute("""
+        SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('transactions');
+    """)
+    return cur.fetchone() is not None
 
-    to_account_id = get_account_id_by_account_number(to_account_number)
-    if not to_account_id:
-        return False, "Recipient account not found."
+def create_transaction_partition(cur, parent, month):
+    cur.execute(sql.SQL("CREATE TABLE IF NOT EXISTS {} PARTITION OF {} FOR VALUES FROM (%s) TO (%s);").format(
+        sql.Identifier(transaction_partition_name(month)), sql.Identifier(parent)), (month, month_start(month, 1)))
 
-    conn = get_db_connection()
-    cur = conn.cursor()
-    try:
-        cur.execute("UPDATE accounts SET balance = balance - %s WHERE user_id = %s;", (amount, from_user_id))
-        record_transaction(get_account_id_by_user_id(from_user_id), 'transfer_out', amount)
+def ensure_transaction_partitions(cur, months_ahead=TRANSACTION_PARTITION_MONTHS_AHEAD, parent="transactions", since=None):
+    current_month = month_start(datetime.date.today())
+    month = month_start(since) if since else current_month
+    last_month = month_start(current_month, months_ahead)
+    created = 0
+    while month <= last_month:
+        create_transaction_partition(cur, parent, month)
+        month = month_start(month, 1)
+        created += 1
+    cur.execute(sql.SQL("CREATE TABLE IF NOT EXISTS {} PARTITION OF {} DEFAULT;").format(
+        sql.Identifier(f"{parent}_default"), sql.Identifier(parent)))
+    return created
 
-        cur.execute("UPDATE accounts SET balance = balance + %s WHERE id = %s;", (amount, to_account_id))
-        record_transaction(to_account_id, 'transfer_in', amount)
+def list_transaction_partitions(cur):
+    cur.execute("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass('transactions')
+        ORDER BY c.relname;
+    """)
+    partitions = []
+    for (name,) in cur.fetchall():
+        match = re.fullmatch(r"transactions_p(\d{4})(\d{2})", name)
+        if match:
+            partitions.append((name, datetime.date(int(match.group(1)), int(match.group(2)), 1)))
+    return partitions
 
+def create_upcoming_partitions(months_ahead=TRANSACTION_PARTITION_MONTHS_AHEAD):
+    conn = get_db_connection(budget="batch")
+    if conn is None:
+        return False, "Database connection failed."
+    cur = conn.cursor()
+    try:
+        if not transactions_is_partitioned(cur):
+            return False, "The transactions table is not partitioned. Run 'migrate-transactions' first."
+        created = ensure_transaction_partitions(cur, months_ahead)
         conn.commit()
-        return True, f"Successfully transferred ${amount:.2f} to account {to_account_number}."
-    except Exception as e:
+        return True, f"Transaction partitions ensured through {month_start(datetime.date.today(), months_ahead).strftime('%Y-%m')} ({created} months checked)."
+    except psycopg2.Error as e:
         conn.rollback()
-        return False, f"Transfer failed: {e}"
+        return False, f"Database error creating partitions: {e}"
     finally:
         cur.close()
         conn.close()
 
-def view_transaction_history(user_id):
-    account_id = get_account_id_by_user_id(user_id)
-    if not account_id:
-        return "No account found for this user."
-
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT type, amount, timestamp FROM transactions WHERE account_id = %s ORDER BY timestamp DESC;", (account_id,))
-    transactions = cur.fetchall()
-    cur.close()
-    conn.close()
-
-    if transactions:
-        history = "\n--- Transaction History ---\n"
-        for t in transactions:
-            history += f"Type: {t[0].capitalize()}, Amount: ${t[1]:.2f}, Date: {t[2].strftime('%Y-%m-%d %H:%M:%S')}\n"
-        history += "--------------------------"
-        return history
-    else:
-        return "No transactions found for your account."
-
-def get_account_id_by_user_id(user_id):
-    conn = get_db_connection()
+def archive_transaction_partitions(before_month, archive_dir):
+    conn = get_db_connection(budget="batch")
     if conn is None:
-        return None
+        return False, "Database connection failed."
+    os.makedirs(archive_dir, exist_ok=True)
     cur = conn.cursor()
+    archived = []
     try:
-        cur.execute("SELECT id FROM accounts WHERE user_id = %s;", (user_id,))
-        account_id = cur.fetchone()
-        return account_id[0] if account_id else None
-    except psycopg2.Error as e:
-        print_message(f"Database error getting account ID by user ID: {e}", "error")
-        return None
+        if not transactions_is_partitioned(cur):
+            return False, "The transactions table is not partitioned. Run 'migrate-transactions' first."
+        for name, month in list_transaction_partitions(cur):
+            if month >= before_month:
+                continue
+            path = os.path.join(archive_dir, f"{name}.csv.gz")
+            cur.execute(sql.SQL("ALTER TABLE transactions DETACH PARTITION {};").format(sql.Identifier(name)))
+            with gzip.open(path, "wt", newline="") as archive_file:
+                cur.copy_expert(sql.SQL("COPY {} TO STDOUT WITH (FORMAT csv, HEADER true);").format(sql.Identifier(name)).as_string(conn), archive_file)
+            cur.execute(sql.SQL("DROP TABLE {};").format(sql.Identifier(name)))
+            conn.commit()
+            archived.append(path)
+        if not archived:
+            return True, f"No transaction partitions older than {before_month.strftime('%Y-%m')} to archive."
+        return True, f"Archived {len(archived)} partition(s) to {archive_dir}:\n" + "\n".join(archived)
+    except (psycopg2.Error, OSError) as e:
+        conn.rollback()
+        return False, f"Archiving stopped after {len(archived)} partition(s): {e}"
     finally:
         cur.close()
         conn.close()
 
-def get_account_id_by_account_number(account_number):
-    conn = get_db_connection()
+def migrate_transactions_to_partitioned(batch_size=10000):
+    conn = get_db_connection(budget="batch")
     if conn is None:
-        return None
+        return False, "Database connection failed."
     cur = conn.cursor()
+    columns = "id, account_id, type, amount, timestamp, is_public, category"
+    select_columns = "id, account_id, type, amount, COALESCE(timestamp, 'epoch'::timestamp), is_public, category"
     try:
-        cur.execute("SELECT id FROM accounts WHERE account_number = %s;", (account_number,))
-        account_id = cur.fetchone()
-        return account_id[0] if account_id else None
+        if transactions_is_partitioned(cur):
+            return True, "The transactions table is already partitioned."
+
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS transactions_partitioned (
+                id INTEGER NOT NULL DEFAULT nextval('transactions_id_seq'),
+                account_id INTEGER REFERENCES accounts(id),
+                type VARCHAR(20) NOT NULL,
+                amount DECIMAL(18, 2) NOT NULL,
+                timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                is_public BOOLEAN DEFAULT FALSE,
+                category VARCHAR(50),
+                PRIMARY KEY (id, timestamp)
+            ) PARTITION BY RANGE (timestamp);
+        """)
+        cur.execute("SELECT MIN(timestamp), COALESCE(MAX(id), 0) FROM transactions;")
+        oldest, max_id = cur.fetchone()
+        ensure_transaction_partitions(cur, parent="transactions_partitioned", since=oldest.date() if oldest else None)
+        cur.execute("SELECT COALESCE(MAX(id), 0) FROM transactions_partitioned;")
+        last_id = cur.fetchone()[0]
+        conn.commit()
+
+        copied = 0
+        while last_id < max_id:
+            cur.execute(f"INSERT INTO transactions_partitioned ({columns}) SELECT {select_columns} FROM transactions WHERE id > %s AND id <= %s;",
+                        (last_id, last_id + batch_size))
+            copied += cur.rowcount
+            last_id = min(last_id + batch_size, max_id)
+            conn.commit()
+            print_message(f"Copied {copied} transactions (up to id {last_id} of {max_id})...", "info")
+
+        cur.execute("LOCK TABLE transactions IN EXCLUSIVE MODE;")
+        cur.execute(f"""
+            INSERT INTO transactions_partitioned ({columns})
+            SELECT {select_columns} FROM transactions t
+            WHERE NOT EXISTS (SELECT 1 FROM transactions_partitioned p WHERE p.id = t.id);
+        """)
+        copied += cur.rowcount
+        cur.execute("SELECT (SELECT COUNT(*) FROM transactions), (SELECT COUNT(*) FROM transactions_partitioned);")
+        source_count, copied_count = cur.fetchone()
+        if source_count != copied_count:
+            conn.rollback()
+            return False, f"Row counts differ after copying ({source_count} in transactions, {copied_count} in transactions_partitioned); the table was not swapped."
+        cur.execute("ALTER TABLE transactions RENAME TO transactions_unpartitioned;")
+        cur.execute("ALTER TABLE transactions_partitioned RENAME TO transactions;")
+        cur.execute("ALTER TABLE transactions_partitioned_default RENAME TO transactions_default;")
+        cur.execute("ALTER SEQUENCE transactions_id_seq OWNED BY transactions.id;")
+        cur.execute("ALTER TABLE transactions_unpartitioned ALTER COLUMN id DROP DEFAULT;")
+        cur.execute("ALTER INDEX IF EXISTS transactions_account_timestamp_idx RENAME TO transactions_unpartitioned_account_timestamp_idx;")
+        cur.execute("CREATE INDEX IF NOT EXISTS transactions_account_timestamp_idx ON transactions (account_id, timestamp DESC);")
+        conn.commit()
+        return True, f"Partitioned transactions table in place ({copied} rows copied). The old table was kept as transactions_unpartitioned; drop it once verified."
     except psycopg2.Error as e:
-        print_message(f"Database error getting account ID by account number: {e}", "error")
-        return None
+        conn.rollback()
+        return False, f"Database error partitioning transactions: {e}"
     finally:
         cur.close()
         conn.close()
 
-def get_user_id_by_username(username):
-    conn = get_db_connection()
+IMPORT_FIELDS = ("username", "password", "full_name", "email", "phone_number", "address", "date_of_birth")
+IMPORT_FIELD_WIDTHS = {"username": 50, "full_name": 100, "email": 100, "phone_number": 20}
+
+def read_import_records(path):
+    with open(path, newline="", encoding="utf-8") as import_file:
+        if path.endswith((".jsonl", ".ndjson")):
+            for line_number, line in enumerate(import_file, 1):
+                if not line.strip():
+                    continue
+                try:
+                    yield line_number, json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield line_number, f"Invalid JSON: {e}"
+        else:
+            reader = csv.DictReader(import_file)
+            for record in reader:
+                yield reader.line_num, record
+
+def validate_import_record(record):
+    if not isinstance(record, dict):
+        return None, str(record)
+    values = {field: str(record.get(field) or "").strip() for field in IMPORT_FIELDS}
+    missing = [field for field in IMPORT_FIELDS if not values[field]]
+    if missing:
+        return None, f"Missing {', '.join(missing)}."
+    for field, width in IMPORT_FIELD_WIDTHS.items():
+        if len(values[field]) > width:
+            return None, f"{field.replace('_', ' ').capitalize()} is longer than {width} characters."
+    if not is_valid_email(values["email"]):
+        return None, "Invalid email format."
+    if not is_valid_phone(values["phone_number"]):
+        return None, "Invalid phone number format."
+    values["date_of_birth"] = parse_date(values["date_of_birth"])
+    if values["date_of_birth"] is None:
+        return None, "Invalid date format. Please use YYYY-MM-DD."
+    return values, None
+
+def hash_password(password):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+
+def generate_account_numbers(cur, count):
+    numbers = set()
+    while len(numbers) < count:
+        candidates = {''.join(random.choices("0123456789", k=10)) for _ in range(count - len(numbers))} - numbers
+        cur.execute("SELECT account_number FROM accounts WHERE account_number = ANY(%s);", (list(candidates),))
+        numbers |= candidates - {row[0] for row in cur.fetchall()}
+    return list(numbers)
+
+def import_user_chunk(cur, chunk, hasher):
+    errors = []
+    cur.execute("SELECT username, email FROM users WHERE username = ANY(%s) OR email = ANY(%s);",
+                ([values["username"] for _, values in chunk], [values["email"] for _, values in chunk]))
+    taken_usernames = set()
+    taken_emails = set()
+    for username, email in cur.fetchall():
+        taken_usernames.add(username)
+        taken_emails.add(email)
+    pending = []
+    for line_number, values in chunk:
+        if values["username"] in taken_usernames:
+            errors.append((line_number, values["username"], "Username already exists."))
+        elif values["email"] in taken_emails:
+            errors.append((line_number, values["username"], "Email already registered."))
+        else:
+            pending.append(values)
+    if not pending:
+        return 0, errors
+
+    hashes = hasher([values["password"] for values in pending])
+    user_rows = execute_values(cur, """
+        INSERT INTO users (username, password_hash, full_name, email, phone_number, address, date_of_birth)
+        VALUES %s RETURNING id;
+    """, [(values["username"], password_hash, values["full_name"], values["email"], values["phone_number"], values["address"], values["date_of_birth"])
+          for values, password_hash in zip(pending, hashes)], page_size=len(pending), fetch=True)
+    account_numbers = generate_account_numbers(cur, len(user_rows))
+    execute_values(cur, "INSERT INTO accounts (user_id, account_number, balance) VALUES %s;",
+                   [(user_id, account_number, 0) for (user_id,), account_number in zip(user_rows, account_numbers)], page_size=len(user_rows))
+    return len(user_rows), errors
+
+def import_users(path, report_path, chunk_size=1000, processes=None):
+    errors = []
+    records = []
+    seen_usernames = set()
+    seen_emails = set()
+    try:
+        for line_number, record in read_import_records(path):
+            values, error = validate_import_record(record)
+            if error is None and values["username"] in seen_usernames:
+                error = "Duplicate username in import file."
+            elif error is None and values["email"] in seen_emails:
+                error = "Duplicate email in import file."
+            if error is not None:
+                username = record.get("username", "") if isinstance(record, dict) else ""
+                errors.append((line_number, username, error))
+                continue
+            seen_usernames.add(values["username"])
+            seen_emails.add(values["email"])
+            records.append((line_number, values))
+    except (OSError, UnicodeDecodeError, csv.Error) as e:
+        return False, f"Could not read {path}: {e}"
+
+    conn = get_db_connection(budget="batch")
     if conn is None:
-        return None
+        return False, "Database connection failed."
+    cur = conn.cursor()
+    imported = 0
+    start = time.perf_counter()
+    try:
+        processes = processes or os.cpu_count() or 1
+        with multiprocessing.get_context("spawn").Pool(processes) as pool:
+            def hasher(passwords):
+                return pool.map(hash_password, passwords, chunksize=max(1, len(passwords) // (processes * 4)))
+
+            for offset in range(0, len(records), chunk_size):
+                chunk = records[offset:offset + chunk_size]
+                try:
+                    chunk_imported, chunk_errors = import_user_chunk(cur, chunk, hasher)
+                    conn.commit()
+                    imported += chunk_imported
+                    errors.extend(chunk_errors)
+                except psycopg2.Error:
+                    conn.rollback()
+                    for row in chunk:
+                        try:
+                            row_imported, row_errors = import_user_chunk(cur, [row], hasher)
+                            conn.commit()
+                            imported += row_imported
+                            errors.extend(row_errors)
+                        except psycopg2.Error as e:
+                            conn.rollback()
+                            errors.append((row[0], row[1]["username"], f"Database error: {str(e).strip()}"))
+                print(f"Imported {imported}/{len(records)} valid records ({len(errors)} errors so far)...", flush=True)
+    finally:
+        cur.close()
+        conn.close()
+    elapsed = time.perf_counter() - start
+
+    with open(report_path, "w", newline="", encoding="utf-8") as report_file:
+        writer = csv.writer(report_file)
+        writer.writerow(["line", "username", "error"])
+        writer.writerows(sorted(errors))
+    rate = imported / elapsed if elapsed else 0.0
+    message = f"Imported {imported} users in {elapsed:.1f}s ({rate:.0f} users/s); {len(errors)} rows rejected, see {report_path}."
+    return imported > 0 or not errors, message
+
+def parse_interest_tiers(value):
+    tiers = []
+    for part in value.split(","):
+        if not part.strip():
+            continue
+        min_balance, annual_rate = part.strip().split(":")
+        tiers.append((Money.parse(min_balance), Decimal(annual_rate)))
+    return sorted(tiers)
+
+def accrue_interest_chunk(cur, accrual_date, after_account_id, chunk_size, tiers):
+    cur.execute("""
+        WITH tiers AS (
+            SELECT * FROM unnest(%(min_balances)s::numeric[], %(rates)s::numeric[]) AS tier(min_balance, annual_rate)
+        ),
+        batch AS (
+            SELECT id, balance FROM accounts WHERE id > %(after)s ORDER BY id LIMIT %(limit)s FOR UPDATE
+        ),
+        interest AS (
+            SELECT batch.id AS account_id,
+                   ROUND(batch.balance * (SELECT annual_rate FROM tiers WHERE min_balance <= batch.balance
+                                          ORDER BY min_balance DESC LIMIT 1) / 365, 2) AS amount
+            FROM batch
+            WHERE batch.balance > 0
+        ),
+        accrued AS (
+            INSERT INTO interest_accruals (accrual_date, account_id, amount)
+            SELECT %(accrual_date)s, account_id, amount FROM interest WHERE amount > 0
+            ON CONFLICT DO NOTHING
+            RETURNING account_id, amount
+        ),
+        credited AS (
+            UPDATE accounts SET balance = accounts.balance + accrued.amount
+            FROM accrued
+            WHERE accounts.id = accrued.account_id
+            RETURNING accounts.id, accounts.balance, accrued.amount
+        ),
+        ledger AS (
+            INSERT INTO transactions (account_id, type, amount, category)
+            SELECT id, 'interest', amount, 'Interest' FROM credited
+            RETURNING amount
+        ),
+        closing AS (
+            INSERT INTO daily_balances (account_id, day, closing_balance)
+            SELECT id, CURRENT_DATE, balance FROM credited
+            ON CONFLICT (account_id, day) DO UPDATE SET closing_balance = EXCLUDED.closing_balance
+        )
+        SELECT (SELECT MAX(id) FROM batch), (SELECT COUNT(*) FROM batch), COUNT(*), COALESCE(SUM(amount), 0) FROM ledger;
+    """, {
+        "min_balances": [min_balance.to_decimal() for min_balance, _ in tiers],
+        "rates": [annual_rate for _, annual_rate in tiers],
+        "after": after_account_id,
+        "limit": chunk_size,
+        "accrual_date": accrual_date,
+    })
+    last_account_id, scanned, credited, total = cur.fetchone()
+    return last_account_id, scanned, credited, Money.from_db(total)
+
+def accrue_interest(accrual_date, chunk_size=10000, tiers=None):
+    tiers = tiers if tiers is not None else parse_interest_tiers(INTEREST_TIERS)
+    if not tiers:
+        return False, "No interest tiers configured. Set INTEREST_TIERS."
+    conn = get_db_connection(budget="batch")
+    if conn is None:
+        return False, "Database connection failed."
+    cur = conn.cursor()
+    try:
+        cur.execute("INSERT INTO interest_runs (accrual_date) VALUES (%s) ON CONFLICT DO NOTHING;", (accrual_date,))
+        cur.execute("SELECT last_account_id, accounts_credited, total_interest, completed_at FROM interest_runs WHERE accrual_date = %s;", (accrual_date,))
+        last_account_id, credited_total, interest_total, completed_at = cur.fetchone()
+        interest_total = Money.from_db(interest_total)
+        if completed_at is not None:
+            conn.rollback()
+            return True, f"Interest for {accrual_date} was already accrued: {credited_total} accounts credited ${interest_total:.2f}."
+        cur.execute("SELECT COALESCE(MAX(id), 0) FROM accounts;")
+        max_account_id = cur.fetchone()[0]
+        conn.commit()
+        if last_account_id:
+            print_message(f"Resuming interest accrual for {accrual_date} after account {last_account_id}.", "info")
+
+        start = time.perf_counter()
+        scanned_total = 0
+        while True:
+            chunk_last_id, scanned, credited, total = accrue_interest_chunk(cur, accrual_date, last_account_id, chunk_size, tiers)
+            if not scanned:
+                break
+            last_account_id = chunk_last_id
+            scanned_total += scanned
+            credited_total += credited
+            interest_total += total
+            cur.execute("""
+                UPDATE interest_runs
+                SET last_account_id = %s, accounts_credited = accounts_credited + %s, total_interest = total_interest + %s
+                WHERE accrual_date = %s;
+            """, (last_account_id, credited, total, accrual_date))
+            conn.commit()
+            elapsed = time.perf_counter() - start
+            progress = last_account_id / max_account_id * 100 if max_account_id else 100.0
+            print(f"Accrued through account {last_account_id} ({progress:.1f}%): {scanned_total / elapsed:.0f} accounts/s", flush=True)
+
+        cur.execute("UPDATE interest_runs SET completed_at = CURRENT_TIMESTAMP WHERE accrual_date = %s;", (accrual_date,))
+        conn.commit()
+        elapsed = time.perf_counter() - start
+        rate = scanned_total / elapsed if elapsed else 0.0
+        return True, (f"Interest for {accrual_date}: {credited_total} accounts credited ${interest_total:.2f} "
+                      f"({scanned_total} accounts scanned in {elapsed:.1f}s, {rate:.0f} accounts/s).")
+    except psycopg2.Error as e:
+        conn.rollback()
+        return False, f"Database error accruing interest; rerun the command to resume: {e}"
+    finally:
+        cur.close()
+        conn.close()
+
+def backfill_balance_chunk(first_account_id, last_account_id):
+    conn = get_db_connection(budget="batch")
+    if conn is None:
+        raise psycopg2.OperationalError("Database connection failed.")
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            WITH batch AS (
+                SELECT id, balance FROM accounts WHERE id BETWEEN %(first)s AND %(last)s
+            ),
+            daily AS (
+                SELECT transactions.account_id, transactions.timestamp::date AS day,
+                       SUM(CASE WHEN transactions.type = ANY(%(credit_types)s) THEN transactions.amount ELSE -transactions.amount END) AS net
+                FROM transactions
+                WHERE transactions.account_id BETWEEN %(first)s AND %(last)s
+                GROUP BY 1, 2
+            ),
+            closing AS (
+                SELECT daily.account_id, daily.day,
+                       batch.balance - COALESCE(SUM(daily.net) OVER (PARTITION BY daily.account_id ORDER BY daily.day DESC
+                                                                      ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING), 0) AS closing_balance
+                FROM daily JOIN batch ON batch.id = daily.account_id
+                WHERE daily.day <= CURRENT_DATE
+            )
+            INSERT INTO daily_balances (account_id, day, closing_balance)
+            SELECT account_id, day, closing_balance FROM closing
+            UNION ALL
+            SELECT id, CURRENT_DATE, balance FROM batch
+            WHERE NOT EXISTS (SELECT 1 FROM closing WHERE closing.account_id = batch.id AND closing.day = CURRENT_DATE)
+            ON CONFLICT (account_id, day) DO UPDATE SET closing_balance = EXCLUDED.closing_balance;
+        """, {"first": first_account_id, "last": last_account_id, "credit_types": list(CREDIT_TRANSACTION_TYPES)})
+        rows = cur.rowcount
+        conn.commit()
+        return rows
+    except psycopg2.Error:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+def backfill_daily_balances(chunk_size=10000, workers=4):
+    conn = get_db_connection(budget="batch")
+    if conn is None:
+        return False, "Database connection failed."
     cur = conn.cursor()
     try:
-        cur.execute("SELECT id FROM users WHERE username = %s;", (username,))
-        user_id = cur.fetchone()
-        return user_id[0] if user_id else None
+        cur.execute("SELECT COALESCE(MIN(id), 0), COALESCE(MAX(id), 0) FROM accounts;")
+        first_id, last_id = cur.fetchone()
     except psycopg2.Error as e:
-        print_message(f"Database error getting user ID by username: {e}", "error")
+        return False, f"Database error reading accounts: {e}"
+    finally:
+        cur.close()
+        conn.close()
+    if not last_id:
+        return True, "No accounts to backfill."
+
+    ranges = [(start, min(start + chunk_size - 1, last_id)) for start in range(first_id, last_id + 1, chunk_size)]
+    start_time = time.perf_counter()
+    written = 0
+    failed = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(contextvars.copy_context().run, backfill_balance_chunk, first, last): (first, last) for first, last in ranges}
+        for done, future in enumerate(as_completed(futures), 1):
+            first, last = futures[future]
+            try:
+                written += future.result()
+            except psycopg2.Error as e:
+                failed.append(f"accounts {first}-{last}: {e}")
+            print(f"Backfilled {done}/{len(ranges)} chunks ({written} daily balances)...", flush=True)
+    elapsed = time.perf_counter() - start_time
+    message = f"Wrote {written} daily balances for accounts {first_id}-{last_id} in {elapsed:.1f}s."
+    if failed:
+        return False, message + f" {len(failed)} chunk(s) failed; rerun to retry them:\n" + "\n".join(failed)
+    return True, message
+
+def new_idempotency_key():
+    return uuid.uuid4().hex
+
+def claim_idempotency_key(cur, idempotency_key, user_id, operation):
+    cur.execute("INSERT INTO idempotency_keys (idempotency_key, user_id, operation) VALUES (%s, %s, %s) ON CONFLICT (idempotency_key) DO NOTHING RETURNING idempotency_key;",
+                (idempotency_key, user_id, operation))
+    if cur.fetchone():
         return None
+    cur.execute("SELECT user_id, operation, success, message FROM idempotency_keys WHERE idempotency_key = %s;", (idempotency_key,))
+    stored_user_id, stored_operation, success, message = cur.fetchone()
+    if stored_user_id != user_id or stored_operation != operation:
+        return False, "Idempotency key was already used for a different operation."
+    return success, message
+
+def run_money_transaction(operation, user_id, body, idempotency_key=None, screened=None):
+    attempt = 0
+    while True:
+        with velocity_screen.guard(user_id) if screened is not None else contextlib.nullcontext():
+            if screened is not None:
+                screened.clear()
+            conn = get_db_connection()
+            if conn is None:
+                return False, "Database connection failed."
+            cur = None
+            try:
+                conn.set_session(isolation_level=MONEY_ISOLATION_LEVEL)
+                cur = conn.cursor()
+                if idempotency_key is not None:
+                    stored_result = claim_idempotency_key(cur, idempotency_key, user_id, operation)
+                    if stored_result is not None:
+                        conn.rollback()
+                        return stored_result
+                success, message = body(cur)
+                if not success:
+                    conn.rollback()
+                    return success, message
+                if idempotency_key is not None:
+                    cur.execute("UPDATE idempotency_keys SET success = %s, message = %s WHERE idempotency_key = %s;",
+                                (success, message, idempotency_key))
+                conn.commit()
+                if screened:
+                    velocity_screen.record(user_id, screened["amount"])
+                return success, message
+            except RETRYABLE_DB_ERRORS as e:
+                conn.rollback()
+                error = e
+            except CONNECTION_DB_ERRORS as e:
+                if idempotency_key is None:
+                    return False, f"Database connection lost during {operation.replace('_', ' ')}; the outcome is unknown: {e}"
+                error = e
+            except psycopg2.Error as e:
+                conn.rollback()
+                return False, f"Database error during {operation.replace('_', ' ')}: {e}"
+            except Exception as e:
+                conn.rollback()
+                return False, f"An unexpected error occurred during {operation.replace('_', ' ')}: {e}"
+            finally:
+                if cur is not None and not cur.closed:
+                    cur.close()
+                if not conn.closed:
+                    conn.close()
+
+        attempt += 1
+        if attempt > MONEY_MAX_RETRIES:
+            return False, f"{operation.replace('_', ' ').capitalize()} failed after {attempt} attempts: {error}"
+        time.sleep(random.uniform(0, MONEY_RETRY_BASE_DELAY * (2 ** attempt)))
+
+def lock_accounts_by_user_ids(cur, user_ids):
+    prepared_statements.execute(cur, "lock_accounts_by_user_ids", (list(user_ids),))
+    return {row[1]: (row[0], Money.from_db(row[2])) for row in cur.fetchall()}
+
+def transfer_funds(from_user_id, to_account_number, amount, idempotency_key=None):
+    amount = Money.parse(amount)
+    if amount <= 0:
+        return False, "Transfer amount must be positive."
+
+    screened = {}
+
+    def body(cur):
+        allowed, reason = velocity_screen.check(from_user_id, amount, 'transfer')
+        if not allowed:
+            return False, reason
+        prepared_statements.execute(cur, "lock_transfer_accounts", (from_user_id, to_account_number))
+        accounts = cur.fetchall()
+        from_account = next((a for a in accounts if a[1] == from_user_id), None)
+        if not from_account:
+            return False, "Your account not found."
+
+        if Money.from_db(from_account[3]) < amount:
+            return False, "Insufficient balance."
+
+        to_account = next((a for a in accounts if a[2] == to_account_number), None)
+        if not to_account:
+            return False, "Recipient account not found."
+
+        prepared_statements.execute(cur, "debit_account", (amount, from_account[0]))
+        record_transaction(from_account[0], 'transfer_out', amount, cur=cur)
+
+        prepared_statements.execute(cur, "credit_account", (amount, to_account[0]))
+        record_transaction(to_account[0], 'transfer_in', amount, cur=cur)
+        screened["amount"] = amount
+        return True, f"Successfully transferred ${amount:.2f} to account {to_account_number}."
+
+    return run_money_transaction('transfer_funds', from_user_id, body, idempotency_key, screened)
+
+def stream_query(query, params=(), readonly=True, fetch_size=STREAM_FETCH_SIZE, budget="export", record=None):
+    conn = get_db_connection(readonly=readonly, budget=budget)
+    if conn is None:
+        print_message("Database connection failed.", "error")
+        return
+    cur = conn.cursor(name=f"stream_{uuid.uuid4().hex}")
+    cur.itersize = fetch_size
+    try:
+        cur.execute(query, params)
+        if record is None:
+            yield from cur
+        else:
+            for row in cur:
+                yield record(*row)
+    finally:
+        conn.close()
+
+def iter_transaction_history(user_id, days=TRANSACTION_HISTORY_DAYS):
+    since = datetime.datetime.now() - datetime.timedelta(days=days) if days else datetime.datetime.min
+    return degraded_reads.read_through(("transaction_history", user_id, days), lambda: stream_query("""
+        SELECT t.type, t.amount, t.timestamp
+        FROM transactions t
+        JOIN accounts a ON t.account_id = a.id
+        WHERE a.user_id = %s AND t.timestamp >= %s
+        ORDER BY t.timestamp DESC;
+    """, (user_id, since), record=TransactionRow), collect=TransactionBatch)
+
+def view_transaction_history(user_id, days=TRANSACTION_HISTORY_DAYS, fmt=None):
+    title = f"Transaction History (last {days} days)" if days else "Transaction History"
+    return render_rows(title, TRANSACTION_COLUMNS, storage.iter_transaction_history(user_id, days), fmt,
+                       empty_message="No transactions found for your account.")
+
+def fill_balance_series(rows, days, current_balance, initial_balance):
+    today = datetime.date.today()
+    start = today - datetime.timedelta(days=days - 1)
+    closing = {}
+    opening = None
+    for day, balance in rows:
+        if day < start:
+            opening = balance
+        else:
+            closing[day] = balance
+    if opening is not None:
+        balance = opening
+    else:
+        balance = initial_balance if closing else current_balance
+    series = []
+    for offset in range(days):
+        day = start + datetime.timedelta(days=offset)
+        balance = closing.get(day, balance)
+        series.append((day, balance))
+    series[-1] = (today, current_balance)
+    return series
+
+def get_balance_series(user_id, days=30):
+    return degraded_reads.call(("balance_series", user_id, days), lambda: load_balance_series(user_id, days), [])
+
+def load_balance_series(user_id, days=30):
+    account = get_user_account(user_id)
+    if account is None:
+        return []
+    start = datetime.date.today() - datetime.timedelta(days=days - 1)
+    conn = get_db_connection(readonly=True)
+    if conn is None:
+        return []
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            (SELECT day, closing_balance FROM daily_balances WHERE account_id = %(account_id)s AND day < %(start)s ORDER BY day DESC LIMIT 1)
+            UNION ALL
+            (SELECT day, closing_balance FROM daily_balances WHERE account_id = %(account_id)s AND day >= %(start)s ORDER BY day)
+        """, {"account_id": account.account_id, "start": start})
+        rows = [(day, Money.from_db(balance)) for day, balance in cur.fetchall()]
+        initial_balance = None
+        if rows and rows[0][0] >= start:
+            cur.execute("""
+                SELECT COALESCE(SUM(CASE WHEN type = ANY(%(credit_types)s) THEN amount ELSE -amount END), 0)
+                FROM transactions
+                WHERE account_id = %(account_id)s AND timestamp >= %(day)s AND timestamp < %(day)s::date + 1
+            """, {"account_id": account.account_id, "day": rows[0][0], "credit_types": list(CREDIT_TRANSACTION_TYPES)})
+            initial_balance = rows[0][1] - Money.from_db(cur.fetchone()[0])
+        return fill_balance_series(rows, days, account.get_balance(), initial_balance)
+    except psycopg2.Error as e:
+        print_message(f"Database error reading balance history: {e}", "error")
+        return []
     finally:
         cur.close()
         conn.close()
 
-def get_username_by_user_id(user_id):
-    conn = get_db_connection()
+class LookupCache:
+    def __init__(self, max_size=IDENTITY_CACHE_SIZE, ttl=IDENTITY_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if self.max_size <= 0 or value is None:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries), "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "expirations": self.expirations,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+identity_caches = {
+    "user_id_by_username": LookupCache(),
+    "username_by_user_id": LookupCache(),
+    "account_id_by_user_id": LookupCache(),
+    "account_id_by_account_number": LookupCache(),
+    "user_id_by_account_number": LookupCache(),
+    "user_id_by_card_number": LookupCache(),
+}
+
+def invalidate_identity(user_id=None, username=None, account_number=None):
+    if user_id is not None:
+        identity_caches["username_by_user_id"].invalidate(user_id)
+        identity_caches["account_id_by_user_id"].invalidate(user_id)
+    if username is not None:
+        identity_caches["user_id_by_username"].invalidate(username)
+    if account_number is not None:
+        identity_caches["account_id_by_account_number"].invalidate(account_number)
+        identity_caches["user_id_by_account_number"].invalidate(account_number)
+
+def identity_cache_stats():
+    return {name: cache.stats() for name, cache in identity_caches.items()}
+
+def cached_identity_lookup(cache_name, key, query, error_label):
+    cache = identity_caches[cache_name]
+    value = cache.get(key)
+    if value is not None:
+        return value
+    conn = get_db_connection(budget="lookup")
     if conn is None:
         return None
     cur = conn.cursor()
     try:
-        cur.execute("SELECT username FROM users WHERE id = %s;", (user_id,))
-        username = cur.fetchone()
-        return username[0] if username else None
+        query(cur, key)
+        row = cur.fetchone()
+        value = row[0] if row else None
+        cache.put(key, value)
+        return value
     except psycopg2.Error as e:
-        print_message(f"Database error getting username by user ID: {e}", "error")
+        print_message(f"Database error getting {error_label}: {e}", "error")
         return None
     finally:
         cur.close()
         conn.close()
 
+def get_account_id_by_user_id(user_id):
+    return cached_identity_lookup("account_id_by_user_id", user_id,
+                                  lambda cur, key: prepared_statements.execute(cur, "account_id_by_user_id", (key,)),
+                                  "account ID by user ID")
+
+def get_account_id_by_account_number(account_number):
+    return cached_identity_lookup("account_id_by_account_number", account_number,
+                                  lambda cur, key: cur.execute("SELECT id FROM accounts WHERE account_number = %s;", (key,)),
+                                  "account ID by account number")
+
+def get_user_id_by_username(username):
+    return cached_identity_lookup("user_id_by_username", username,
+                                  lambda cur, key: cur.execute("SELECT id FROM users WHERE username = %s;", (key,)),
+                                  "user ID by username")
+
+def get_username_by_user_id(user_id):
+    return cached_identity_lookup("username_by_user_id", user_id,
+                                  lambda cur, key: cur.execute("SELECT username FROM users WHERE id = %s;", (key,)),
+                                  "username by user ID")
+
+def cached_identity_batch(cache_name, keys, query, error_label):
+    cache = identity_caches[cache_name]
+    found = {}
+    missing = []
+    for key in dict.fromkeys(keys):
+        value = cache.get(key)
+        if value is None:
+            missing.append(key)
+        else:
+            found[key] = value
+    if not missing:
+        return found
+    conn = get_db_connection(budget="lookup")
+    if conn is None:
+        return found
+    cur = conn.cursor()
+    try:
+        cur.execute(query, (missing,))
+        for key, value in cur.fetchall():
+            cache.put(key, value)
+            found[key] = value
+        return found
+    except psycopg2.Error as e:
+        print_message(f"Database error getting {error_label}: {e}", "error")
+        return found
+    finally:
+        cur.close()
+        conn.close()
+
+def get_user_ids_by_usernames(usernames):
+    return cached_identity_batch("user_id_by_username", usernames,
+                                 "SELECT username, id FROM users WHERE username = ANY(%s);", "user IDs by username")
+
+def get_account_ids_by_account_numbers(account_numbers):
+    return cached_identity_batch("account_id_by_account_number", account_numbers,
+                                 "SELECT account_number, id FROM accounts WHERE account_number = ANY(%s);", "account IDs by account number")
+
+class DegradedReadCache:
+    def __init__(self, max_size=DEGRADED_CACHE_SIZE, max_rows=DEGRADED_CACHE_ROWS):
+        self.entries = LookupCache(max_size, DEGRADED_CACHE_TTL)
+        self.max_rows = max_rows
+
+    def recall(self, key, default=None):
+        cached = self.entries.get(key)
+        if cached is None:
+            print_message("Database unavailable and no cached copy of this data is available.", "error")
+            return default
+        value, saved_at = cached
+        print_message(f"Database unavailable; showing cached data from {saved_at:%H:%M:%S}.", "info")
+        return value
+
+    def call(self, key, loader, default=None):
+        breaker = db_circuits.get()
+        if breaker.rejecting():
+            return self.recall(key, default)
+        failures = breaker.total_failures
+        value = loader()
+        if breaker.total_failures != failures:
+            return self.recall(key, value)
+        if value is not None:
+            self.entries.put(key, (value, datetime.datetime.now()))
+        return value
+
+    def read_through(self, key, loader, collect=list):
+        breaker = db_circuits.get()
+        if breaker.rejecting():
+            yield from self.recall(key, ())
+            return
+        failures = breaker.total_failures
+        rows = collect()
+        source = loader()
+        try:
+            for row in source:
+                if rows is not None:
+                    rows.append(row)
+                    if len(rows) > self.max_rows:
+                        rows = None
+                yield row
+        finally:
+            close_source = getattr(source, "close", None)
+            if close_source is not None:
+                close_source()
+        if breaker.total_failures != failures:
+            if not rows:
+                yield from self.recall(key, ())
+        elif rows is not None:
+            self.entries.put(key, (rows, datetime.datetime.now()))
+
+degraded_reads = DegradedReadCache()
+
 def get_user_details(user_id):
-    conn = get_db_connection()
+    conn = get_db_connection(budget="lookup")
     if conn is None:
         return None
     cur = conn.cursor()
@@ -318,6 +2264,8 @@ def update_user_details(user_id, full_name, email, phone_number, address, date_o
             WHERE id = %s;
         """, (full_name, email, phone_number, address, date_of_birth, user_id))
         conn.commit()
+        invalidate_identity(user_id=user_id)
+        audit_log.record('profile_update', user_id, fields=["full_name", "email", "phone_number", "address", "date_of_birth"])
         return True, "Profile updated successfully."
     except ValueError:
         conn.rollback()
@@ -335,20 +2283,26 @@ def update_user_details(user_id, full_name, email, phone_number, address, date_o
         cur.close()
         conn.close()
 
-def register_user(username, password, full_name, email, phone_number, address, date_of_birth):
+def register_user(username, password, full_name, email, phone_number, address, date_of_birth, user_id=None, shard_check=None):
     conn = get_db_connection()
     if conn is None:
         return False, "Database connection failed."
     cur = conn.cursor()
-    hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    hashed_password = hash_password(password)
     try:
-        cur.execute("INSERT INTO users (username, password_hash, full_name, email, phone_number, address, date_of_birth) VALUES (%s, %s, %s, %s, %s, %s, %s) RETURNING id;",
-                    (username, hashed_password, full_name, email, phone_number, address, date_of_birth))
+        if shard_check is not None:
+            # Wait out any bucket move holding the users table, then confirm the directory still routes this user here.
+            cur.execute("LOCK TABLE users IN ROW EXCLUSIVE MODE;")
+            if not shard_check():
+                conn.rollback()
+                return False, "The shard map changed during registration. Please try again."
+        cur.execute("INSERT INTO users (id, username, password_hash, full_name, email, phone_number, address, date_of_birth) VALUES (COALESCE(%s, nextval('users_id_seq')), %s, %s, %s, %s, %s, %s, %s) RETURNING id;",
+                    (user_id, username, hashed_password, full_name, email, phone_number, address, date_of_birth))
         user_id = cur.fetchone()[0]
-        conn.commit()
         account_number = ''.join([str(random.randint(0, 9)) for _ in range(10)])
         cur.execute("INSERT INTO accounts (user_id, account_number, balance) VALUES (%s, %s, %s);", (user_id, account_number, 0.0))
         conn.commit()
+        invalidate_identity(user_id=user_id, username=username, account_number=account_number)
         return True, f"User '{username}' registered successfully with account number: {account_number}"
     except psycopg2.errors.UniqueViolation as e:
         conn.rollback()
@@ -369,17 +2323,19 @@ def register_user(username, password, full_name, email, phone_number, address, d
         conn.close()
 
 def login_user(username, password):
-    conn = get_db_connection()
+    conn = get_db_connection(budget="lookup")
     if conn is None:
         return None, None, "Database connection failed."
     cur = conn.cursor()
     try:
-        cur.execute("SELECT id, password_hash, full_name FROM users WHERE username = %s;", (username,))
+        prepared_statements.execute(cur, "login_lookup", (username,))
         result = cur.fetchone()
         if result:
             user_id, password_hash, full_name = result
             if bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8')):
+                audit_log.record('login_success', user_id, username)
                 return user_id, full_name, "Login successful."
+        audit_log.record('login_failure', result[0] if result else None, username)
         return None, None, "Invalid username or password."
     except psycopg2.Error as e:
         return None, None, f"Database error during login: {e}"
@@ -389,16 +2345,208 @@ def login_user(username, password):
         cur.close()
         conn.close()
 
+def create_session(session_id, user_id, expires_at):
+    conn = get_db_connection(budget="lookup")
+    if conn is None:
+        return False
+    cur = conn.cursor()
+    try:
+        cur.execute("DELETE FROM sessions WHERE user_id = %s AND expires_at < %s;", (user_id, datetime.datetime.now()))
+        cur.execute("INSERT INTO sessions (session_id, user_id, expires_at) VALUES (%s, %s, %s);", (session_id, user_id, expires_at))
+        conn.commit()
+        return True
+    except psycopg2.Error as e:
+        conn.rollback()
+        print_message(f"Database error creating session: {e}", "error")
+        return False
+    finally:
+        cur.close()
+        conn.close()
+
+def is_session_revoked(session_id):
+    conn = get_db_connection(budget="lookup")
+    if conn is None:
+        return None
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT revoked_at IS NOT NULL, user_id FROM sessions WHERE session_id = %s;", (session_id,))
+        row = cur.fetchone()
+        return (True, None) if row is None else row
+    except psycopg2.Error as e:
+        print_message(f"Database error checking session: {e}", "error")
+        return None
+    finally:
+        cur.close()
+        conn.close()
+
+def revoke_session(session_id):
+    conn = get_db_connection(budget="lookup")
+    if conn is None:
+        return False
+    cur = conn.cursor()
+    try:
+        cur.execute("UPDATE sessions SET revoked_at = CURRENT_TIMESTAMP WHERE session_id = %s AND revoked_at IS NULL;", (session_id,))
+        conn.commit()
+        return True
+    except psycopg2.Error as e:
+        conn.rollback()
+        print_message(f"Database error revoking session: {e}", "error")
+        return False
+    finally:
+        cur.close()
+        conn.close()
+
+def revoke_user_sessions(user_id):
+    conn = get_db_connection(budget="lookup")
+    if conn is None:
+        return None
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            UPDATE sessions SET revoked_at = CURRENT_TIMESTAMP
+            WHERE user_id = %s AND revoked_at IS NULL AND expires_at > %s
+            RETURNING session_id;
+        """, (user_id, datetime.datetime.now()))
+        session_ids = [row[0] for row in cur.fetchall()]
+        conn.commit()
+        return session_ids
+    except psycopg2.Error as e:
+        conn.rollback()
+        print_message(f"Database error revoking sessions: {e}", "error")
+        return None
+    finally:
+        cur.close()
+        conn.close()
+
+def read_session_secret(path):
+    try:
+        with open(path, "rb") as key_file:
+            return key_file.read().strip()
+    except FileNotFoundError:
+        return None
+
+def load_session_secret(secret=SESSION_SECRET, path=SESSION_SECRET_FILE):
+    if secret:
+        if len(secret.encode("utf-8")) < SESSION_SECRET_MIN_BYTES:
+            print_message(f"SESSION_SECRET must be at least {SESSION_SECRET_MIN_BYTES} bytes; refusing to sign sessions with it.", "error")
+            return None
+        return secret.encode("utf-8")
+    try:
+        existing = read_session_secret(path)
+    except OSError as e:
+        print_message(f"Could not read the session key from {path}: {e}", "error")
+        return None
+    if existing is not None and len(existing) >= SESSION_SECRET_MIN_BYTES:
+        return existing
+    key = secrets.token_hex(32).encode("ascii")
+    try:
+        descriptor, temp_path = tempfile.mkstemp(prefix=".zeldacli_session_key.", dir=os.path.dirname(os.path.abspath(path)))
+        try:
+            with os.fdopen(descriptor, "wb") as key_file:
+                key_file.write(key)
+                key_file.flush()
+                os.fsync(key_file.fileno())
+            if existing is None:
+                try:
+                    os.link(temp_path, path)
+                except FileExistsError:
+                    return load_session_secret(secret, path)
+            else:
+                os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+    except OSError as e:
+        print_message(f"Could not save the session key to {path}; sessions will not outlive this process: {e}", "error")
+    return key
+
+class SessionTokens:
+    def __init__(self, ttl=SESSION_TTL, revocation_ttl=SESSION_REVOCATION_TTL):
+        self.ttl = ttl
+        self.revocations = LookupCache(ttl=revocation_ttl)
+        self._secret = None
+
+    def sign(self, payload):
+        if self._secret is None:
+            self._secret = load_session_secret()
+            if self._secret is None:
+                return None
+        digest = hmac.new(self._secret, payload.encode("utf-8"), hashlib.sha256).digest()
+        return base64.urlsafe_b64encode(digest).rstrip(b"=").decode("ascii")
+
+    def issue(self, user_id):
+        session_id = uuid.uuid4().hex
+        expires_at = int(time.time() + self.ttl)
+        payload = f"{session_id}.{user_id}.{expires_at}"
+        signature = self.sign(payload)
+        if signature is None:
+            return None
+        if not storage.create_session(session_id, user_id, datetime.datetime.fromtimestamp(expires_at)):
+            return None
+        self.revocations.put(session_id, (False, user_id))
+        return f"{payload}.{signature}"
+
+    def parse(self, token):
+        try:
+            session_id, user_id, expires_at, signature = (token or "").split(".")
+            user_id = int(user_id)
+            expires_at = int(expires_at)
+        except ValueError:
+            return None
+        expected = self.sign(f"{session_id}.{user_id}.{expires_at}")
+        if expected is None:
+            return None
+        if not hmac.compare_digest(signature.encode("utf-8"), expected.encode("ascii")) or expires_at <= time.time():
+            return None
+        return session_id, user_id
+
+    def validate(self, token):
+        parsed = self.parse(token)
+        if parsed is None:
+            return None
+        session_id, user_id = parsed
+        state = self.revocations.get(session_id)
+        if state is None:
+            state = storage.is_session_revoked(session_id)
+            if state is None:
+                return None
+            self.revocations.put(session_id, state)
+        revoked, session_user_id = state
+        return None if revoked or session_user_id != user_id else user_id
+
+    def revoke(self, token):
+        parsed = self.parse(token)
+        if parsed is None:
+            return False
+        self.revocations.put(parsed[0], (True, parsed[1]))
+        return storage.revoke_session(parsed[0])
+
+    def revoke_user(self, user_id):
+        session_ids = storage.revoke_user_sessions(user_id)
+        for session_id in session_ids or ():
+            self.revocations.put(session_id, (True, user_id))
+        return session_ids is not None
+
+session_tokens = SessionTokens()
+
 def get_user_account(user_id):
-    conn = get_db_connection()
+    row = degraded_reads.call(("user_account", user_id), lambda: load_user_account_row(user_id))
+    return BankAccount(*row) if row is not None else None
+
+def load_user_account(user_id):
+    row = load_user_account_row(user_id)
+    return BankAccount(*row) if row is not None else None
+
+def load_user_account_row(user_id):
+    conn = get_db_connection(budget="lookup")
     if conn is None:
         return None
     cur = conn.cursor()
     try:
-        cur.execute("SELECT id, account_number, balance, loan_balance FROM accounts WHERE user_id = %s;", (user_id,))
+        prepared_statements.execute(cur, "user_account", (user_id,))
         account_data = cur.fetchone()
         if account_data:
-            return BankAccount(account_data[0], user_id, account_data[1], float(account_data[2]))
+            return account_data[0], user_id, account_data[1], Money.from_db(account_data[2])
         return None
     except psycopg2.Error as e:
         print_message(f"Database error getting user account: {e}", "error")
@@ -407,14 +2555,17 @@ def get_user_account(user_id):
         cur.close()
         conn.close()
 
-def record_transaction(account_id, type, amount, is_public=False, category=None):
+def record_transaction(account_id, type, amount, is_public=False, category=None, cur=None):
+    if cur is not None:
+        prepared_statements.execute(cur, "insert_transaction", (account_id, type, amount, is_public, category))
+        return
     conn = get_db_connection()
     if conn is None:
         print_message("Database connection failed. Cannot record transaction.", "error")
         return
     cur = conn.cursor()
     try:
-        cur.execute("INSERT INTO transactions (account_id, type, amount, is_public, category) VALUES (%s, %s, %s, %s, %s);", (account_id, type, amount, is_public, category))
+        prepared_statements.execute(cur, "insert_transaction", (account_id, type, amount, is_public, category))
         conn.commit()
     except psycopg2.Error as e:
         conn.rollback()
@@ -423,8 +2574,12 @@ def record_transaction(account_id, type, amount, is_public=False, category=None)
         cur.close()
         conn.close()
 
-def get_public_transactions():
-    conn = get_db_connection()
+def get_public_transactions(days=PUBLIC_FEED_DAYS):
+    return degraded_reads.call(("public_transactions", days), lambda: load_public_transactions(days), [])
+
+def load_public_transactions(days=PUBLIC_FEED_DAYS):
+    since = datetime.datetime.now() - datetime.timedelta(days=days)
+    conn = get_db_connection(readonly=True)
     if conn is None:
         print_message("Database connection failed. Cannot retrieve public transactions.", "error")
         return []
@@ -435,12 +2590,11 @@ def get_public_transactions():
             FROM transactions t
             JOIN accounts a ON t.account_id = a.id
             JOIN users u ON a.user_id = u.id
-            WHERE t.is_public = TRUE
+            WHERE t.is_public = TRUE AND t.timestamp >= %s
             ORDER BY t.timestamp DESC
             LIMIT 20;
-        """)
-        transactions = cur.fetchall()
-        return transactions
+        """, (since,))
+        return [PublicTransactionRow(*row) for row in cur.fetchall()]
     except psycopg2.Error as e:
         print_message(f"Database error retrieving public transactions: {e}", "error")
         return []
@@ -458,9 +2612,13 @@ def generate_card(user_id, card_type):
     cvv = ''.join([str(random.randint(0, 9)) for _ in range(3)])
 
     try:
-        cur.execute("INSERT INTO cards (user_id, card_number, expiry_date, cvv, card_type) VALUES (%s, %s, %s, %s, %s);",
-                    (user_id, card_number, expiry_date, cvv, card_type))
+        cur.execute("""
+            INSERT INTO cards (user_id, account_id, card_number, expiry_date, cvv, card_type, credit_limit)
+            VALUES (%s, (SELECT id FROM accounts WHERE user_id = %s), %s, %s, %s, %s, %s);
+        """, (user_id, user_id, card_number, expiry_date, cvv, card_type, Money.parse(CARD_CREDIT_LIMIT) if card_type == 'credit' else None))
         conn.commit()
+        card_index.invalidate(card_number)
+        audit_log.record('card_issued', user_id, card_type=card_type, card_last4=card_number[-4:], expiry_date=expiry_date)
         return True, f"{card_type.capitalize()} card generated successfully for user ID {user_id}:\n  Card Number: {card_number}\n  Expiry Date: {expiry_date}\n  CVV: {cvv}"
     except psycopg2.errors.UniqueViolation:
         conn.rollback()
@@ -475,33 +2633,160 @@ def generate_card(user_id, card_type):
         cur.close()
         conn.close()
 
-def display_cards(user_id):
-    conn = get_db_connection()
+def iter_cards(user_id):
+    return degraded_reads.read_through(("cards", user_id), lambda: stream_query(
+        "SELECT card_type, card_number, expiry_date, cvv FROM cards WHERE user_id = %s ORDER BY issue_date;", (user_id,), record=CardRow))
+
+def display_cards(user_id, fmt=None):
+    return render_rows("Your Cards", CARD_COLUMNS, storage.iter_cards(user_id), fmt,
+                       empty_message="No cards found for your account.")
+
+class CardRecord:
+    __slots__ = ("card_id", "account_id", "card_type", "expiry_date", "cvv", "user_id", "locked", "expires")
+
+    def __init__(self, card_id, account_id, card_type, expiry_date, cvv, user_id, locked):
+        self.card_id = card_id
+        self.account_id = account_id
+        self.card_type = card_type
+        self.expiry_date = expiry_date
+        self.cvv = cvv
+        self.user_id = user_id
+        self.locked = locked
+        month, year = expiry_date.split("/")
+        self.expires = month_start(datetime.date(2000 + int(year), int(month), 1), 1)
+
+class CardIndex:
+    query = "SELECT card_number, id, account_id, card_type, expiry_date, cvv, user_id, locked FROM cards"
+
+    def __init__(self):
+        self._cards = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def warm(self):
+        cards = {row[0]: CardRecord(*row[1:]) for row in stream_query(self.query + ";", readonly=False)}
+        with self._lock:
+            self._cards = cards
+        return len(cards)
+
+    def lookup(self, card_number):
+        card = self._cards.get(card_number)
+        if card is not None:
+            self.hits += 1
+            return card
+        self.misses += 1
+        conn = get_db_connection(budget="lookup")
+        if conn is None:
+            return None
+        cur = conn.cursor()
+        try:
+            cur.execute(self.query + " WHERE card_number = %s;", (card_number,))
+            row = cur.fetchone()
+        except psycopg2.Error as e:
+            print_message(f"Database error looking up card: {e}", "error")
+            return None
+        finally:
+            cur.close()
+            conn.close()
+        if row is None:
+            return None
+        card = CardRecord(*row[1:])
+        with self._lock:
+            self._cards[card_number] = card
+        return card
+
+    def invalidate(self, card_number):
+        with self._lock:
+            self._cards.pop(card_number, None)
+
+card_index = CardIndex()
+
+CARD_DECLINE_MESSAGES = {
+    "invalid_amount": "Declined: amount must be positive.",
+    "locked": "Declined: card locked after too many failed checks.",
+    "invalid_details": "Declined: invalid card details.",
+    "expired": "Declined: card expired.",
+    "unlinked": "Declined: card is not linked to an account.",
+    "insufficient_funds": "Declined: insufficient funds.",
+    "credit_limit": "Declined: credit limit exceeded.",
+}
+
+def check_card(card, expiry, cvv, amount):
+    if amount <= 0:
+        return "invalid_amount"
+    if card is not None and card.locked:
+        return "locked"
+    if card is None or card.expiry_date != expiry or not secrets.compare_digest(card.cvv, str(cvv)):
+        return "invalid_details"
+    if datetime.date.today() >= card.expires:
+        return "expired"
+    if card.account_id is None:
+        return "unlinked"
+    return None
+
+def log_card_decline(card_number, card, amount, merchant, reason):
+    conn = get_db_connection(budget="lookup")
     if conn is None:
-        return "Database connection failed. Cannot display cards."
+        return
     cur = conn.cursor()
+    failed_check = reason == "invalid_details" and card is not None and CARD_MAX_FAILED_CHECKS > 0
     try:
-        cur.execute("SELECT card_number, expiry_date, cvv, card_type FROM cards WHERE user_id = %s;", (user_id,))
-        cards = cur.fetchall()
-        if cards:
-            card_info = "\n--- Your Cards ---\n"
-            for i, card in enumerate(cards):
-                card_info += f"Card {i+1} ({card[3].capitalize()}):\n"
-                card_info += f"  Card Number: {card[0]}\n"
-                card_info += f"  Expiry Date: {card[1]}\n"
-                card_info += f"  CVV: {card[2]}\n"
-            card_info += "-----------------------"
-            return card_info
-        else:
-            return "No cards found for your account."
+        prepared_statements.execute(cur, "decline_authorization", (card.card_id if card is not None else None, amount, merchant, reason,
+                                                                   failed_check, CARD_MAX_FAILED_CHECKS))
+        row = cur.fetchone()
+        conn.commit()
     except psycopg2.Error as e:
-        return f"Database error displaying cards: {e}"
+        conn.rollback()
+        print_message(f"Database error logging card decline: {e}", "error")
+        return
     finally:
         cur.close()
         conn.close()
+    if row is not None and row[0]:
+        card_index.invalidate(card_number)
+
+def authorize(card_number, expiry, cvv, amount, merchant):
+    amount = Money.parse(amount)
+    card = card_index.lookup(card_number)
+    declined = check_card(card, expiry, cvv, amount)
+    if declined:
+        log_card_decline(card_number, card, amount, merchant, declined)
+        return False, CARD_DECLINE_MESSAGES[declined]
+    with velocity_screen.guard(card.user_id):
+        if card.card_type == 'debit':
+            allowed, reason = velocity_screen.check(card.user_id, amount, 'card_payment')
+            if not allowed:
+                log_card_decline(card_number, card, amount, merchant, "velocity")
+                return False, f"Declined: {reason}"
+        conn = get_db_connection(budget="lookup")
+        if conn is None:
+            return False, "Declined: database connection failed."
+        cur = conn.cursor()
+        try:
+            statement = "authorize_credit" if card.card_type == 'credit' else "authorize_debit"
+            prepared_statements.execute(cur, statement, (amount, card.account_id, card.card_id, merchant))
+            row = cur.fetchone()
+            conn.commit()
+        except psycopg2.Error as e:
+            conn.rollback()
+            return False, f"Declined: database error: {e}"
+        finally:
+            cur.close()
+            conn.close()
+        approved, decline_reason = row
+        if not approved:
+            if decline_reason == "locked":
+                card_index.invalidate(card_number)
+            return False, CARD_DECLINE_MESSAGES[decline_reason]
+        if card.card_type == 'debit':
+            velocity_screen.record(card.user_id, amount)
+    return True, f"Approved ${amount:.2f} at {merchant}."
 
 def apply_for_loan(user_id, amount, interest_rate, term_months):
+    amount = Money.parse(amount)
     if amount <= 0 or interest_rate <= 0 or term_months <= 0:
+        audit_log.record('loan_application_rejected', user_id, amount=amount, interest_rate=interest_rate, term_months=term_months)
         return False, "Invalid loan parameters. Amount, interest rate, and term must be positive."
 
     conn = get_db_connection()
@@ -513,6 +2798,7 @@ def apply_for_loan(user_id, amount, interest_rate, term_months):
                     (user_id, amount, interest_rate, term_months, amount))
         loan_id = cur.fetchone()[0]
         conn.commit()
+        audit_log.record('loan_application', user_id, loan_id=loan_id, amount=amount, interest_rate=interest_rate, term_months=term_months)
         return True, f"Loan application for ${amount:.2f} approved. Loan ID: {loan_id}"
     except psycopg2.Error as e:
         conn.rollback()
@@ -524,100 +2810,95 @@ def apply_for_loan(user_id, amount, interest_rate, term_months):
         cur.close()
         conn.close()
 
-def view_loans(user_id):
-    conn = get_db_connection()
-    if conn is None:
-        return "Database connection failed. Cannot view loans."
-    cur = conn.cursor()
-    try:
-        cur.execute("SELECT id, amount, interest_rate, term_months, start_date, remaining_balance, status FROM loans WHERE user_id = %s;", (user_id,))
-        loans = cur.fetchall()
-        if loans:
-            loan_info = "\n--- Your Loans ---\n"
-            for loan in loans:
-                loan_info += f"Loan ID: {loan[0]}\n"
-                loan_info += f"  Amount: ${loan[1]:.2f}\n"
-                loan_info += f"  Interest Rate: {loan[2]*100:.2f}%\n"
-                loan_info += f"  Term: {loan[3]} months\n"
-                loan_info += f"  Start Date: {loan[4].strftime('%Y-%m-%d')}\n"
-                loan_info += f"  Remaining Balance: ${loan[5]:.2f}\n"
-                loan_info += f"  Status: {loan[6].capitalize()}\n"
-                loan_info += "--------------------\n"
-            return loan_info
-        else:
-            return "No loans found for your account."
-    except psycopg2.Error as e:
-        return f"Database error viewing loans: {e}"
-    finally:
-        cur.close()
-        conn.close()
+def iter_loans(user_id):
+    return degraded_reads.read_through(("loans", user_id), lambda: stream_query(
+        "SELECT id, amount, interest_rate, term_months, start_date, remaining_balance, status FROM loans WHERE user_id = %s ORDER BY id;", (user_id,), record=LoanRow))
 
-def make_loan_payment(user_id, loan_id, amount):
+def view_loans(user_id, fmt=None):
+    return render_rows("Your Loans", LOAN_COLUMNS, storage.iter_loans(user_id), fmt,
+                       empty_message="No loans found for your account.")
+
+def make_loan_payment(user_id, loan_id, amount, idempotency_key=None):
+    amount = Money.parse(amount)
     if amount <= 0:
         return False, "Payment amount must be positive."
 
-    conn = get_db_connection()
-    if conn is None:
-        return False, "Database connection failed."
-    cur = conn.cursor()
-    try:
-        cur.execute("SELECT remaining_balance FROM loans WHERE id = %s AND user_id = %s;", (loan_id, user_id))
+    def body(cur):
+        cur.execute("SELECT remaining_balance FROM loans WHERE id = %s AND user_id = %s FOR UPDATE;", (loan_id, user_id))
         result = cur.fetchone()
         if not result:
             return False, "Loan not found or does not belong to you."
 
-        remaining_balance = float(result[0])
-        if amount > remaining_balance:
-            message = f"Payment amount ${amount:.2f} exceeds remaining balance ${remaining_balance:.2f}. Paying full remaining balance."
-            amount = remaining_balance
+        remaining_balance = Money.from_db(result[0])
+        payment = amount
+        if payment > remaining_balance:
+            message = f"Payment amount ${payment:.2f} exceeds remaining balance ${remaining_balance:.2f}. Paying full remaining balance."
+            payment = remaining_balance
         else:
             message = ""
 
-        new_remaining_balance = remaining_balance - amount
+        new_remaining_balance = remaining_balance - payment
         status = 'paid' if new_remaining_balance <= 0 else 'active'
 
         cur.execute("UPDATE loans SET remaining_balance = %s, status = %s WHERE id = %s;", (new_remaining_balance, status, loan_id))
-        cur.execute("INSERT INTO loan_payments (loan_id, amount) VALUES (%s, %s);", (loan_id, amount))
-        conn.commit()
-        
-        final_message = f"Successfully made payment of ${amount:.2f} for Loan ID {loan_id}."
+        cur.execute("INSERT INTO loan_payments (loan_id, amount) VALUES (%s, %s);", (loan_id, payment))
+
+        final_message = f"Successfully made payment of ${payment:.2f} for Loan ID {loan_id}."
         if status == 'paid':
             final_message += f"\nLoan ID {loan_id} is now fully paid."
         return True, message + "\n" + final_message if message else final_message
-    except psycopg2.Error as e:
-        conn.rollback()
-        return False, f"Database error making loan payment: {e}"
-    except Exception as e:
-        conn.rollback()
-        return False, f"An unexpected error occurred during loan payment: {e}"
-    finally:
-        cur.close()
-        conn.close()
 
-def search_users(query):
-    conn = get_db_connection()
+    return run_money_transaction('make_loan_payment', user_id, body, idempotency_key)
+
+def find_users(query):
+    conn = get_db_connection(readonly=True)
     if conn is None:
-        return "Database connection failed. Cannot search users."
+        return None, "Database connection failed. Cannot search users."
     cur = conn.cursor()
     try:
         search_pattern = f"%{query}%"
         cur.execute("SELECT id, username, full_name FROM users WHERE username ILIKE %s OR full_name ILIKE %s;", (search_pattern, search_pattern))
-        users = cur.fetchall()
-        if users:
-            user_info = "\n--- Search Results ---\n"
-            for user in users:
-                user_info += f"User ID: {user[0]}, Username: {user[1]}, Full Name: {user[2]}\n"
-            user_info += "----------------------"
-            return user_info
-        else:
-            return "No users found matching your query."
+        return cur.fetchall(), None
     except psycopg2.Error as e:
-        return f"Database error searching users: {e}"
+        return None, f"Database error searching users: {e}"
     finally:
         cur.close()
         conn.close()
 
+def format_user_search(users):
+    if not users:
+        return "No users found matching your query."
+    user_info = "\n--- Search Results ---\n"
+    for user in users:
+        user_info += f"User ID: {user[0]}, Username: {user[1]}, Full Name: {user[2]}\n"
+    user_info += "----------------------"
+    return user_info
+
+def search_users(query):
+    users, error = find_users(query)
+    return error or format_user_search(users)
+
+MONEY_REQUEST_NOTIFY_SQL = """pg_notify(%(channel)s || '_' || recipient, json_build_object(
+    'event', %(event)s, 'id', id, 'from_user_id', from_user_id, 'to_user_id', to_user_id, 'amount', ROUND(amount, 2)::text
+)::text)"""
+
+def money_request_channel(user_id):
+    return f"{MONEY_REQUEST_CHANNEL}_{int(user_id)}"
+
+def notify_money_request(cur, event, request_id, from_user_id, to_user_id, amount):
+    payload = json.dumps({
+        "event": event,
+        "id": request_id,
+        "from_user_id": from_user_id,
+        "to_user_id": to_user_id,
+        "amount": f"{amount:.2f}",
+    })
+    recipients = (to_user_id,) if event == 'new' else (to_user_id, from_user_id)
+    for recipient in recipients:
+        cur.execute("SELECT pg_notify(%s, %s);", (money_request_channel(recipient), payload))
+
 def request_money(from_user_id, to_username, amount):
+    amount = Money.parse(amount)
     if amount <= 0:
         return False, "Request amount must be positive."
 
@@ -630,8 +2911,10 @@ def request_money(from_user_id, to_username, amount):
         return False, "Database connection failed."
     cur = conn.cursor()
     try:
-        cur.execute("INSERT INTO money_requests (from_user_id, to_user_id, amount) VALUES (%s, %s, %s);",
+        cur.execute("INSERT INTO money_requests (from_user_id, to_user_id, amount) VALUES (%s, %s, %s) RETURNING id;",
                     (from_user_id, to_user_id, amount))
+        request_id = cur.fetchone()[0]
+        notify_money_request(cur, 'new', request_id, from_user_id, to_user_id, amount)
         conn.commit()
         return True, f"Money request of ${amount:.2f} sent to '{to_username}'."
     except psycopg2.Error as e:
@@ -644,159 +2927,1814 @@ def request_money(from_user_id, to_username, amount):
         cur.close()
         conn.close()
 
-def view_money_requests(user_id):
+def split_amount(amount, parts):
+    share, remainder = divmod(amount.cents, parts)
+    return [Money(share + (1 if index < remainder else 0)) for index in range(parts)]
+
+def clean_usernames(usernames):
+    return list(dict.fromkeys(username.strip() for username in usernames if username.strip()))
+
+def plan_money_split(from_user_id, usernames, amount, include_self, user_ids):
+    amount = Money.parse(amount)
+    if not usernames:
+        return None, "Enter at least one username to split with."
+    if amount <= 0:
+        return None, "Request amount must be positive."
+    missing = [username for username in usernames if username not in user_ids]
+    if missing:
+        return None, f"User(s) not found: {', '.join(missing)}."
+    if from_user_id in (user_ids[username] for username in usernames):
+        return None, "You cannot request money from yourself."
+    shares = split_amount(amount, len(usernames) + (1 if include_self else 0))
+    if shares[len(usernames) - 1] <= 0:
+        return None, f"${amount:.2f} is too small to split {len(shares)} ways."
+    return [(username, user_ids[username], share) for username, share in zip(usernames, shares)], None
+
+def describe_money_split(amount, plan):
+    return f"Split ${Money.parse(amount):.2f} into {len(plan)} money requests: " + ", ".join(f"{username} ${share:.2f}" for username, _, share in plan) + "."
+
+def request_money_split(from_user_id, to_usernames, amount, include_self=False):
+    usernames = clean_usernames(to_usernames)
+    plan, error = plan_money_split(from_user_id, usernames, amount, include_self, get_user_ids_by_usernames(usernames))
+    if error:
+        return False, error
+
     conn = get_db_connection()
     if conn is None:
-        return "Database connection failed. Cannot view money requests."
+        return False, "Database connection failed."
     cur = conn.cursor()
     try:
+        cur.execute(f"""
+            WITH requested AS (
+                INSERT INTO money_requests (from_user_id, to_user_id, amount)
+                SELECT %(from_user_id)s, split.to_user_id, split.amount
+                FROM unnest(%(to_user_ids)s::integer[], %(amounts)s::numeric[]) AS split(to_user_id, amount)
+                RETURNING id, from_user_id, to_user_id, amount
+            )
+            SELECT id, {MONEY_REQUEST_NOTIFY_SQL}
+            FROM requested CROSS JOIN LATERAL (VALUES (to_user_id)) AS recipients(recipient);
+        """, {
+            "from_user_id": from_user_id,
+            "to_user_ids": [to_user_id for _, to_user_id, _ in plan],
+            "amounts": [share.to_decimal() for _, _, share in plan],
+            "channel": MONEY_REQUEST_CHANNEL,
+            "event": 'new',
+        })
+        conn.commit()
+        return True, describe_money_split(amount, plan)
+    except psycopg2.Error as e:
+        conn.rollback()
+        return False, f"Database error sending money requests: {e}"
+    finally:
+        cur.close()
+        conn.close()
+
+def iter_money_requests(user_id):
+    return degraded_reads.read_through(("money_requests", user_id), lambda: stream_query("""
+        SELECT mr.id, u.username, mr.amount, mr.request_date
+        FROM money_requests mr
+        JOIN users u ON mr.from_user_id = u.id
+        WHERE mr.to_user_id = %s AND mr.status = 'pending'
+        ORDER BY mr.request_date DESC;
+    """, (user_id,), readonly=False, record=MoneyRequestRow))
+
+def view_money_requests(user_id, fmt=None, rows=None):
+    return render_rows("Pending Money Requests", MONEY_REQUEST_COLUMNS, rows if rows is not None else storage.iter_money_requests(user_id), fmt,
+                       empty_message="No pending money requests.")
+
+def respond_to_money_request(request_id, user_id, action, idempotency_key=None):
+    if action not in ('accept', 'decline'):
+        return False, "Invalid action. Use 'accept' or 'decline'."
+    accepted = {}
+
+    def body(cur):
+        cur.execute("SELECT from_user_id, to_user_id, amount FROM money_requests WHERE id = %s AND to_user_id = %s AND status = 'pending' FOR UPDATE;",
+                    (request_id, user_id))
+        request_data = cur.fetchone()
+        if not request_data:
+            return False, "Money request not found or already processed."
+
+        from_user_id, to_user_id, amount = request_data
+        amount = Money.from_db(amount)
+
+        if action == 'accept':
+            accounts = lock_accounts_by_user_ids(cur, (from_user_id, to_user_id))
+            if from_user_id not in accounts:
+                return False, "Recipient account not found."
+
+            if to_user_id not in accounts:
+                return False, "Your account not found."
+
+            sender_account_id, sender_balance = accounts[to_user_id]
+            recipient_account_id = accounts[from_user_id][0]
+            if sender_balance < amount:
+                return False, "Insufficient balance to accept request."
+
+            allowed, reason = velocity_screen.check(user_id, amount, 'money_request')
+            if not allowed:
+                return False, reason
+            accepted["amount"] = amount
+
+            prepared_statements.execute(cur, "debit_account", (amount, sender_account_id))
+            record_transaction(sender_account_id, 'transfer_out', amount, category='Money Request Accepted', cur=cur)
+
+            prepared_statements.execute(cur, "credit_account", (amount, recipient_account_id))
+            record_transaction(recipient_account_id, 'transfer_in', amount, category='Money Request Accepted', cur=cur)
+
+            cur.execute("UPDATE money_requests SET status = 'accepted' WHERE id = %s;", (request_id,))
+            notify_money_request(cur, 'accepted', request_id, from_user_id, to_user_id, amount)
+            return True, f"Money request {request_id} accepted. ${amount:.2f} transferred."
+
+        cur.execute("UPDATE money_requests SET status = 'declined' WHERE id = %s;", (request_id,))
+        notify_money_request(cur, 'declined', request_id, from_user_id, to_user_id, amount)
+        return True, f"Money request {request_id} declined."
+
+    return run_money_transaction('respond_to_money_request', user_id, body, idempotency_key, accepted)
+
+def respond_to_money_requests(request_ids, user_id, action, idempotency_key=None):
+    if action not in ('accept', 'decline'):
+        return False, "Invalid action. Use 'accept' or 'decline'."
+    request_ids = sorted(set(request_ids))
+    if not request_ids:
+        return False, "Enter at least one request ID."
+    accepted = {}
+
+    def body(cur):
         cur.execute("""
-            SELECT mr.id, u.username, mr.amount, mr.status, mr.request_date
-            FROM money_requests mr
-            JOIN users u ON mr.from_user_id = u.id
-            WHERE mr.to_user_id = %s AND mr.status = 'pending'
-            ORDER BY mr.request_date DESC;
-        """, (user_id,))
+            SELECT id, from_user_id, amount FROM money_requests
+            WHERE id = ANY(%s) AND to_user_id = %s AND status = 'pending'
+            ORDER BY id FOR UPDATE;
+        """, (request_ids, user_id))
         requests = cur.fetchall()
-        if requests:
-            request_info = "\n--- Pending Money Requests ---\n"
-            for req in requests:
-                request_info += f"Request ID: {req[0]}, From: {req[1]}, Amount: ${req[2]:.2f}, Date: {req[4].strftime('%Y-%m-%d %H:%M:%S')}\n"
-            request_info += "------------------------------"
-            return request_info
+        missing = sorted(set(request_ids) - {row[0] for row in requests})
+        if missing:
+            return False, f"Money request(s) {', '.join(map(str, missing))} not found or already processed."
+        params = {"ids": request_ids, "channel": MONEY_REQUEST_CHANNEL, "event": 'declined' if action == 'decline' else 'accepted'}
+
+        if action == 'decline':
+            cur.execute(f"""
+                WITH declined AS (
+                    UPDATE money_requests SET status = 'declined' WHERE id = ANY(%(ids)s)
+                    RETURNING id, from_user_id, to_user_id, amount
+                )
+                SELECT id, {MONEY_REQUEST_NOTIFY_SQL}
+                FROM declined CROSS JOIN LATERAL (VALUES (to_user_id), (from_user_id)) AS recipients(recipient);
+            """, params)
+            return True, f"Declined {len(requests)} money request(s)."
+
+        total = Money.total(Money.from_db(amount) for _, _, amount in requests)
+        accounts = lock_accounts_by_user_ids(cur, {user_id} | {from_user_id for _, from_user_id, _ in requests})
+        if user_id not in accounts:
+            return False, "Your account not found."
+        missing = sorted(request_id for request_id, from_user_id, _ in requests if from_user_id not in accounts)
+        if missing:
+            return False, f"Recipient account not found for request(s) {', '.join(map(str, missing))}."
+        payer_account_id, balance = accounts[user_id]
+        if balance < total:
+            return False, f"Insufficient balance to accept {len(requests)} request(s) totalling ${total:.2f}."
+
+        allowed, reason = velocity_screen.check(user_id, total, 'money_request')
+        if not allowed:
+            return False, reason
+        accepted["amount"] = total
+
+        params["payer_account_id"] = payer_account_id
+        cur.execute(f"""
+            WITH accepted AS (
+                UPDATE money_requests SET status = 'accepted' WHERE id = ANY(%(ids)s)
+                RETURNING id, from_user_id, to_user_id, amount
+            ),
+            credits AS (
+                SELECT accounts.id AS account_id, accepted.amount
+                FROM accepted JOIN accounts ON accounts.user_id = accepted.from_user_id
+            ),
+            deltas AS (
+                SELECT account_id, SUM(delta) AS delta FROM (
+                    SELECT %(payer_account_id)s AS account_id, -amount AS delta FROM accepted
+                    UNION ALL
+                    SELECT account_id, amount FROM credits
+                ) moves
+                GROUP BY account_id
+            ),
+            moved AS (
+                UPDATE accounts SET balance = accounts.balance + deltas.delta
+                FROM deltas
+                WHERE accounts.id = deltas.account_id
+                RETURNING accounts.id, accounts.balance
+            ),
+            ledger AS (
+                INSERT INTO transactions (account_id, type, amount, category)
+                SELECT %(payer_account_id)s, 'transfer_out', amount, 'Money Request Accepted' FROM accepted
+                UNION ALL
+                SELECT account_id, 'transfer_in', amount, 'Money Request Accepted' FROM credits
+            ),
+            closing AS (
+                INSERT INTO daily_balances (account_id, day, closing_balance)
+                SELECT id, CURRENT_DATE, balance FROM moved
+                ON CONFLICT (account_id, day) DO UPDATE SET closing_balance = EXCLUDED.closing_balance
+            )
+            SELECT id, {MONEY_REQUEST_NOTIFY_SQL}
+            FROM accepted CROSS JOIN LATERAL (VALUES (to_user_id), (from_user_id)) AS recipients(recipient);
+        """, params)
+        return True, f"Accepted {len(requests)} money request(s). ${total:.2f} transferred."
+
+    return run_money_transaction('respond_to_money_requests', user_id, body, idempotency_key, accepted)
+
+class MoneyRequestNotifier:
+    def __init__(self, user_id, poll_interval=1.0):
+        self.user_id = user_id
+        self.poll_interval = poll_interval
+        self.pending_count = 0
+        self._notices = []
+        self._requests = None
+        self._dirty = True
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._conn = None
+        self._thread = None
+
+    def start(self):
+        if not self._connect():
+            return False
+        self._thread = threading.Thread(target=self._listen_loop, name="money-request-notifier", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.poll_interval * 2)
+            self._thread = None
+        self._close()
+
+    def _connect(self):
+        conn = get_db_connection(pooled=False)
+        if conn is None:
+            return False
+        try:
+            conn.autocommit = True
+            cur = conn.cursor()
+            cur.execute(f"LISTEN {money_request_channel(self.user_id)};")
+            cur.execute("SELECT COUNT(*) FROM money_requests WHERE to_user_id = %s AND status = 'pending';", (self.user_id,))
+            pending_count = cur.fetchone()[0]
+            cur.close()
+        except psycopg2.Error as e:
+            conn.close()
+            print_message(f"Database error starting money request notifications: {e}", "error")
+            return False
+        with self._lock:
+            self._conn = conn
+            self.pending_count = pending_count
+            self._dirty = True
+        return True
+
+    def _close(self):
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except psycopg2.Error:
+                pass
+            self._conn = None
+
+    def _listen_loop(self):
+        while not self._stop.is_set():
+            if self._conn is None:
+                if not self._connect():
+                    self._stop.wait(self.poll_interval * 5)
+                continue
+            try:
+                ready, _, _ = select.select([self._conn], [], [], self.poll_interval)
+                if not ready:
+                    continue
+                self._conn.poll()
+                while self._conn.notifies:
+                    self._handle(self._conn.notifies.pop(0).payload)
+            except (psycopg2.Error, OSError, ValueError):
+                self._close()
+
+    def _handle(self, payload):
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            return
+        with self._lock:
+            if event.get("to_user_id") == self.user_id:
+                if event["event"] == 'new':
+                    self.pending_count += 1
+                    self._notices.append(f"New money request #{event['id']} for ${event['amount']}.")
+                else:
+                    self.pending_count = max(0, self.pending_count - 1)
+                self._dirty = True
+                dashboard_cache.invalidate(self.user_id)
+            elif event.get("from_user_id") == self.user_id and event["event"] in ('accepted', 'declined'):
+                self._notices.append(f"Your money request #{event['id']} for ${event['amount']} was {event['event']}.")
+
+    def drain_notices(self):
+        with self._lock:
+            notices, self._notices = self._notices, []
+        return notices
+
+    def pending_requests(self):
+        with self._lock:
+            dirty = self._dirty or self._conn is None
+            self._dirty = False
+        if dirty or self._requests is None:
+            self._requests = list(iter_money_requests(self.user_id))
+        return self._requests
+
+def add_bill(user_id, bill_name, due_date_obj, amount):
+    amount = Money.parse(amount)
+    conn = get_db_connection()
+    if conn is None:
+        return False, "Database connection failed."
+    cur = conn.cursor()
+    try:
+        cur.execute("INSERT INTO bills (user_id, bill_name, due_date, amount, status) VALUES (%s, %s, %s, %s, %s);",
+                    (user_id, bill_name, due_date_obj, amount, 'pending'))
+        conn.commit()
+        return True, f"Bill '{bill_name}' for ${amount:.2f} due on {due_date_obj.strftime('%Y-%m-%d')} added successfully."
+    except psycopg2.Error as e:
+        conn.rollback()
+        return False, f"Database error adding bill: {e}"
+    finally:
+        cur.close()
+        conn.close()
+
+def get_user_bills(user_id):
+    return degraded_reads.call(("user_bills", user_id), lambda: load_user_bills(user_id), [])
+
+def load_user_bills(user_id):
+    conn = get_db_connection(readonly=True)
+    if conn is None:
+        return []
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT id, bill_name, due_date, amount, status FROM bills WHERE user_id = %s ORDER BY due_date ASC;", (user_id,))
+        return [BillRow(*row) for row in cur.fetchall()]
+    except psycopg2.Error as e:
+        print_message(f"Database error retrieving user bills: {e}", "error")
+        return []
+    finally:
+        cur.close()
+        conn.close()
+
+def pay_bill(user_id, bill_id, idempotency_key=None):
+    def body(cur):
+        cur.execute("SELECT bill_name, amount, status FROM bills WHERE id = %s AND user_id = %s FOR UPDATE;", (bill_id, user_id))
+        bill_data = cur.fetchone()
+        if not bill_data:
+            return False, "Bill not found or does not belong to you."
+
+        bill_name, amount, status = bill_data
+        amount = Money.from_db(amount)
+        if status == 'paid':
+            return False, f"Bill '{bill_name}' is already paid."
+
+        accounts = lock_accounts_by_user_ids(cur, (user_id,))
+        if user_id not in accounts:
+            return False, "Your account not found."
+
+        account_id, balance = accounts[user_id]
+        if balance < amount:
+            return False, "Insufficient balance to pay this bill."
+
+        prepared_statements.execute(cur, "debit_account", (amount, account_id))
+        cur.execute("UPDATE bills SET status = 'paid' WHERE id = %s;", (bill_id,))
+        record_transaction(account_id, 'bill_payment', amount, category='Bill Payment', cur=cur)
+        return True, f"Successfully paid bill '{bill_name}' for ${amount:.2f}."
+
+    return run_money_transaction('pay_bill', user_id, body, idempotency_key)
+
+def deposit_funds(user_id, amount):
+    amount = Money.parse(amount)
+    account = get_user_account(user_id)
+    if account is None:
+        return False, "Could not retrieve bank account."
+    if not account.deposit(amount):
+        return False, "Deposit failed."
+    record_transaction(account.account_id, 'deposit', amount)
+    return True, f"Successfully deposited ${amount:.2f}."
+
+def withdraw_funds(user_id, amount):
+    amount = Money.parse(amount)
+    account = get_user_account(user_id)
+    if account is None:
+        return False, "Could not retrieve bank account."
+    success, reason = account.withdraw(amount)
+    if not success:
+        return False, reason
+    record_transaction(account.account_id, 'withdraw', amount)
+    return True, f"Successfully withdrew ${amount:.2f}."
+
+dashboard_cache = LookupCache(ttl=DASHBOARD_CACHE_TTL)
+
+def load_dashboard(user_id):
+    conn = get_db_connection(readonly=True, budget="lookup")
+    if conn is None:
+        return None
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            WITH account AS (
+                SELECT account_number, balance FROM accounts WHERE user_id = %(user_id)s
+            ),
+            pending AS (
+                SELECT COUNT(*) AS requests, COALESCE(SUM(amount), 0) AS amount
+                FROM money_requests WHERE to_user_id = %(user_id)s AND status = 'pending'
+            ),
+            next_bills AS (
+                SELECT bill_name, due_date, amount FROM bills
+                WHERE user_id = %(user_id)s AND status = 'pending'
+                ORDER BY due_date LIMIT %(bills)s
+            ),
+            active_loans AS (
+                SELECT COUNT(*) AS loans, COALESCE(SUM(remaining_balance), 0) AS balance
+                FROM loans WHERE user_id = %(user_id)s AND status = 'active'
+            )
+            SELECT account.account_number, account.balance, pending.requests, pending.amount,
+                   (SELECT COALESCE(json_agg(json_build_array(bill_name, due_date, amount::text) ORDER BY due_date), '[]') FROM next_bills),
+                   active_loans.loans, active_loans.balance,
+                   (SELECT COUNT(*) FROM cards WHERE user_id = %(user_id)s)
+            FROM pending CROSS JOIN active_loans LEFT JOIN account ON TRUE;
+        """, {"user_id": user_id, "bills": DASHBOARD_BILLS})
+        account_number, balance, requests, pending_amount, bills, loans, loan_balance, cards = cur.fetchone()
+        if account_number is None:
+            return None
+        bills = [(bill_name, datetime.date.fromisoformat(due_date), Money.parse(amount)) for bill_name, due_date, amount in bills]
+        return DashboardSummary(account_number, Money.from_db(balance), requests, Money.from_db(pending_amount), bills,
+                                loans, Money.from_db(loan_balance), cards)
+    except psycopg2.Error as e:
+        print_message(f"Database error loading account summary: {e}", "error")
+        return None
+    finally:
+        cur.close()
+        conn.close()
+
+def get_dashboard(user_id):
+    summary = dashboard_cache.get(user_id)
+    if summary is None:
+        summary = degraded_reads.call(("dashboard", user_id), lambda: load_dashboard(user_id))
+        if summary is not None and not db_circuits.get().rejecting():
+            dashboard_cache.put(user_id, summary)
+    return summary
+
+STORAGE_OPERATIONS = (
+    "register_user", "login_user", "get_user_details", "update_user_details", "search_users",
+    "get_user_id_by_username", "get_username_by_user_id", "get_account_id_by_user_id", "get_account_id_by_account_number",
+    "get_user_ids_by_usernames", "get_account_ids_by_account_numbers",
+    "get_user_account", "deposit_funds", "withdraw_funds", "transfer_funds", "record_transaction",
+    "iter_transaction_history", "get_public_transactions", "get_balance_series",
+    "generate_card", "iter_cards", "authorize",
+    "apply_for_loan", "iter_loans", "make_loan_payment",
+    "add_bill", "get_user_bills", "pay_bill",
+    "request_money", "request_money_split", "iter_money_requests", "respond_to_money_request", "respond_to_money_requests",
+    "get_dashboard",
+    "create_session", "is_session_revoked", "revoke_session", "revoke_user_sessions",
+)
+
+class Storage(abc.ABC):
+    name = None
+
+    @abc.abstractmethod
+    def create_schema(self):
+        pass
+
+class PostgresStorage(Storage):
+    name = "postgres"
+
+    def create_schema(self):
+        return create_tables()
+
+for storage_operation in STORAGE_OPERATIONS:
+    setattr(PostgresStorage, storage_operation, staticmethod(globals()[storage_operation]))
+
+class MemoryStorage(Storage):
+    name = "memory"
+
+    def __init__(self, password_rounds=12):
+        self.password_rounds = password_rounds
+        self._lock = threading.RLock()
+        self._ids = {}
+        self.users = {}
+        self.accounts = {}
+        self._users_by_username = {}
+        self._accounts_by_user = {}
+        self._accounts_by_number = {}
+        self.transactions = []
+        self.cards = {}
+        self.card_numbers = {}
+        self.card_authorizations = []
+        self.loans = {}
+        self.loan_payments = []
+        self.bills = {}
+        self.money_requests = {}
+        self.idempotency_keys = {}
+        self.sessions = {}
+
+    def create_schema(self):
+        return True
+
+    def _next_id(self, table):
+        self._ids[table] = self._ids.get(table, 0) + 1
+        return self._ids[table]
+
+    def _account_for_user(self, user_id):
+        return self._accounts_by_user.get(user_id)
+
+    def _account_by_number(self, account_number):
+        return self._accounts_by_number.get(account_number)
+
+    def _user_by_username(self, username):
+        return self._users_by_username.get(username)
+
+    def _idempotent(self, operation, user_id, idempotency_key, body):
+        with self._lock:
+            if idempotency_key is not None and idempotency_key in self.idempotency_keys:
+                stored_user_id, stored_operation, result = self.idempotency_keys[idempotency_key]
+                if stored_user_id != user_id or stored_operation != operation:
+                    return False, "Idempotency key was already used for a different operation."
+                return result
+            result = body()
+            if result[0] and idempotency_key is not None:
+                self.idempotency_keys[idempotency_key] = (user_id, operation, result)
+            return result
+
+    def register_user(self, username, password, full_name, email, phone_number, address, date_of_birth):
+        hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(self.password_rounds)).decode('utf-8')
+        with self._lock:
+            if self._user_by_username(username):
+                return False, "Username already exists."
+            if email and any(user["email"] == email for user in self.users.values()):
+                return False, "Email already registered."
+            user_id = self._next_id("users")
+            self.users[user_id] = self._users_by_username[username] = {
+                "id": user_id, "username": username, "password_hash": hashed_password, "full_name": full_name,
+                "email": email, "phone_number": phone_number, "address": address, "date_of_birth": date_of_birth,
+            }
+            account_number = ''.join([str(random.randint(0, 9)) for _ in range(10)])
+            while self._account_by_number(account_number):
+                account_number = ''.join([str(random.randint(0, 9)) for _ in range(10)])
+            account_id = self._next_id("accounts")
+            account = {"id": account_id, "user_id": user_id, "account_number": account_number,
+                       "balance": Money(0), "loan_balance": Money(0)}
+            self.accounts[account_id] = self._accounts_by_user[user_id] = self._accounts_by_number[account_number] = account
+        return True, f"User '{username}' registered successfully with account number: {account_number}"
+
+    def login_user(self, username, password):
+        with self._lock:
+            user = self._user_by_username(username)
+        if user and bcrypt.checkpw(password.encode('utf-8'), user["password_hash"].encode('utf-8')):
+            return user["id"], user["full_name"], "Login successful."
+        return None, None, "Invalid username or password."
+
+    def get_user_details(self, user_id):
+        user = self.users.get(user_id)
+        if user is None:
+            return None
+        return (user["username"], user["full_name"], user["email"], user["phone_number"], user["address"], user["date_of_birth"])
+
+    def update_user_details(self, user_id, full_name, email, phone_number, address, date_of_birth_str):
+        try:
+            date_of_birth = datetime.datetime.strptime(date_of_birth_str, "%Y-%m-%d").date()
+        except ValueError:
+            return False, "Invalid date format. Please use YYYY-MM-DD."
+        with self._lock:
+            if email and any(user["email"] == email and user["id"] != user_id for user in self.users.values()):
+                return False, "Email already registered by another user."
+            user = self.users.get(user_id)
+            if user is not None:
+                user.update(full_name=full_name, email=email, phone_number=phone_number, address=address, date_of_birth=date_of_birth)
+        return True, "Profile updated successfully."
+
+    def search_users(self, query):
+        needle = query.lower()
+        with self._lock:
+            users = [user for user in self.users.values()
+                     if needle in user["username"].lower() or needle in (user["full_name"] or "").lower()]
+        if not users:
+            return "No users found matching your query."
+        user_info = "\n--- Search Results ---\n"
+        for user in users:
+            user_info += f"User ID: {user['id']}, Username: {user['username']}, Full Name: {user['full_name']}\n"
+        user_info += "----------------------"
+        return user_info
+
+    def get_user_id_by_username(self, username):
+        with self._lock:
+            user = self._user_by_username(username)
+        return user["id"] if user else None
+
+    def get_username_by_user_id(self, user_id):
+        user = self.users.get(user_id)
+        return user["username"] if user else None
+
+    def get_account_id_by_user_id(self, user_id):
+        with self._lock:
+            account = self._account_for_user(user_id)
+        return account["id"] if account else None
+
+    def get_account_id_by_account_number(self, account_number):
+        with self._lock:
+            account = self._account_by_number(account_number)
+        return account["id"] if account else None
+
+    def get_balance_series(self, user_id, days=30):
+        start = datetime.date.today() - datetime.timedelta(days=days - 1)
+        with self._lock:
+            account = self._account_for_user(user_id)
+            if account is None:
+                return []
+            balance = account["balance"]
+            rows = []
+            for transaction in sorted((t for t in self.transactions if t[1] == account["id"]), key=lambda t: t[4], reverse=True):
+                day = transaction[4].date()
+                if not rows or rows[-1][0] != day:
+                    rows.append((day, balance))
+                    if day < start:
+                        break
+                balance = balance - transaction[3] if transaction[2] in CREDIT_TRANSACTION_TYPES else balance + transaction[3]
+        return fill_balance_series(reversed(rows), days, account["balance"], balance)
+
+    def get_user_ids_by_usernames(self, usernames):
+        wanted = set(usernames)
+        with self._lock:
+            return {user["username"]: user["id"] for user in self.users.values() if user["username"] in wanted}
+
+    def get_account_ids_by_account_numbers(self, account_numbers):
+        wanted = set(account_numbers)
+        with self._lock:
+            return {account["account_number"]: account["id"] for account in self.accounts.values()
+                    if account["account_number"] in wanted}
+
+    def get_user_account(self, user_id):
+        with self._lock:
+            account = self._account_for_user(user_id)
+            if account is None:
+                return None
+            return BankAccount(account["id"], user_id, account["account_number"], account["balance"])
+
+    def deposit_funds(self, user_id, amount):
+        amount = Money.parse(amount)
+        with self._lock:
+            account = self._account_for_user(user_id)
+            if account is None:
+                return False, "Could not retrieve bank account."
+            if amount <= 0:
+                return False, "Deposit failed."
+            account["balance"] += amount
+            self.record_transaction(account["id"], 'deposit', amount)
+        return True, f"Successfully deposited ${amount:.2f}."
+
+    def withdraw_funds(self, user_id, amount):
+        amount = Money.parse(amount)
+        with velocity_screen.guard(user_id):
+            with self._lock:
+                account = self._account_for_user(user_id)
+                if account is None:
+                    return False, "Could not retrieve bank account."
+                if not 0 < amount <= account["balance"]:
+                    return False, "Invalid withdrawal amount or insufficient balance."
+                allowed, reason = velocity_screen.check(user_id, amount, 'withdraw')
+                if not allowed:
+                    return False, reason
+                account["balance"] -= amount
+                self.record_transaction(account["id"], 'withdraw', amount)
+            velocity_screen.record(user_id, amount)
+        return True, f"Successfully withdrew ${amount:.2f}."
+
+    def transfer_funds(self, from_user_id, to_account_number, amount, idempotency_key=None):
+        amount = Money.parse(amount)
+        if amount <= 0:
+            return False, "Transfer amount must be positive."
+        def body():
+            from_account = self._account_for_user(from_user_id)
+            if not from_account:
+                return False, "Your account not found."
+            if from_account["balance"] < amount:
+                return False, "Insufficient balance."
+            to_account = self._account_by_number(to_account_number)
+            if not to_account:
+                return False, "Recipient account not found."
+            from_account["balance"] -= amount
+            self.record_transaction(from_account["id"], 'transfer_out', amount)
+            to_account["balance"] += amount
+            self.record_transaction(to_account["id"], 'transfer_in', amount)
+            return True, f"Successfully transferred ${amount:.2f} to account {to_account_number}."
+
+        with velocity_screen.guard(from_user_id):
+            allowed, reason = velocity_screen.check(from_user_id, amount, 'transfer')
+            if not allowed:
+                return False, reason
+            success, message = self._idempotent('transfer_funds', from_user_id, idempotency_key, body)
+            if success:
+                velocity_screen.record(from_user_id, amount)
+        return success, message
+
+    def record_transaction(self, account_id, type, amount, is_public=False, category=None, cur=None):
+        with self._lock:
+            self.transactions.append((self._next_id("transactions"), account_id, type, Money.parse(amount),
+                                      datetime.datetime.now(), is_public, category))
+
+    def iter_transaction_history(self, user_id, days=TRANSACTION_HISTORY_DAYS):
+        since = datetime.datetime.now() - datetime.timedelta(days=days) if days else datetime.datetime.min
+        with self._lock:
+            account = self._account_for_user(user_id)
+            rows = [t for t in self.transactions if account and t[1] == account["id"] and t[4] >= since]
+        return iter(TransactionBatch((t[2], t[3], t[4]) for t in sorted(rows, key=lambda t: t[4], reverse=True)))
+
+    def get_public_transactions(self, days=PUBLIC_FEED_DAYS):
+        since = datetime.datetime.now() - datetime.timedelta(days=days)
+        with self._lock:
+            rows = []
+            for t in self.transactions:
+                if t[5] and t[4] >= since:
+                    account = self.accounts[t[1]]
+                    rows.append(PublicTransactionRow(t[2], t[3], t[4], self.users[account["user_id"]]["username"]))
+        return sorted(rows, key=lambda row: row.timestamp, reverse=True)[:20]
+
+    def generate_card(self, user_id, card_type):
+        card_number = ''.join([str(random.randint(0, 9)) for _ in range(16)])
+        expiry_date = (datetime.datetime.now() + datetime.timedelta(days=365*4)).strftime("%m/%y")
+        cvv = ''.join([str(random.randint(0, 9)) for _ in range(3)])
+        with self._lock:
+            if card_number in self.card_numbers:
+                return False, "Failed to generate unique card number. Please try again."
+            card_id = self._next_id("cards")
+            self.cards[card_id] = {"id": card_id, "user_id": user_id, "card_number": card_number, "expiry_date": expiry_date,
+                                   "cvv": cvv, "card_type": card_type, "issue_date": datetime.datetime.now(),
+                                   "credit_limit": Money.parse(CARD_CREDIT_LIMIT) if card_type == 'credit' else None, "credit_used": Money(0),
+                                   "failed_checks": 0, "locked": False}
+            self.card_numbers[card_number] = card_id
+        return True, f"{card_type.capitalize()} card generated successfully for user ID {user_id}:\n  Card Number: {card_number}\n  Expiry Date: {expiry_date}\n  CVV: {cvv}"
+
+    def iter_cards(self, user_id):
+        with self._lock:
+            rows = [CardRow(card["card_type"], card["card_number"], card["expiry_date"], card["cvv"])
+                    for card in self.cards.values() if card["user_id"] == user_id]
+        return iter(rows)
+
+    def authorize(self, card_number, expiry, cvv, amount, merchant):
+        amount = Money.parse(amount)
+        with self._lock:
+            card = self.cards.get(self.card_numbers.get(card_number))
+        with velocity_screen.guard(card["user_id"] if card is not None else None):
+            with self._lock:
+                declined, message = self._authorize_card(card, expiry, cvv, amount, merchant)
+                self.card_authorizations.append((card["id"] if card is not None else None, amount, merchant[:100], declined is None, declined,
+                                                 datetime.datetime.now()))
+        return declined is None, message
+
+    def _authorize_card(self, card, expiry, cvv, amount, merchant):
+        record = account = None
+        if card is not None:
+            account = self._account_for_user(card["user_id"])
+            record = CardRecord(card["id"], account["id"] if account else None, card["card_type"], card["expiry_date"], card["cvv"],
+                                card["user_id"], card["locked"])
+        declined = check_card(record, expiry, cvv, amount)
+        if declined == "invalid_details" and card is not None and CARD_MAX_FAILED_CHECKS > 0:
+            card["failed_checks"] += 1
+            card["locked"] = card["failed_checks"] >= CARD_MAX_FAILED_CHECKS
+        if declined:
+            return declined, CARD_DECLINE_MESSAGES[declined]
+        if card["card_type"] == 'credit':
+            if card["credit_used"] + amount > card["credit_limit"]:
+                return "credit_limit", CARD_DECLINE_MESSAGES["credit_limit"]
+            card["credit_used"] += amount
         else:
-            return "No pending money requests."
+            if account["balance"] < amount:
+                return "insufficient_funds", CARD_DECLINE_MESSAGES["insufficient_funds"]
+            allowed, reason = velocity_screen.check(card["user_id"], amount, 'card_payment')
+            if not allowed:
+                return "velocity", f"Declined: {reason}"
+            account["balance"] -= amount
+            self.record_transaction(account["id"], 'card_payment', amount, category=merchant[:50])
+            velocity_screen.record(card["user_id"], amount)
+        card["failed_checks"] = 0
+        return None, f"Approved ${amount:.2f} at {merchant}."
+
+    def apply_for_loan(self, user_id, amount, interest_rate, term_months):
+        amount = Money.parse(amount)
+        if amount <= 0 or interest_rate <= 0 or term_months <= 0:
+            return False, "Invalid loan parameters. Amount, interest rate, and term must be positive."
+        with self._lock:
+            loan_id = self._next_id("loans")
+            self.loans[loan_id] = {"id": loan_id, "user_id": user_id, "amount": amount, "interest_rate": Decimal(str(interest_rate)),
+                                   "term_months": term_months, "start_date": datetime.datetime.now(),
+                                   "remaining_balance": amount, "status": 'active'}
+        return True, f"Loan application for ${amount:.2f} approved. Loan ID: {loan_id}"
+
+    def iter_loans(self, user_id):
+        with self._lock:
+            rows = [LoanRow(loan["id"], loan["amount"], loan["interest_rate"], loan["term_months"], loan["start_date"],
+                            loan["remaining_balance"], loan["status"])
+                    for loan in self.loans.values() if loan["user_id"] == user_id]
+        return iter(rows)
+
+    def make_loan_payment(self, user_id, loan_id, amount, idempotency_key=None):
+        amount = Money.parse(amount)
+        if amount <= 0:
+            return False, "Payment amount must be positive."
+
+        def body():
+            loan = self.loans.get(loan_id)
+            if not loan or loan["user_id"] != user_id:
+                return False, "Loan not found or does not belong to you."
+            payment = amount
+            if payment > loan["remaining_balance"]:
+                message = f"Payment amount ${payment:.2f} exceeds remaining balance ${loan['remaining_balance']:.2f}. Paying full remaining balance."
+                payment = loan["remaining_balance"]
+            else:
+                message = ""
+            loan["remaining_balance"] -= payment
+            loan["status"] = 'paid' if loan["remaining_balance"] <= 0 else 'active'
+            self.loan_payments.append((loan_id, payment, datetime.datetime.now()))
+            final_message = f"Successfully made payment of ${payment:.2f} for Loan ID {loan_id}."
+            if loan["status"] == 'paid':
+                final_message += f"\nLoan ID {loan_id} is now fully paid."
+            return True, message + "\n" + final_message if message else final_message
+
+        return self._idempotent('make_loan_payment', user_id, idempotency_key, body)
+
+    def add_bill(self, user_id, bill_name, due_date_obj, amount):
+        amount = Money.parse(amount)
+        with self._lock:
+            bill_id = self._next_id("bills")
+            self.bills[bill_id] = {"id": bill_id, "user_id": user_id, "bill_name": bill_name, "due_date": due_date_obj,
+                                   "amount": amount, "status": 'pending'}
+        return True, f"Bill '{bill_name}' for ${amount:.2f} due on {due_date_obj.strftime('%Y-%m-%d')} added successfully."
+
+    def get_user_bills(self, user_id):
+        with self._lock:
+            bills = [bill for bill in self.bills.values() if bill["user_id"] == user_id]
+        return [BillRow(bill["id"], bill["bill_name"], bill["due_date"], bill["amount"], bill["status"])
+                for bill in sorted(bills, key=lambda bill: bill["due_date"])]
+
+    def pay_bill(self, user_id, bill_id, idempotency_key=None):
+        def body():
+            bill = self.bills.get(bill_id)
+            if not bill or bill["user_id"] != user_id:
+                return False, "Bill not found or does not belong to you."
+            if bill["status"] == 'paid':
+                return False, f"Bill '{bill['bill_name']}' is already paid."
+            account = self._account_for_user(user_id)
+            if account is None:
+                return False, "Your account not found."
+            if account["balance"] < bill["amount"]:
+                return False, "Insufficient balance to pay this bill."
+            account["balance"] -= bill["amount"]
+            bill["status"] = 'paid'
+            self.record_transaction(account["id"], 'bill_payment', bill["amount"], category='Bill Payment')
+            return True, f"Successfully paid bill '{bill['bill_name']}' for ${bill['amount']:.2f}."
+
+        return self._idempotent('pay_bill', user_id, idempotency_key, body)
+
+    def request_money(self, from_user_id, to_username, amount):
+        amount = Money.parse(amount)
+        if amount <= 0:
+            return False, "Request amount must be positive."
+        with self._lock:
+            to_user = self._user_by_username(to_username)
+            if to_user is None:
+                return False, f"User '{to_username}' not found."
+            request_id = self._next_id("money_requests")
+            self.money_requests[request_id] = {"id": request_id, "from_user_id": from_user_id, "to_user_id": to_user["id"],
+                                               "amount": amount, "status": 'pending', "request_date": datetime.datetime.now()}
+        return True, f"Money request of ${amount:.2f} sent to '{to_username}'."
+
+    def request_money_split(self, from_user_id, to_usernames, amount, include_self=False):
+        usernames = clean_usernames(to_usernames)
+        with self._lock:
+            plan, error = plan_money_split(from_user_id, usernames, amount, include_self, self.get_user_ids_by_usernames(usernames))
+            if error:
+                return False, error
+            for _, to_user_id, share in plan:
+                request_id = self._next_id("money_requests")
+                self.money_requests[request_id] = {"id": request_id, "from_user_id": from_user_id, "to_user_id": to_user_id,
+                                                   "amount": share, "status": 'pending', "request_date": datetime.datetime.now()}
+        return True, describe_money_split(amount, plan)
+
+    def iter_money_requests(self, user_id):
+        with self._lock:
+            requests = [request for request in self.money_requests.values()
+                        if request["to_user_id"] == user_id and request["status"] == 'pending']
+            rows = [MoneyRequestRow(request["id"], self.users[request["from_user_id"]]["username"], request["amount"], request["request_date"])
+                    for request in sorted(requests, key=lambda request: request["request_date"], reverse=True)]
+        return iter(rows)
+
+    def respond_to_money_request(self, request_id, user_id, action, idempotency_key=None):
+        if action not in ('accept', 'decline'):
+            return False, "Invalid action. Use 'accept' or 'decline'."
+        accepted = {}
+
+        def body():
+            request = self.money_requests.get(request_id)
+            if not request or request["to_user_id"] != user_id or request["status"] != 'pending':
+                return False, "Money request not found or already processed."
+            amount = request["amount"]
+            if action == 'decline':
+                request["status"] = 'declined'
+                return True, f"Money request {request_id} declined."
+            recipient_account = self._account_for_user(request["from_user_id"])
+            if recipient_account is None:
+                return False, "Recipient account not found."
+            sender_account = self._account_for_user(user_id)
+            if sender_account is None:
+                return False, "Your account not found."
+            if sender_account["balance"] < amount:
+                return False, "Insufficient balance to accept request."
+            allowed, reason = velocity_screen.check(user_id, amount, 'money_request')
+            if not allowed:
+                return False, reason
+            sender_account["balance"] -= amount
+            self.record_transaction(sender_account["id"], 'transfer_out', amount, category='Money Request Accepted')
+            recipient_account["balance"] += amount
+            self.record_transaction(recipient_account["id"], 'transfer_in', amount, category='Money Request Accepted')
+            request["status"] = 'accepted'
+            accepted["amount"] = amount
+            return True, f"Money request {request_id} accepted. ${amount:.2f} transferred."
+
+        with velocity_screen.guard(user_id):
+            success, message = self._idempotent('respond_to_money_request', user_id, idempotency_key, body)
+            if success and "amount" in accepted:
+                velocity_screen.record(user_id, accepted["amount"])
+            return success, message
+
+    def respond_to_money_requests(self, request_ids, user_id, action, idempotency_key=None):
+        if action not in ('accept', 'decline'):
+            return False, "Invalid action. Use 'accept' or 'decline'."
+        request_ids = sorted(set(request_ids))
+        if not request_ids:
+            return False, "Enter at least one request ID."
+        accepted = {}
+
+        def body():
+            requests = [self.money_requests[request_id] for request_id in request_ids if request_id in self.money_requests
+                        and self.money_requests[request_id]["to_user_id"] == user_id and self.money_requests[request_id]["status"] == 'pending']
+            missing = sorted(set(request_ids) - {request["id"] for request in requests})
+            if missing:
+                return False, f"Money request(s) {', '.join(map(str, missing))} not found or already processed."
+            if action == 'decline':
+                for request in requests:
+                    request["status"] = 'declined'
+                return True, f"Declined {len(requests)} money request(s)."
+            sender_account = self._account_for_user(user_id)
+            if sender_account is None:
+                return False, "Your account not found."
+            recipients = [(request, self._account_for_user(request["from_user_id"])) for request in requests]
+            missing = [request["id"] for request, account in recipients if account is None]
+            if missing:
+                return False, f"Recipient account not found for request(s) {', '.join(map(str, missing))}."
+            total = Money.total(request["amount"] for request in requests)
+            if sender_account["balance"] < total:
+                return False, f"Insufficient balance to accept {len(requests)} request(s) totalling ${total:.2f}."
+            allowed, reason = velocity_screen.check(user_id, total, 'money_request')
+            if not allowed:
+                return False, reason
+            for request, recipient_account in recipients:
+                sender_account["balance"] -= request["amount"]
+                self.record_transaction(sender_account["id"], 'transfer_out', request["amount"], category='Money Request Accepted')
+                recipient_account["balance"] += request["amount"]
+                self.record_transaction(recipient_account["id"], 'transfer_in', request["amount"], category='Money Request Accepted')
+                request["status"] = 'accepted'
+            accepted["amount"] = total
+            return True, f"Accepted {len(requests)} money request(s). ${total:.2f} transferred."
+
+        with velocity_screen.guard(user_id):
+            success, message = self._idempotent('respond_to_money_requests', user_id, idempotency_key, body)
+            if success and "amount" in accepted:
+                velocity_screen.record(user_id, accepted["amount"])
+            return success, message
+
+    def create_session(self, session_id, user_id, expires_at):
+        with self._lock:
+            self.sessions[session_id] = {"user_id": user_id, "expires_at": expires_at, "revoked": False}
+        return True
+
+    def is_session_revoked(self, session_id):
+        with self._lock:
+            session = self.sessions.get(session_id)
+            return (True, None) if session is None else (session["revoked"], session["user_id"])
+
+    def revoke_session(self, session_id):
+        with self._lock:
+            if session_id in self.sessions:
+                self.sessions[session_id]["revoked"] = True
+        return True
+
+    def revoke_user_sessions(self, user_id):
+        now = datetime.datetime.now()
+        with self._lock:
+            session_ids = [session_id for session_id, session in self.sessions.items()
+                           if session["user_id"] == user_id and not session["revoked"] and session["expires_at"] > now]
+            for session_id in session_ids:
+                self.sessions[session_id]["revoked"] = True
+        return session_ids
+
+    def get_dashboard(self, user_id):
+        with self._lock:
+            account = self._account_for_user(user_id)
+            if account is None:
+                return None
+            requests = [request["amount"] for request in self.money_requests.values()
+                        if request["to_user_id"] == user_id and request["status"] == 'pending']
+            bills = sorted((bill["due_date"], bill["bill_name"], bill["amount"]) for bill in self.bills.values()
+                           if bill["user_id"] == user_id and bill["status"] == 'pending')[:DASHBOARD_BILLS]
+            loans = [loan["remaining_balance"] for loan in self.loans.values() if loan["user_id"] == user_id and loan["status"] == 'active']
+            cards = sum(1 for card in self.cards.values() if card["user_id"] == user_id)
+        return DashboardSummary(account["account_number"], account["balance"], len(requests), Money.total(requests),
+                                [(bill_name, due_date, amount) for due_date, bill_name, amount in bills],
+                                len(loans), Money.total(loans), cards)
+
+SHARD_ROUTED_OPERATIONS = (
+    "get_user_details", "update_user_details", "get_account_id_by_user_id", "get_user_account",
+    "deposit_funds", "withdraw_funds", "get_balance_series", "generate_card", "apply_for_loan", "make_loan_payment",
+    "add_bill", "get_user_bills", "pay_bill", "get_dashboard",
+)
+SHARD_ROUTED_ITERATORS = ("iter_transaction_history", "iter_cards", "iter_loans")
+SHARD_SEQUENCE_TABLES = ("accounts", "cards", "loans", "bills", "money_requests")
+SHARD_MOVE_TABLES = (
+    ("users", "id = ANY(%(users)s)", True),
+    ("accounts", "user_id = ANY(%(users)s)", True),
+    ("transactions", "account_id = ANY(%(accounts)s)", False),
+    ("daily_balances", "account_id = ANY(%(accounts)s)", True),
+    ("interest_accruals", "account_id = ANY(%(accounts)s)", True),
+    ("recurring_transfers", "from_account_id = ANY(%(accounts)s)", False),
+    ("cards", "user_id = ANY(%(users)s)", True),
+    ("card_authorizations", "card_id IN (SELECT id FROM cards WHERE user_id = ANY(%(users)s))", False),
+    ("loans", "user_id = ANY(%(users)s)", True),
+    ("loan_payments", "loan_id IN (SELECT id FROM loans WHERE user_id = ANY(%(users)s))", False),
+    ("bills", "user_id = ANY(%(users)s)", True),
+    ("money_requests", "to_user_id = ANY(%(users)s)", True),
+    ("idempotency_keys", "user_id = ANY(%(users)s)", True),
+)
+
+@contextlib.contextmanager
+def shard_cursor(dsn, budget="batch"):
+    with on_shard(dsn):
+        conn = get_db_connection(budget=budget)
+    if conn is None:
+        raise psycopg2.OperationalError("Database connection failed.")
+    cur = conn.cursor()
+    try:
+        yield cur
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+def create_shard_directory():
+    conn = get_db_connection(budget="batch")
+    if conn is None:
+        return False
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS shard_buckets (
+                bucket INTEGER PRIMARY KEY,
+                shard INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS user_directory (
+                user_id SERIAL PRIMARY KEY,
+                username VARCHAR(50) UNIQUE NOT NULL,
+                account_number VARCHAR(20) UNIQUE
+            );
+            CREATE TABLE IF NOT EXISTS shard_transactions (
+                gid VARCHAR(64) PRIMARY KEY,
+                operation VARCHAR(50) NOT NULL,
+                status VARCHAR(20) NOT NULL DEFAULT 'preparing',
+                created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                resolved_at TIMESTAMP
+            );
+        """)
+        conn.commit()
+        return True
     except psycopg2.Error as e:
-        return f"Database error viewing money requests: {e}"
+        conn.rollback()
+        print_message(f"Database error creating the shard directory: {e}", "error")
+        return False
     finally:
         cur.close()
         conn.close()
 
-def respond_to_money_request(request_id, user_id, action):
-    conn = get_db_connection()
-    if conn is None:
-        return False, "Database connection failed."
-    cur = conn.cursor()
-    try:
-        cur.execute("SELECT from_user_id, to_user_id, amount FROM money_requests WHERE id = %s AND to_user_id = %s AND status = 'pending';",
-                    (request_id, user_id))
-        request_data = cur.fetchone()
-        if not request_data:
-            return False, "Money request not found or already processed."
+class ShardMap:
+    def __init__(self, dsns, ttl=SHARD_ROUTE_TTL):
+        self.dsns = list(dsns)
+        self.ttl = ttl
+        self._buckets = None
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+
+    def buckets(self):
+        with self._lock:
+            if self._buckets is not None and self._expires_at > time.monotonic():
+                return self._buckets
+        with on_shard(None):
+            conn = get_db_connection(budget="lookup")
+        if conn is None:
+            return self._buckets
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT shard FROM shard_buckets ORDER BY bucket;")
+            buckets = [row[0] for row in cur.fetchall()]
+        except psycopg2.Error as e:
+            print_message(f"Database error loading the shard map: {e}", "error")
+            return self._buckets
+        finally:
+            cur.close()
+            conn.close()
+        if len(buckets) != SHARD_BUCKETS:
+            return None
+        with self._lock:
+            self._buckets = buckets
+            self._expires_at = time.monotonic() + self.ttl
+        return buckets
+
+    def shard_for_user(self, user_id):
+        buckets = self.buckets()
+        if buckets is None or user_id is None or buckets[user_id % SHARD_BUCKETS] >= len(self.dsns):
+            return SHARD_UNROUTABLE
+        return self.dsns[buckets[user_id % SHARD_BUCKETS]]
+
+    def routes_to(self, user_id, dsn):
+        with shard_cursor(None, budget="lookup") as cur:
+            cur.execute("SELECT shard FROM shard_buckets WHERE bucket = %s;", (user_id % SHARD_BUCKETS,))
+            row = cur.fetchone()
+        return row is not None and row[0] < len(self.dsns) and self.dsns[row[0]] == dsn
+
+    def invalidate(self):
+        with self._lock:
+            self._expires_at = 0.0
+
+def resolve_shard_transaction(cur, gid, status):
+    cur.execute("UPDATE shard_transactions SET status = %s, resolved_at = CURRENT_TIMESTAMP WHERE gid = %s AND status = 'preparing' RETURNING gid;",
+                (status, gid))
+    return cur.fetchone() is not None
+
+def run_two_phase(operation, user_id, legs, idempotency_key=None, on_commit=None):
+    gid = f"{SHARD_GID_PREFIX}{uuid.uuid4().hex}"
+    with on_shard(None):
+        directory = get_db_connection()
+    if directory is None:
+        return False, "Database connection failed."
+    dcur = directory.cursor()
+    connections = []
+    prepared = False
+
+    def abort(result):
+        for conn in connections:
+            try:
+                conn.tpc_rollback()
+            except psycopg2.Error:
+                pass
+        try:
+            directory.rollback()
+            resolve_shard_transaction(dcur, gid, 'aborted')
+            directory.commit()
+        except psycopg2.Error:
+            pass
+        return result
+
+    try:
+        dcur.execute("INSERT INTO shard_transactions (gid, operation) VALUES (%s, %s);", (gid, operation))
+        directory.commit()
+        messages = []
+        for index, (dsn, body) in enumerate(legs):
+            with on_shard(dsn):
+                conn = get_db_connection(pooled=False)
+            if conn is None:
+                return abort((False, "Database connection failed."))
+            connections.append(conn)
+            conn.tpc_begin(f"{gid}_{index}")
+            cur = conn.cursor()
+            if index == 0 and idempotency_key is not None:
+                stored_result = claim_idempotency_key(cur, idempotency_key, user_id, operation)
+                if stored_result is not None:
+                    return abort(stored_result)
+            success, message = body(cur)
+            if not success:
+                return abort((success, message))
+            messages.append(message)
+        message = next((message for message in messages if message), "")
+        if idempotency_key is not None:
+            connections[0].cursor().execute("UPDATE idempotency_keys SET success = TRUE, message = %s WHERE idempotency_key = %s;",
+                                            (message, idempotency_key))
+        for conn in connections:
+            conn.tpc_prepare()
+        prepared = True
+        committed = resolve_shard_transaction(dcur, gid, 'committed')
+        if committed and on_commit is not None:
+            on_commit(dcur)
+        directory.commit()
+        if not committed:
+            return abort((False, f"{operation.replace('_', ' ').capitalize()} timed out and was rolled back."))
+        for conn in connections:
+            try:
+                conn.tpc_commit()
+            except psycopg2.Error:
+                pass
+        dashboard_cache.invalidate(current_session.get())
+        return True, message
+    except Exception as e:
+        if prepared:
+            return False, f"{operation.replace('_', ' ').capitalize()} is in doubt and will be settled by 'python main.py recover-shards': {e}"
+        if isinstance(e, psycopg2.Error):
+            return abort((False, f"Database error during {operation.replace('_', ' ')}: {e}"))
+        return abort((False, f"An unexpected error occurred during {operation.replace('_', ' ')}: {e}"))
+    finally:
+        dcur.close()
+        directory.close()
+        for conn in connections:
+            conn.close()
+
+def resolve_in_doubt(shards, older_than=SHARD_PREPARED_TIMEOUT):
+    cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=older_than)
+    committed = rolled_back = 0
+    errors = []
+    with on_shard(None):
+        directory = get_db_connection()
+    if directory is None:
+        return committed, rolled_back, ["directory: connection failed"]
+    dcur = directory.cursor()
+    try:
+        for index, dsn in enumerate(shards):
+            with on_shard(dsn):
+                conn = get_db_connection(pooled=False)
+            if conn is None:
+                errors.append(f"shard {index}: connection failed")
+                continue
+            try:
+                for xid in conn.tpc_recover():
+                    gtrid = xid.gtrid or ""
+                    if not gtrid.startswith(SHARD_GID_PREFIX) or xid.database != conn.info.dbname or xid.prepared > cutoff:
+                        continue
+                    gid = gtrid.rsplit("_", 1)[0]
+                    resolve_shard_transaction(dcur, gid, 'aborted')
+                    dcur.execute("SELECT status FROM shard_transactions WHERE gid = %s;", (gid,))
+                    row = dcur.fetchone()
+                    directory.commit()
+                    if row is not None and row[0] == 'committed':
+                        conn.tpc_commit(xid)
+                        committed += 1
+                    else:
+                        conn.tpc_rollback(xid)
+                        rolled_back += 1
+            except psycopg2.Error as e:
+                directory.rollback()
+                errors.append(f"shard {index}: {str(e).strip()}")
+            finally:
+                conn.close()
+    finally:
+        dcur.close()
+        directory.close()
+    return committed, rolled_back, errors
+
+def recover_shard_transactions(shards, older_than=SHARD_PREPARED_TIMEOUT):
+    committed, rolled_back, errors = resolve_in_doubt(shards, older_than)
+    message = f"Settled {committed + rolled_back} in-doubt transaction(s) older than {older_than:.0f}s: {committed} committed, {rolled_back} rolled back."
+    if errors:
+        return False, message + "\n" + "\n".join(errors)
+    return True, message
+
+def credit_shard_accounts(cur, credits, category=None):
+    accounts = lock_accounts_by_user_ids(cur, {user_id for user_id, _ in credits})
+    if any(user_id not in accounts for user_id, _ in credits):
+        return False, "Recipient account not found."
+    for user_id, amount in credits:
+        prepared_statements.execute(cur, "credit_account", (amount, accounts[user_id][0]))
+        record_transaction(accounts[user_id][0], 'transfer_in', amount, category=category, cur=cur)
+    return True, None
+
+def shard_routed(name):
+    operation = globals()[name]
+
+    def routed(self, user_id, *args, **kwargs):
+        with on_shard(self.shard_for_user(user_id)):
+            return operation(user_id, *args, **kwargs)
+    routed.__name__ = name
+    return routed
+
+def shard_routed_iterator(name):
+    operation = globals()[name]
+
+    def routed(self, user_id, *args, **kwargs):
+        return iter_on_shard(self.shard_for_user(user_id), operation(user_id, *args, **kwargs))
+    routed.__name__ = name
+    return routed
+
+class ShardedStorage(PostgresStorage):
+    name = "sharded"
+
+    def __init__(self, shards=None):
+        self.shards = list(DATABASE_SHARD_URLS if shards is None else shards)
+        if not self.shards:
+            raise ValueError("The sharded storage backend needs DATABASE_SHARD_URLS (comma-separated shard DSNs).")
+        if len(self.shards) > SHARD_ID_STRIDE:
+            raise ValueError(f"At most {SHARD_ID_STRIDE} shards are supported.")
+        self.shard_map = ShardMap(self.shards)
+
+    def shard_for_user(self, user_id):
+        return self.shard_map.shard_for_user(user_id)
+
+    def group_by_shard(self, items, user_id):
+        groups = {}
+        for item in items:
+            groups.setdefault(self.shard_for_user(user_id(item)), []).append(item)
+        return groups
+
+    def create_schema(self):
+        if not create_tables() or not create_shard_directory():
+            return False
+        for dsn in self.shards:
+            with on_shard(dsn):
+                if not create_tables():
+                    return False
+        if self.shard_map.buckets() is None:
+            print_message("The shard map is empty. Run 'python main.py init-shards' to set it up.", "info")
+            return False
+        return True
+
+    def init_shards(self):
+        if not create_tables() or not create_shard_directory():
+            return False, "Could not create the shard directory."
+        users = 0
+        try:
+            for index, dsn in enumerate(self.shards):
+                with on_shard(dsn):
+                    if not create_tables():
+                        return False, f"Could not create tables on shard {index}."
+                with shard_cursor(dsn) as cur:
+                    cur.execute("""
+                        ALTER TABLE money_requests DROP CONSTRAINT IF EXISTS money_requests_from_user_id_fkey;
+                        ALTER TABLE chats DROP CONSTRAINT IF EXISTS chats_from_user_id_fkey;
+                        ALTER TABLE chats DROP CONSTRAINT IF EXISTS chats_to_user_id_fkey;
+                    """)
+            with shard_cursor(None) as cur:
+                cur.execute("SELECT COUNT(*) FROM shard_buckets;")
+                mapped = cur.fetchone()[0]
+            if mapped < SHARD_BUCKETS:
+                populated = []
+                for index, dsn in enumerate(self.shards):
+                    with shard_cursor(dsn) as cur:
+                        cur.execute("SELECT u.id, u.username, a.account_number FROM users u LEFT JOIN accounts a ON a.user_id = u.id ORDER BY u.id;")
+                        rows = cur.fetchall()
+                    if rows:
+                        populated.append((index, rows))
+                if len(populated) > 1:
+                    return False, (f"Shards {', '.join(str(index) for index, _ in populated)} already hold users but there is no shard map. "
+                                   "Start from one populated database and empty shards.")
+                with shard_cursor(None) as cur:
+                    if populated:
+                        home, rows = populated[0]
+                        users = len(rows)
+                        execute_values(cur, "INSERT INTO user_directory (user_id, username, account_number) VALUES %s ON CONFLICT DO NOTHING;", rows)
+                        cur.execute("SELECT setval('user_directory_user_id_seq', GREATEST((SELECT MAX(user_id) FROM user_directory), 1));")
+                    execute_values(cur, "INSERT INTO shard_buckets (bucket, shard) VALUES %s ON CONFLICT DO NOTHING;",
+                                   [(bucket, populated[0][0] if populated else bucket % len(self.shards)) for bucket in range(SHARD_BUCKETS)])
+            self.interleave_sequences()
+        except psycopg2.Error as e:
+            return False, f"Database error initialising shards: {str(e).strip()}"
+        self.shard_map.invalidate()
+        return True, f"Shard map ready: {SHARD_BUCKETS} buckets over {len(self.shards)} shard(s), {users} existing user(s) added to the directory."
+
+    def interleave_sequences(self):
+        highest = dict.fromkeys(SHARD_SEQUENCE_TABLES, 0)
+        for dsn in self.shards:
+            with shard_cursor(dsn) as cur:
+                for table in SHARD_SEQUENCE_TABLES:
+                    cur.execute(sql.SQL("SELECT COALESCE(MAX(id), 0) FROM {};").format(sql.Identifier(table)))
+                    highest[table] = max(highest[table], cur.fetchone()[0])
+        for index, dsn in enumerate(self.shards):
+            with shard_cursor(dsn) as cur:
+                for table in SHARD_SEQUENCE_TABLES:
+                    sequence = f"{table}_id_seq"
+                    cur.execute("SELECT increment_by FROM pg_sequences WHERE schemaname = current_schema() AND sequencename = %s;", (sequence,))
+                    if cur.fetchone()[0] == SHARD_ID_STRIDE:
+                        continue
+                    cur.execute(sql.SQL("ALTER SEQUENCE {} INCREMENT BY {};").format(sql.Identifier(sequence), sql.Literal(SHARD_ID_STRIDE)))
+                    cur.execute("SELECT setval(%s, %s, false);", (sequence, (highest[table] // SHARD_ID_STRIDE + 1) * SHARD_ID_STRIDE + index))
+
+    def register_user(self, username, password, full_name, email, phone_number, address, date_of_birth):
+        conn = get_db_connection()
+        if conn is None:
+            return False, "Database connection failed."
+        cur = conn.cursor()
+        try:
+            cur.execute("INSERT INTO user_directory (username) VALUES (%s) RETURNING user_id;", (username,))
+            user_id = cur.fetchone()[0]
+            conn.commit()
+        except psycopg2.errors.UniqueViolation:
+            conn.rollback()
+            return False, "Username already exists."
+        except psycopg2.Error as e:
+            conn.rollback()
+            return False, f"Database error during registration: {e}"
+        finally:
+            cur.close()
+            conn.close()
+
+        for _ in range(SHARD_ROUTE_ATTEMPTS):
+            dsn = self.shard_for_user(user_id)
+            rerouted = []
+
+            def still_routed():
+                if self.shard_map.routes_to(user_id, dsn):
+                    return True
+                rerouted.append(dsn)
+                return False
+
+            with on_shard(dsn):
+                success, message = register_user(username, password, full_name, email, phone_number, address, date_of_birth,
+                                                 user_id=user_id, shard_check=still_routed)
+                account = load_user_account(user_id) if success else None
+            if not rerouted:
+                break
+            self.shard_map.invalidate()
+        conn = get_db_connection()
+        if conn is None:
+            return success, message
+        cur = conn.cursor()
+        try:
+            if account is not None:
+                cur.execute("UPDATE user_directory SET account_number = %s WHERE user_id = %s;", (account.account_number, user_id))
+            elif not success:
+                cur.execute("DELETE FROM user_directory WHERE user_id = %s;", (user_id,))
+            conn.commit()
+        except psycopg2.Error as e:
+            conn.rollback()
+            print_message(f"Database error updating the user directory: {e}", "error")
+        finally:
+            cur.close()
+            conn.close()
+        return success, message
+
+    def login_user(self, username, password):
+        user_id = self.get_user_id_by_username(username)
+        if user_id is None:
+            audit_log.record('login_failure', None, username)
+            return None, None, "Invalid username or password."
+        with on_shard(self.shard_for_user(user_id)):
+            return login_user(username, password)
+
+    def get_user_id_by_username(self, username):
+        return cached_identity_lookup("user_id_by_username", username,
+                                      lambda cur, key: cur.execute("SELECT user_id FROM user_directory WHERE username = %s;", (key,)),
+                                      "user ID by username")
+
+    def get_username_by_user_id(self, user_id):
+        return cached_identity_lookup("username_by_user_id", user_id,
+                                      lambda cur, key: cur.execute("SELECT username FROM user_directory WHERE user_id = %s;", (key,)),
+                                      "username by user ID")
+
+    def get_user_id_by_account_number(self, account_number):
+        return cached_identity_lookup("user_id_by_account_number", account_number,
+                                      lambda cur, key: cur.execute("SELECT user_id FROM user_directory WHERE account_number = %s;", (key,)),
+                                      "user ID by account number")
+
+    def get_user_ids_by_usernames(self, usernames):
+        return cached_identity_batch("user_id_by_username", usernames,
+                                     "SELECT username, user_id FROM user_directory WHERE username = ANY(%s);", "user IDs by username")
+
+    def get_usernames_by_user_ids(self, user_ids):
+        return cached_identity_batch("username_by_user_id", user_ids,
+                                     "SELECT user_id, username FROM user_directory WHERE user_id = ANY(%s);", "usernames by user ID")
+
+    def get_account_id_by_account_number(self, account_number):
+        user_id = self.get_user_id_by_account_number(account_number)
+        if user_id is None:
+            return None
+        with on_shard(self.shard_for_user(user_id)):
+            return get_account_id_by_account_number(account_number)
+
+    def get_account_ids_by_account_numbers(self, account_numbers):
+        owners = cached_identity_batch("user_id_by_account_number", account_numbers,
+                                       "SELECT account_number, user_id FROM user_directory WHERE account_number = ANY(%s);", "user IDs by account number")
+        found = {}
+        for dsn, numbers in self.group_by_shard(owners, owners.get).items():
+            with on_shard(dsn):
+                found.update(get_account_ids_by_account_numbers(numbers))
+        return found
+
+    def search_users(self, query):
+        users = []
+        for dsn in self.shards:
+            with on_shard(dsn):
+                found, error = find_users(query)
+            if error:
+                return error
+            users.extend(found)
+        return format_user_search(sorted(users))
+
+    def get_public_transactions(self, days=PUBLIC_FEED_DAYS):
+        return degraded_reads.call(("public_transactions", days), lambda: self.load_public_transactions(days), [])
+
+    def load_public_transactions(self, days=PUBLIC_FEED_DAYS):
+        rows = []
+        for dsn in self.shards:
+            with on_shard(dsn):
+                rows.extend(load_public_transactions(days))
+        return sorted(rows, key=operator.attrgetter("timestamp"), reverse=True)[:20]
+
+    def card_owner(self, card_number):
+        for dsn in self.shards:
+            with on_shard(dsn):
+                user_id = cached_identity_lookup("user_id_by_card_number", card_number,
+                                                 lambda cur, key: cur.execute("SELECT user_id FROM cards WHERE card_number = %s;", (key,)),
+                                                 "card owner")
+            if user_id is not None:
+                return user_id
+        return None
+
+    def authorize(self, card_number, expiry, cvv, amount, merchant):
+        user_id = self.card_owner(card_number)
+        if user_id is None:
+            return authorize(card_number, expiry, cvv, amount, merchant)
+        with on_shard(self.shard_for_user(user_id)):
+            return authorize(card_number, expiry, cvv, amount, merchant)
+
+    def transfer_funds(self, from_user_id, to_account_number, amount, idempotency_key=None):
+        to_user_id = self.get_user_id_by_account_number(to_account_number)
+        if to_user_id is None:
+            return False, "Recipient account not found."
+        source = self.shard_for_user(from_user_id)
+        target = self.shard_for_user(to_user_id)
+        if source == target:
+            with on_shard(source):
+                return transfer_funds(from_user_id, to_account_number, amount, idempotency_key)
+        amount = Money.parse(amount)
+        if amount <= 0:
+            return False, "Transfer amount must be positive."
+
+        def debit(cur):
+            accounts = lock_accounts_by_user_ids(cur, (from_user_id,))
+            if from_user_id not in accounts:
+                return False, "Your account not found."
+            account_id, balance = accounts[from_user_id]
+            if balance < amount:
+                return False, "Insufficient balance."
+            prepared_statements.execute(cur, "debit_account", (amount, account_id))
+            record_transaction(account_id, 'transfer_out', amount, cur=cur)
+            return True, f"Successfully transferred ${amount:.2f} to account {to_account_number}."
+
+        with velocity_screen.guard(from_user_id):
+            allowed, reason = velocity_screen.check(from_user_id, amount, 'transfer')
+            if not allowed:
+                return False, reason
+            success, message = run_two_phase('transfer_funds', from_user_id, [
+                (source, debit),
+                (target, lambda cur: credit_shard_accounts(cur, [(to_user_id, amount)])),
+            ], idempotency_key)
+            if success:
+                velocity_screen.record(from_user_id, amount)
+            return success, message
 
-        from_user_id, to_user_id, amount = request_data
+    def request_money(self, from_user_id, to_username, amount):
+        to_user_id = self.get_user_id_by_username(to_username)
+        if to_user_id is None:
+            return False, f"User '{to_username}' not found."
+        with on_shard(self.shard_for_user(to_user_id)):
+            return request_money(from_user_id, to_username, amount)
 
-        if action == 'accept':
-            recipient_account = get_user_account(from_user_id)
-            if recipient_account is None:
-                return False, "Recipient account not found."
+    def request_money_split(self, from_user_id, to_usernames, amount, include_self=False):
+        usernames = clean_usernames(to_usernames)
+        plan, error = plan_money_split(from_user_id, usernames, amount, include_self, self.get_user_ids_by_usernames(usernames))
+        if error:
+            return False, error
+        groups = self.group_by_shard(plan, operator.itemgetter(1))
+        if len(groups) == 1:
+            with on_shard(next(iter(groups))):
+                return request_money_split(from_user_id, usernames, amount, include_self)
 
-            sender_account = get_user_account(to_user_id)
-            if sender_account is None:
+        def insert_requests(cur, part):
+            execute_values(cur, "INSERT INTO money_requests (from_user_id, to_user_id, amount) VALUES %s;",
+                           [(from_user_id, to_user_id, share.to_decimal()) for _, to_user_id, share in part])
+            return True, None
+
+        success, message = run_two_phase('request_money_split', from_user_id,
+                                         [(dsn, lambda cur, part=part: insert_requests(cur, part)) for dsn, part in groups.items()])
+        return (True, describe_money_split(amount, plan)) if success else (success, message)
+
+    def iter_money_requests(self, user_id):
+        requests = list(iter_on_shard(self.shard_for_user(user_id), stream_query("""
+            SELECT id, from_user_id, amount, request_date FROM money_requests
+            WHERE to_user_id = %s AND status = 'pending'
+            ORDER BY request_date DESC;
+        """, (user_id,), readonly=False)))
+        usernames = self.get_usernames_by_user_ids([from_user_id for _, from_user_id, _, _ in requests])
+        return iter([MoneyRequestRow(request_id, usernames.get(from_user_id, f"user {from_user_id}"), amount, request_date)
+                     for request_id, from_user_id, amount, request_date in requests])
+
+    def pending_requesters(self, shard, request_ids, user_id):
+        with on_shard(shard):
+            conn = get_db_connection(budget="lookup")
+        if conn is None:
+            return {}
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT id, from_user_id FROM money_requests WHERE id = ANY(%s) AND to_user_id = %s AND status = 'pending';",
+                        (list(request_ids), user_id))
+            return dict(cur.fetchall())
+        except psycopg2.Error as e:
+            print_message(f"Database error reading money requests: {e}", "error")
+            return {}
+        finally:
+            cur.close()
+            conn.close()
+
+    def accept_across_shards(self, operation, request_ids, user_id, requesters, idempotency_key, describe):
+        shards = {from_user_id: self.shard_for_user(from_user_id) for from_user_id in requesters.values()}
+        accepted = {}
+
+        def pay(cur):
+            cur.execute("""
+                SELECT id, from_user_id, amount FROM money_requests
+                WHERE id = ANY(%s) AND to_user_id = %s AND status = 'pending'
+                ORDER BY id FOR UPDATE;
+            """, (request_ids, user_id))
+            requests = [(request_id, from_user_id, Money.from_db(amount)) for request_id, from_user_id, amount in cur.fetchall()]
+            missing = sorted(set(request_ids) - {request_id for request_id, _, _ in requests})
+            if missing:
+                return False, f"Money request(s) {', '.join(map(str, missing))} not found or already processed."
+            if any(from_user_id not in shards for _, from_user_id, _ in requests):
+                return False, "Money requests changed while accepting them. Please try again."
+            total = Money.total(amount for _, _, amount in requests)
+            accounts = lock_accounts_by_user_ids(cur, (user_id,))
+            if user_id not in accounts:
                 return False, "Your account not found."
+            account_id, balance = accounts[user_id]
+            if balance < total:
+                return False, f"Insufficient balance to accept {len(requests)} request(s) totalling ${total:.2f}."
+            allowed, reason = velocity_screen.check(user_id, total, 'money_request')
+            if not allowed:
+                return False, reason
+            for _, _, amount in requests:
+                prepared_statements.execute(cur, "debit_account", (amount, account_id))
+                record_transaction(account_id, 'transfer_out', amount, category='Money Request Accepted', cur=cur)
+            cur.execute("UPDATE money_requests SET status = 'accepted' WHERE id = ANY(%s);", (request_ids,))
+            accepted["requests"] = requests
+            accepted["amount"] = total
+            return True, describe(requests, total)
 
-            if sender_account.balance < amount:
-                return False, "Insufficient balance to accept request."
+        def credit(cur, dsn):
+            return credit_shard_accounts(cur, [(from_user_id, amount) for _, from_user_id, amount in accepted["requests"] if shards[from_user_id] == dsn],
+                                         'Money Request Accepted')
 
-            cur.execute("UPDATE accounts SET balance = balance - %s WHERE user_id = %s;", (amount, to_user_id))
-            record_transaction(get_account_id_by_user_id(to_user_id), 'transfer_out', amount, category='Money Request Accepted')
+        legs = [(self.shard_for_user(user_id), pay)] + [(dsn, lambda cur, dsn=dsn: credit(cur, dsn)) for dsn in dict.fromkeys(shards.values())]
+        with velocity_screen.guard(user_id):
+            success, message = run_two_phase(operation, user_id, legs, idempotency_key)
+            if success and "amount" in accepted:
+                velocity_screen.record(user_id, accepted["amount"])
+            return success, message
 
-            cur.execute("UPDATE accounts SET balance = balance + %s WHERE user_id = %s;", (amount, from_user_id))
-            record_transaction(get_account_id_by_user_id(from_user_id), 'transfer_in', amount, category='Money Request Accepted')
+    def respond_to_money_request(self, request_id, user_id, action, idempotency_key=None):
+        shard = self.shard_for_user(user_id)
+        requesters = self.pending_requesters(shard, [request_id], user_id) if action == 'accept' else {}
+        if all(self.shard_for_user(from_user_id) == shard for from_user_id in requesters.values()):
+            with on_shard(shard):
+                return respond_to_money_request(request_id, user_id, action, idempotency_key)
+        return self.accept_across_shards('respond_to_money_request', [request_id], user_id, requesters, idempotency_key,
+                                         lambda requests, total: f"Money request {request_id} accepted. ${total:.2f} transferred.")
 
-            cur.execute("UPDATE money_requests SET status = 'accepted' WHERE id = %s;", (request_id,))
-            conn.commit()
-            return True, f"Money request {request_id} accepted. ${amount:.2f} transferred."
-        elif action == 'decline':
-            cur.execute("UPDATE money_requests SET status = 'declined' WHERE id = %s;", (request_id,))
-            conn.commit()
-            return True, f"Money request {request_id} declined."
-        else:
-            return False, "Invalid action. Use 'accept' or 'decline'."
-    except psycopg2.Error as e:
-        conn.rollback()
-        return False, f"Database error responding to money request: {e}"
-    except Exception as e:
-        conn.rollback()
-        return False, f"An unexpected error occurred while responding to money request: {e}"
-    finally:
-        cur.close()
-        conn.close()
+    def respond_to_money_requests(self, request_ids, user_id, action, idempotency_key=None):
+        shard = self.shard_for_user(user_id)
+        request_ids = sorted(set(request_ids))
+        requesters = self.pending_requesters(shard, request_ids, user_id) if action == 'accept' else {}
+        if all(self.shard_for_user(from_user_id) == shard for from_user_id in requesters.values()):
+            with on_shard(shard):
+                return respond_to_money_requests(request_ids, user_id, action, idempotency_key)
+        return self.accept_across_shards('respond_to_money_requests', request_ids, user_id, requesters, idempotency_key,
+                                         lambda requests, total: f"Accepted {len(requests)} money request(s). ${total:.2f} transferred.")
 
-def add_bill(user_id, bill_name, due_date_obj, amount):
-    conn = get_db_connection()
-    if conn is None:
-        return False, "Database connection failed."
-    cur = conn.cursor()
-    try:
-        cur.execute("INSERT INTO bills (user_id, bill_name, due_date, amount, status) VALUES (%s, %s, %s, %s, %s);",
-                    (user_id, bill_name, due_date_obj, amount, 'pending'))
-        conn.commit()
-        return True, f"Bill '{bill_name}' for ${amount:.2f} due on {due_date_obj.strftime('%Y-%m-%d')} added successfully."
-    except psycopg2.Error as e:
-        conn.rollback()
-        return False, f"Database error adding bill: {e}"
-    finally:
-        cur.close()
-        conn.close()
+    def move_bucket(self, bucket, target):
+        if not 0 <= bucket < SHARD_BUCKETS:
+            return False, f"Bucket must be between 0 and {SHARD_BUCKETS - 1}."
+        if not 0 <= target < len(self.shards):
+            return False, f"Shard must be between 0 and {len(self.shards) - 1}."
+        self.shard_map.invalidate()
+        buckets = self.shard_map.buckets()
+        if buckets is None:
+            return False, "The shard map is empty. Run 'python main.py init-shards' first."
+        source = buckets[bucket]
+        if source == target:
+            return True, f"Bucket {bucket} is already on shard {target}."
+        moved = {}
 
-def get_user_bills(user_id):
-    conn = get_db_connection()
-    if conn is None:
-        return []
-    cur = conn.cursor()
-    try:
-        cur.execute("SELECT id, bill_name, due_date, amount, status FROM bills WHERE user_id = %s ORDER BY due_date ASC;", (user_id,))
-        bills = cur.fetchall()
-        return bills
-    except psycopg2.Error as e:
-        print_message(f"Database error retrieving user bills: {e}", "error")
-        return []
-    finally:
-        cur.close()
-        conn.close()
+        def take(cur):
+            # Block registrations routed with a stale map until the move commits.
+            cur.execute("LOCK TABLE users IN SHARE ROW EXCLUSIVE MODE;")
+            cur.execute("SELECT id FROM users WHERE mod(id, %s) = %s ORDER BY id FOR UPDATE;", (SHARD_BUCKETS, bucket))
+            keys = {"users": [row[0] for row in cur.fetchall()]}
+            cur.execute("SELECT id FROM accounts WHERE user_id = ANY(%(users)s) ORDER BY id FOR UPDATE;", keys)
+            keys["accounts"] = [row[0] for row in cur.fetchall()]
+            for table, where, keep_ids in SHARD_MOVE_TABLES:
+                cur.execute(sql.SQL("SELECT * FROM {} WHERE " + where + ";").format(sql.Identifier(table)), keys)
+                columns = [column.name for column in cur.description]
+                kept = [index for index, column in enumerate(columns) if keep_ids or column != "id"]
+                moved[table] = ([columns[index] for index in kept], [tuple(row[index] for index in kept) for row in cur.fetchall()])
+            for table, where, _ in reversed(SHARD_MOVE_TABLES):
+                cur.execute(sql.SQL("DELETE FROM {} WHERE " + where + ";").format(sql.Identifier(table)), keys)
+            return True, f"Moved bucket {bucket} ({len(keys['users'])} users) from shard {source} to shard {target}."
 
-def pay_bill(user_id, bill_id):
-    conn = get_db_connection()
-    if conn is None:
-        return False, "Database connection failed."
-    cur = conn.cursor()
-    try:
-        cur.execute("SELECT bill_name, amount, status FROM bills WHERE id = %s AND user_id = %s;", (bill_id, user_id))
-        bill_data = cur.fetchone()
-        if not bill_data:
-            return False, "Bill not found or does not belong to you."
+        def place(cur):
+            for table, _, _ in SHARD_MOVE_TABLES:
+                columns, rows = moved[table]
+                if rows:
+                    execute_values(cur, sql.SQL("INSERT INTO {} ({}) VALUES %s;").format(
+                        sql.Identifier(table), sql.SQL(", ").join(map(sql.Identifier, columns))).as_string(cur), rows, page_size=1000)
+            return True, None
 
-        bill_name, amount, status = bill_data
-        if status == 'paid':
-            return False, f"Bill '{bill_name}' is already paid."
+        success, message = run_two_phase('move_bucket', None, [(self.shards[source], take), (self.shards[target], place)],
+                                         on_commit=lambda cur: cur.execute("UPDATE shard_buckets SET shard = %s WHERE bucket = %s;", (target, bucket)))
+        self.shard_map.invalidate()
+        return success, message
 
-        account = get_user_account(user_id)
-        if account is None:
-            return False, "Your account not found."
+    def rebalance(self, max_moves=SHARD_BUCKETS):
+        buckets = self.shard_map.buckets()
+        if buckets is None:
+            return False, "The shard map is empty. Run 'python main.py init-shards' first."
+        try:
+            with shard_cursor(None, budget="lookup") as cur:
+                cur.execute("SELECT mod(user_id, %s), COUNT(*) FROM user_directory GROUP BY 1;", (SHARD_BUCKETS,))
+                sizes = dict(cur.fetchall())
+        except psycopg2.Error as e:
+            return False, f"Database error reading the user directory: {str(e).strip()}"
+        buckets = list(buckets)
+        loads = [0] * len(self.shards)
+        for bucket, shard in enumerate(buckets):
+            loads[shard] += sizes.get(bucket, 0)
+        moves = []
+        while len(moves) < max_moves:
+            source = max(range(len(loads)), key=loads.__getitem__)
+            target = min(range(len(loads)), key=loads.__getitem__)
+            candidates = [bucket for bucket, shard in enumerate(buckets) if shard == source and 0 < sizes.get(bucket, 0) < loads[source] - loads[target]]
+            if not candidates:
+                break
+            bucket = max(candidates, key=lambda candidate: sizes[candidate])
+            success, message = self.move_bucket(bucket, target)
+            if not success:
+                return False, "\n".join(moves + [message])
+            print(message, flush=True)
+            moves.append(message)
+            buckets[bucket] = target
+            loads[source] -= sizes[bucket]
+            loads[target] += sizes[bucket]
+        return True, f"Rebalanced with {len(moves)} bucket move(s). Users per shard: " + ", ".join(f"{index}: {load}" for index, load in enumerate(loads)) + "."
 
-        if account.balance < amount:
-            return False, "Insufficient balance to pay this bill."
+    def fan_out(self, action):
+        success = True
+        messages = []
+        for index, dsn in enumerate(self.shards):
+            print(f"Shard {index}:", flush=True)
+            with on_shard(dsn):
+                shard_success, message = action(index)
+            success = success and shard_success
+            messages.append(f"Shard {index}: {message}")
+        return success, "\n".join(messages)
 
-        if account.withdraw(amount):
-            cur.execute("UPDATE bills SET status = 'paid' WHERE id = %s;", (bill_id,))
-            record_transaction(account.account_id, 'bill_payment', amount, category='Bill Payment')
-            conn.commit()
-            return True, f"Successfully paid bill '{bill_name}' for ${amount:.2f}."
-        else:
-            conn.rollback()
-            return False, "Failed to process payment."
-    except psycopg2.Error as e:
-        conn.rollback()
-        return False, f"Database error paying bill: {e}"
-    except Exception as e:
-        conn.rollback()
-        return False, f"An unexpected error occurred during bill payment: {e}"
-    finally:
-        cur.close()
-        conn.close()
+    def run_sweeper(self, stop, interval=SHARD_SWEEP_INTERVAL):
+        while not stop.wait(interval):
+            committed, rolled_back, errors = resolve_in_doubt(self.shards)
+            if committed or rolled_back:
+                print_message(f"Settled {committed + rolled_back} in-doubt shard transaction(s): {committed} committed, {rolled_back} rolled back.", "info")
+            for error in errors:
+                print_message(f"Shard recovery failed for {error}", "error")
+
+for storage_operation in SHARD_ROUTED_OPERATIONS:
+    setattr(ShardedStorage, storage_operation, shard_routed(storage_operation))
+for storage_operation in SHARD_ROUTED_ITERATORS:
+    setattr(ShardedStorage, storage_operation, shard_routed_iterator(storage_operation))
+
+def run_shard_command(action):
+    if storage.name != "sharded":
+        return False, "Sharding is not enabled. Set STORAGE_BACKEND=sharded and DATABASE_SHARD_URLS."
+    return action(storage)
+
+def run_maintenance_command(action):
+    if storage.name == "sharded":
+        return run_shard_command(lambda sharded: sharded.fan_out(action))
+    return action(None)
+
+def run_import_command(path, report_path, chunk_size, processes):
+    if storage.name == "sharded":
+        return False, ("import-users writes straight to one database and cannot route users through the shard directory. "
+                       "Import into a single database before running init-shards, or register users through the application.")
+    return import_users(path, report_path, chunk_size, processes)
+
+STORAGE_BACKENDS = {"postgres": PostgresStorage, "memory": MemoryStorage, "sharded": ShardedStorage}
+
+def get_storage(name=STORAGE_BACKEND):
+    if name not in STORAGE_BACKENDS:
+        raise ValueError(f"Unknown storage backend '{name}'. Choose one of: {', '.join(STORAGE_BACKENDS)}.")
+    return STORAGE_BACKENDS[name]()
+
+storage = get_storage()
 
 LINE_SEP = "=" * 50
+SPARKLINE_BARS = "▁▂▃▄▅▆▇█"
+SPARKLINE_WIDTH = 60
+BALANCE_HISTORY_PERIODS = (30, 90, 365)
 SUB_LINE_SEP = "-" * 50
 MENU_WIDTH = 50
 
@@ -811,6 +4749,199 @@ def print_menu_item(number, text):
 def print_footer():
     print(LINE_SEP)
 
+class Column:
+    __slots__ = ("header", "formatter", "align")
+
+    def __init__(self, header, formatter=str, align="<"):
+        self.header = header
+        self.formatter = formatter
+        self.align = align
+
+def format_money(value):
+    return f"${Money.parse(value):.2f}"
+
+def format_timestamp(value):
+    return value.strftime('%Y-%m-%d %H:%M:%S')
+
+def export_value(value):
+    if isinstance(value, (Money, Decimal)):
+        return str(value)
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return value
+
+TRANSACTION_COLUMNS = (
+    Column("Type", lambda value: value.replace('_', ' ').capitalize()),
+    Column("Amount", format_money, ">"),
+    Column("Date", format_timestamp),
+)
+CARD_COLUMNS = (
+    Column("Type", str.capitalize),
+    Column("Card Number"),
+    Column("Expiry"),
+    Column("CVV"),
+)
+LOAN_COLUMNS = (
+    Column("Loan ID", str, ">"),
+    Column("Amount", format_money, ">"),
+    Column("Rate", lambda value: f"{value * 100:.2f}%", ">"),
+    Column("Term", lambda value: f"{value} months", ">"),
+    Column("Start Date", lambda value: value.strftime('%Y-%m-%d')),
+    Column("Remaining", format_money, ">"),
+    Column("Status", str.capitalize),
+)
+BILL_COLUMNS = (
+    Column("ID", str, ">"),
+    Column("Name"),
+    Column("Due", str),
+    Column("Amount", format_money, ">"),
+    Column("Status", str.capitalize),
+)
+MONEY_REQUEST_COLUMNS = (
+    Column("Request ID", str, ">"),
+    Column("From"),
+    Column("Amount", format_money, ">"),
+    Column("Date", format_timestamp),
+)
+
+def fit_column_widths(columns, cells, max_width=None):
+    widths = [max([len(column.header)] + [len(row[index]) for row in cells]) for index, column in enumerate(columns)]
+    if max_width is not None:
+        overflow = sum(widths) + 3 * (len(widths) - 1) - max_width
+        while overflow > 0:
+            index = max(range(len(columns)), key=lambda index: widths[index] if columns[index].align == "<" else -1)
+            if columns[index].align != "<" or widths[index] <= len(columns[index].header):
+                break
+            widths[index] -= 1
+            overflow -= 1
+    return widths
+
+def format_table_row(columns, widths, cells):
+    parts = []
+    for column, width, text in zip(columns, widths, cells):
+        if column.align == "<" and len(text) > width:
+            text = text[:width - 3] + "..."
+        parts.append(f"{text:{column.align}{width}}")
+    return " | ".join(parts)
+
+@contextlib.contextmanager
+def open_output(paged=False):
+    pager = None
+    if paged and PAGER:
+        try:
+            pager = subprocess.Popen(PAGER, shell=True, stdin=subprocess.PIPE, text=True)
+        except OSError:
+            pager = None
+    stream = pager.stdin if pager is not None else sys.stdout
+    try:
+        yield stream
+    finally:
+        if pager is not None:
+            try:
+                pager.stdin.close()
+            except BrokenPipeError:
+                pass
+            pager.wait()
+        else:
+            sys.stdout.flush()
+
+def render_rows(title, columns, rows, fmt=None, empty_message="No results found."):
+    fmt = fmt or OUTPUT_FORMAT
+    headers = [column.header for column in columns]
+    count = 0
+    try:
+        if fmt == "csv":
+            with open_output() as out:
+                writer = csv.writer(out)
+                writer.writerow(headers)
+                for row in rows:
+                    writer.writerow([export_value(value) for value in row])
+                    count += 1
+        elif fmt == "json":
+            with open_output() as out:
+                out.write("[")
+                for row in rows:
+                    record = dict(zip(headers, (export_value(value) for value in row)))
+                    out.write(("," if count else "") + "\n  " + json.dumps(record, default=str))
+                    count += 1
+                out.write("\n]\n")
+        else:
+            interactive = sys.stdout.isatty()
+            terminal = shutil.get_terminal_size()
+            screen_rows = max(terminal.lines - 5, 1)
+            remaining = iter(rows)
+            cells = []
+            for row in remaining:
+                cells.append([column.formatter(value) for column, value in zip(columns, row)])
+                if len(cells) > screen_rows:
+                    break
+            if cells:
+                widths = fit_column_widths(columns, cells, terminal.columns if interactive else None)
+                line = format_table_row(columns, widths, headers)
+                with open_output(paged=interactive and len(cells) > screen_rows) as out:
+                    out.write(f"\n--- {title} ---\n{line}\n{'-' * len(line)}\n")
+                    for row_cells in itertools.chain(cells, ([column.formatter(value) for column, value in zip(columns, row)] for row in remaining)):
+                        out.write(format_table_row(columns, widths, row_cells) + "\n")
+                        out.flush()
+                        count += 1
+                    out.write(f"{'-' * len(line)}\n")
+    except BrokenPipeError:
+        pass
+    except psycopg2.errors.QueryCanceled as e:
+        print_message(f"Stopped reading {title.lower()}: {str(e).strip()}.", "info")
+        return count
+    except psycopg2.Error as e:
+        print_message(f"Database error reading {title.lower()}: {e}", "error")
+        return count
+    finally:
+        close_rows = getattr(rows, "close", None)
+        if close_rows is not None:
+            close_rows()
+    if count == 0 and fmt == "table":
+        print_message(empty_message, "info")
+    return count
+
+def format_dashboard(summary):
+    lines = [
+        f"Balance: ${summary.balance:.2f} (account {summary.account_number})   Cards: {summary.card_count}",
+        f"Pending requests: {summary.pending_requests} (${summary.pending_amount:.2f})   Active loans: {summary.active_loans} (${summary.loan_balance:.2f} owed)",
+    ]
+    if summary.upcoming_bills:
+        lines.append("Next bills: " + "; ".join(f"{bill_name} ${amount:.2f} due {due_date:%Y-%m-%d}" for bill_name, due_date, amount in summary.upcoming_bills))
+    else:
+        lines.append("Next bills: none pending")
+    return "\n".join(lines)
+
+def sparkline(values, width=SPARKLINE_WIDTH):
+    if not values:
+        return ""
+    if len(values) > width:
+        step = len(values) / width
+        values = [values[min(len(values) - 1, int((index + 1) * step) - 1)] for index in range(width)]
+    low = min(values)
+    high = max(values)
+    if high == low:
+        return SPARKLINE_BARS[len(SPARKLINE_BARS) // 2] * len(values)
+    scale = (len(SPARKLINE_BARS) - 1) / (high - low).cents
+    return "".join(SPARKLINE_BARS[int((value - low).cents * scale)] for value in values)
+
+def format_balance_history(series, periods=BALANCE_HISTORY_PERIODS):
+    lines = []
+    for days in periods:
+        values = [balance for _, balance in series[-days:]]
+        lines.append(f"{days:>3} days  {sparkline(values)}")
+        lines.append(f"          low ${min(values):.2f}  high ${max(values):.2f}  change ${values[-1] - values[0]:.2f}")
+    return lines
+
+def view_balance_history(user_id, periods=BALANCE_HISTORY_PERIODS):
+    series = storage.get_balance_series(user_id, max(periods))
+    if not series:
+        print_message("No balance history available.", "info")
+        return
+    print_header("BALANCE HISTORY")
+    print("\n".join(format_balance_history(series, periods)))
+    print_footer()
+
 def print_message(message, type="info"):
     if type == "success":
         print(f"\n[SUCCESS] {message}\n")
@@ -838,6 +4969,17 @@ def get_validated_float_input(prompt, min_value=0.01):
         except ValueError:
             print_message("Invalid amount. Please enter a number.", "error")
 
+def get_validated_money_input(prompt, min_value=Money(1)):
+    while True:
+        try:
+            value = Money.parse(input(prompt))
+            if value >= min_value:
+                return value
+            else:
+                print_message(f"Amount must be a positive number (at least {min_value:.2f}).", "error")
+        except ValueError:
+            print_message("Invalid amount. Please enter a number.", "error")
+
 def get_validated_int_input(prompt, min_value=1):
     while True:
         try:
@@ -849,32 +4991,43 @@ def get_validated_int_input(prompt, min_value=1):
         except ValueError:
             print_message("Invalid input. Please enter an integer.", "error")
 
+EMAIL_REGEX = r"^(?:[a-zA-Z0-9!#$%&'*+/=?^_`{|}~-]+(?:\.[a-zA-Z0-9!#$%&'*+/=?^_`{|}~-]+)*|\"(?:[\x01-\x08\x0b\x0c\x0e-\x1f\x21\x23-\x5b\x5d-\x7f]|\\[\x01-\x09\x0b\x0c\x0e-\x7f])*\")@(?:(?:[a-zA-Z0-9](?:[a-zA-Z0-9-]*[a-zA-Z0-9])?\.)+[a-zA-Z0-9](?:[a-zA-Z0-9-]*[a-zA-Z0-9])?|\[(?:(?:25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)\.){3}(?:25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?|[a-zA-Z0-9-]*[a-zA-Z0-9]:(?:[\x01-\x08\x0b\x0c\x0e-\x1f\x21-\x5a\x5f-\x7f]|\\[\x01-\x09\x0b\x0c\x0e-\x7f])+)\])$"
+PHONE_REGEX = r"^\+?[\d\s\-\(\)]{7,20}$"
+
+def is_valid_email(email):
+    return re.match(EMAIL_REGEX, email) is not None
+
+def is_valid_phone(phone):
+    return re.match(PHONE_REGEX, phone) is not None
+
+def parse_date(date_str):
+    try:
+        return datetime.datetime.strptime(date_str, "%Y-%m-%d").date()
+    except ValueError:
+        return None
+
 def get_validated_email_input(prompt):
-    email_regex = r"^(?:[a-zA-Z0-9!#$%&'*+/=?^_`{|}~-]+(?:\.[a-zA-Z0-9!#$%&'*+/=?^_`{|}~-]+)*|\"(?:[\x01-\x08\x0b\x0c\x0e-\x1f\x21\x23-\x5b\x5d-\x7f]|\\[\x01-\x09\x0b\x0c\x0e-\x7f])*\")@(?:(?:[a-zA-Z0-9](?:[a-zA-Z0-9-]*[a-zA-Z0-9])?\.)+[a-zA-Z0-9](?:[a-zA-Z0-9-]*[a-zA-Z0-9])?|\[(?:(?:25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)\.){3}(?:25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?|[a-zA-Z0-9-]*[a-zA-Z0-9]:(?:[\x01-\x08\x0b\x0c\x0e-\x1f\x21-\x5a\x5f-\x7f]|\\[\x01-\x09\x0b\x0c\x0e-\x7f])+)\])$"
     while True:
         email = input(prompt).strip()
-        if re.match(email_regex, email):
+        if is_valid_email(email):
             return email
         else:
             print_message("Invalid email format. Please enter a valid email address (e.g., user@example.com).", "error")
 
 def get_validated_phone_input(prompt):
-    phone_regex = r"^\+?[\d\s\-\(\)]{7,20}$" 
     while True:
         phone = input(prompt).strip()
-        if re.match(phone_regex, phone):
+        if is_valid_phone(phone):
             return phone
         else:
             print_message("Invalid phone number format. Please enter a valid phone number (e.g., +1-555-123-4567).", "error")
 
 def get_validated_date_input(prompt):
     while True:
-        date_str = input(prompt).strip()
-        try:
-            date_obj = datetime.datetime.strptime(date_str, "%Y-%m-%d").date()
+        date_obj = parse_date(input(prompt).strip())
+        if date_obj is not None:
             return date_obj
-        except ValueError:
-            print_message("Invalid date format. Please use YYYY-MM-DD.", "error")
+        print_message("Invalid date format. Please use YYYY-MM-DD.", "error")
 
 def get_validated_account_number_input(prompt):
     while True:
@@ -895,7 +5048,7 @@ def cli_register_user():
     date_of_birth = get_validated_date_input("Enter Date of Birth (YYYY-MM-DD): ")
     print(SUB_LINE_SEP)
 
-    success, message = register_user(username, password, full_name, email, phone_number, address, date_of_birth)
+    success, message = storage.register_user(username, password, full_name, email, phone_number, address, date_of_birth)
     if success:
         print_message(message, "success")
     else:
@@ -908,7 +5061,7 @@ def cli_login_user():
     password = get_validated_string_input("Enter Password: ")
     print(SUB_LINE_SEP)
     
-    user_id, full_name, message = login_user(username, password)
+    user_id, full_name, message = storage.login_user(username, password)
     if user_id:
         print_message(message, "success")
     else:
@@ -916,9 +5069,39 @@ def cli_login_user():
     print_footer()
     return user_id, username, full_name
 
+def remember_session(user_id):
+    token = session_tokens.issue(user_id)
+    if token is None:
+        return None
+    try:
+        save_session_token(token)
+    except OSError as e:
+        print_message(f"Could not save the session to {CLIENT_SESSION_FILE}: {e}", "error")
+    return token
+
+def resume_session():
+    token = load_session_token()
+    user_id = session_tokens.validate(token) if token else None
+    if user_id is None:
+        return None
+    username = storage.get_username_by_user_id(user_id)
+    if username is None:
+        return None
+    audit_log.record('session_resumed', user_id, username)
+    print_message(f"Welcome back, {username}. Resumed your saved session.", "success")
+    return user_id, username, token
+
+def start_user_session(user_id):
+    current_session.set(user_id)
+    if storage.name != "postgres":
+        return None
+    velocity_screen.warm(user_id)
+    notifier = MoneyRequestNotifier(user_id)
+    return notifier if notifier.start() else None
+
 def cli_account_operations(user_id):
     while True:
-        account = get_user_account(user_id)
+        account = storage.get_user_account(user_id)
         if not account:
             print_message("Error: Could not retrieve bank account.", "error")
             return
@@ -927,38 +5110,35 @@ def cli_account_operations(user_id):
         print_menu_item("1", "Deposit Funds")
         print_menu_item("2", "Withdraw Funds")
         print_menu_item("3", "View Balance")
-        print_menu_item("4", "Back to Main Menu")
+        print_menu_item("4", "Balance History")
+        print_menu_item("5", "Back to Main Menu")
         print_footer()
         choice = input("Enter your choice: ")
         print(SUB_LINE_SEP)
 
         if choice == '1':
-            amount = get_validated_float_input("Enter amount to deposit: ")
-            if account.deposit(amount):
-                record_transaction(get_account_id_by_user_id(user_id), 'deposit', amount)
-                print_message(f"Successfully deposited ${amount:.2f}.", "success")
-            else:
-                print_message("Deposit failed.", "error")
+            amount = get_validated_money_input("Enter amount to deposit: ")
+            success, message = storage.deposit_funds(user_id, amount)
+            print_message(message, "success" if success else "error")
         elif choice == '2':
-            amount = get_validated_float_input("Enter amount to withdraw: ")
-            if account.withdraw(amount):
-                record_transaction(get_account_id_by_user_id(user_id), 'withdraw', amount)
-                print_message(f"Successfully withdrew ${amount:.2f}.", "success")
-            else:
-                print_message("Invalid withdrawal amount or insufficient balance.", "error")
+            amount = get_validated_money_input("Enter amount to withdraw: ")
+            success, message = storage.withdraw_funds(user_id, amount)
+            print_message(message, "success" if success else "error")
         elif choice == '3':
             print_message(f"Current Balance: ${account.get_balance():.2f}", "info")
         elif choice == '4':
+            view_balance_history(user_id)
+        elif choice == '5':
             break
         else:
             print_message("Invalid choice. Please try again.", "error")
 
 def cli_public_transaction_feed():
     print_header("PUBLIC TRANSACTION FEED")
-    transactions = get_public_transactions()
+    transactions = storage.get_public_transactions()
     if transactions:
         for t in transactions:
-            print(f"[{t[2].strftime('%Y-%m-%d %H:%M:%S')}] {t[3]} {t[0].replace('_', ' ').capitalize()} ${t[1]:.2f}")
+            print(f"[{format_timestamp(t.timestamp)}] {t.username} {t.type.replace('_', ' ').capitalize()} ${t.amount:.2f}")
     else:
         print_message("No public transactions available.", "info")
     print_footer()
@@ -975,20 +5155,19 @@ def cli_card_operations(user_id):
         print(SUB_LINE_SEP)
 
         if choice == '1':
-            success, message = generate_card(user_id, 'debit')
+            success, message = storage.generate_card(user_id, 'debit')
             if success:
                 print_message(message, "success")
             else:
                 print_message(message, "error")
         elif choice == '2':
-            success, message = generate_card(user_id, 'credit')
+            success, message = storage.generate_card(user_id, 'credit')
             if success:
                 print_message(message, "success")
             else:
                 print_message(message, "error")
         elif choice == '3':
-            cards_text = display_cards(user_id)
-            print_message(cards_text, "info")
+            display_cards(user_id)
         elif choice == '4':
             break
         else:
@@ -997,8 +5176,8 @@ def cli_card_operations(user_id):
 def cli_transfer_funds(user_id):
     print_header("TRANSFER FUNDS")
     to_account_number = get_validated_account_number_input("Recipient's Account Number (10 digits): ")
-    amount = get_validated_float_input("Enter amount to transfer: ")
-    success, message = transfer_funds(user_id, to_account_number, amount)
+    amount = get_validated_money_input("Enter amount to transfer: ")
+    success, message = storage.transfer_funds(user_id, to_account_number, amount, new_idempotency_key())
     if success:
         print_message(message, "success")
     else:
@@ -1019,8 +5198,7 @@ def cli_loans(user_id):
         if choice == '1':
             cli_apply_for_loan(user_id)
         elif choice == '2':
-            loans_text = view_loans(user_id)
-            print_message(loans_text, "info")
+            view_loans(user_id)
         elif choice == '3':
             cli_make_loan_payment(user_id)
         elif choice == '4':
@@ -1030,10 +5208,10 @@ def cli_loans(user_id):
 
 def cli_apply_for_loan(user_id):
     print_header("APPLY FOR LOAN")
-    amount = get_validated_float_input("Loan Amount: ")
+    amount = get_validated_money_input("Loan Amount: ")
     interest_rate = get_validated_float_input("Annual Interest Rate (e.g., 0.05 for 5%): ", min_value=0.0001)
     term_months = get_validated_int_input("Loan Term in Months: ")
-    success, message = apply_for_loan(user_id, amount, interest_rate, term_months)
+    success, message = storage.apply_for_loan(user_id, amount, interest_rate, term_months)
     if success:
         print_message(message, "success")
     else:
@@ -1043,8 +5221,8 @@ def cli_apply_for_loan(user_id):
 def cli_make_loan_payment(user_id):
     print_header("MAKE LOAN PAYMENT")
     loan_id = get_validated_int_input("Loan ID: ")
-    amount = get_validated_float_input("Payment Amount: ")
-    success, message = make_loan_payment(user_id, loan_id, amount)
+    amount = get_validated_money_input("Payment Amount: ")
+    success, message = storage.make_loan_payment(user_id, loan_id, amount, new_idempotency_key())
     if success:
         print_message(message, "success")
     else:
@@ -1054,17 +5232,19 @@ def cli_make_loan_payment(user_id):
 def cli_search_users():
     print_header("SEARCH USERS")
     query = get_validated_string_input("Search Query (username or full name): ")
-    results = search_users(query)
+    results = storage.search_users(query)
     print_message(results, "info")
     print_footer()
 
-def cli_money_requests(user_id):
+def cli_money_requests(user_id, notifier=None):
     while True:
         print_header("MONEY REQUEST OPERATIONS")
         print_menu_item("1", "Send Money Request")
         print_menu_item("2", "View Pending Requests")
         print_menu_item("3", "Respond to Request")
-        print_menu_item("4", "Back to Main Menu")
+        print_menu_item("4", "Split an Amount Between Users")
+        print_menu_item("5", "Respond to Several Requests")
+        print_menu_item("6", "Back to Main Menu")
         print_footer()
         choice = input("Enter your choice: ")
         print(SUB_LINE_SEP)
@@ -1072,11 +5252,14 @@ def cli_money_requests(user_id):
         if choice == '1':
             cli_send_money_request(user_id)
         elif choice == '2':
-            requests_text = view_money_requests(user_id)
-            print_message(requests_text, "info")
+            view_money_requests(user_id, rows=notifier.pending_requests() if notifier is not None else None)
         elif choice == '3':
             cli_respond_to_money_request(user_id)
         elif choice == '4':
+            cli_split_money_request(user_id)
+        elif choice == '5':
+            cli_respond_to_money_requests(user_id)
+        elif choice == '6':
             break
         else:
             print_message("Invalid choice. Please try again.", "error")
@@ -1084,8 +5267,8 @@ def cli_money_requests(user_id):
 def cli_send_money_request(user_id):
     print_header("SEND MONEY REQUEST")
     to_username = get_validated_string_input("Recipient Username: ")
-    amount = get_validated_float_input("Enter amount to request: ")
-    success, message = request_money(user_id, to_username, amount)
+    amount = get_validated_money_input("Enter amount to request: ")
+    success, message = storage.request_money(user_id, to_username, amount)
     if success:
         print_message(message, "success")
     else:
@@ -1099,7 +5282,38 @@ def cli_respond_to_money_request(user_id):
     if action not in ['accept', 'decline']:
         print_message("Invalid action. Please type 'accept' or 'decline'.", "error")
         return
-    success, message = respond_to_money_request(request_id, user_id, action)
+    success, message = storage.respond_to_money_request(request_id, user_id, action, new_idempotency_key())
+    if success:
+        print_message(message, "success")
+    else:
+        print_message(message, "error")
+    print_footer()
+
+def cli_split_money_request(user_id):
+    print_header("SPLIT AN AMOUNT")
+    to_usernames = get_validated_string_input("Usernames (comma-separated): ").split(",")
+    amount = get_validated_money_input("Total amount to split: ")
+    include_self = get_validated_string_input("Include yourself in the split? (y/n): ").lower().startswith("y")
+    success, message = storage.request_money_split(user_id, to_usernames, amount, include_self)
+    if success:
+        print_message(message, "success")
+    else:
+        print_message(message, "error")
+    print_footer()
+
+def cli_respond_to_money_requests(user_id):
+    print_header("RESPOND TO SEVERAL REQUESTS")
+    request_ids = get_validated_string_input("Request IDs (comma-separated): ").split(",")
+    action = get_validated_string_input("Action for all (accept/decline): ").lower()
+    if action not in ['accept', 'decline']:
+        print_message("Invalid action. Please type 'accept' or 'decline'.", "error")
+        return
+    try:
+        request_ids = [int(request_id) for request_id in request_ids if request_id.strip()]
+    except ValueError:
+        print_message("Request IDs must be whole numbers.", "error")
+        return
+    success, message = storage.respond_to_money_requests(request_ids, user_id, action, new_idempotency_key())
     if success:
         print_message(message, "success")
     else:
@@ -1121,8 +5335,8 @@ def cli_bill_operations(user_id):
             print_header("ADD NEW BILL")
             bill_name = get_validated_string_input("Bill Name: ")
             due_date_obj = get_validated_date_input("Due Date (YYYY-MM-DD): ")
-            amount = get_validated_float_input("Amount: ")
-            success, message = add_bill(user_id, bill_name, due_date_obj, amount)
+            amount = get_validated_money_input("Amount: ")
+            success, message = storage.add_bill(user_id, bill_name, due_date_obj, amount)
             if success:
                 print_message(message, "success")
             else:
@@ -1130,17 +5344,17 @@ def cli_bill_operations(user_id):
             print_footer()
         elif choice == '2':
             print_header("MY BILLS")
-            bills = get_user_bills(user_id)
+            bills = storage.get_user_bills(user_id)
             if bills:
                 for bill in bills:
-                    print(f"ID: {bill[0]}, Name: {bill[1]}, Due: {bill[2]}, Amount: ${bill[3]:.2f}, Status: {bill[4].capitalize()}")
+                    print(f"ID: {bill.bill_id}, Name: {bill.bill_name}, Due: {bill.due_date}, Amount: ${bill.amount:.2f}, Status: {bill.status.capitalize()}")
             else:
                 print_message("No bills found.", "info")
             print_footer()
         elif choice == '3':
             print_header("PAY A BILL")
             bill_id = get_validated_int_input("Enter Bill ID to pay: ")
-            success, message = pay_bill(user_id, bill_id)
+            success, message = storage.pay_bill(user_id, bill_id, new_idempotency_key())
             if success:
                 print_message(message, "success")
             else:
@@ -1151,77 +5365,484 @@ def cli_bill_operations(user_id):
         else:
             print_message("Invalid choice. Please try again.", "error")
 
-def main():
-    create_tables()
+class DaemonError(Exception):
+    pass
+
+def format_rows(columns, rows, fmt):
+    if fmt == "table":
+        return [[column.formatter(value) for column, value in zip(columns, row)] for row in rows]
+    return [[export_value(value) for value in row] for row in rows]
+
+def table_result(title, columns, rows, fmt, empty_message):
+    return {
+        "title": title,
+        "columns": [{"header": column.header, "align": column.align} for column in columns],
+        "rows": format_rows(columns, rows, fmt),
+        "empty_message": empty_message,
+    }
+
+class BankingDaemon:
+    def user_for(self, token):
+        user_id = session_tokens.validate(token)
+        if user_id is None:
+            raise DaemonError("Not logged in. Run 'python main.py client login' first.")
+        return user_id
+
+    def handle(self, request):
+        op = request.get("op", "")
+        args = request.get("args") or {}
+        handler = getattr(self, f"op_{op}", None)
+        if handler is None:
+            return {"ok": False, "error": f"Unknown operation '{op}'."}
+        try:
+            if op in ("login", "ping", "authorize"):
+                return {"ok": True, "result": handler(args)}
+            user_id = self.user_for(request.get("token"))
+            current_session.set(user_id)
+            return {"ok": True, "result": handler(user_id, args)}
+        except (DaemonError, KeyError, ValueError) as e:
+            return {"ok": False, "error": str(e)}
+        except Exception:
+            daemon_logger.exception("Unhandled error in daemon operation %s", op)
+            return {"ok": False, "error": "Internal error. Please try again."}
+        finally:
+            current_session.set(None)
+
+    def op_ping(self, args):
+        return {"success": True, "message": "pong"}
+
+    def op_authorize(self, args):
+        success, message = storage.authorize(args["card_number"], args["expiry"], args["cvv"], args["amount"], args.get("merchant", "POS"))
+        return {"success": success, "message": message}
+
+    def op_login(self, args):
+        user_id, full_name, message = storage.login_user(args["username"], args["password"])
+        if user_id is None:
+            raise DaemonError(message)
+        token = session_tokens.issue(user_id)
+        if token is None:
+            raise DaemonError("Could not start a session. Please try again.")
+        return {"token": token, "user_id": user_id, "full_name": full_name, "message": message}
+
+    def op_logout(self, user_id, args):
+        if not session_tokens.revoke_user(user_id):
+            raise DaemonError("Could not end the session. Please try again.")
+        return {"success": True, "message": "Logged out successfully."}
+
+    def op_balance(self, user_id, args):
+        account = storage.get_user_account(user_id)
+        if account is None:
+            raise DaemonError("Could not retrieve bank account.")
+        return {"success": True, "message": f"Current Balance: ${account.get_balance():.2f}", "balance": str(account.get_balance())}
+
+    def op_dashboard(self, user_id, args):
+        summary = storage.get_dashboard(user_id)
+        if summary is None:
+            raise DaemonError("Could not load account summary.")
+        return {"success": True, "message": format_dashboard(summary)}
+
+    def op_deposit(self, user_id, args):
+        success, message = storage.deposit_funds(user_id, args["amount"])
+        return {"success": success, "message": message}
+
+    def op_withdraw(self, user_id, args):
+        success, message = storage.withdraw_funds(user_id, args["amount"])
+        return {"success": success, "message": message}
+
+    def op_balance_history(self, user_id, args):
+        series = storage.get_balance_series(user_id, max(BALANCE_HISTORY_PERIODS))
+        if not series:
+            raise DaemonError("No balance history available.")
+        return {"success": True, "message": "\n".join(format_balance_history(series)),
+                "series": [[day.isoformat(), str(balance)] for day, balance in series]}
+
+    def op_transfer(self, user_id, args):
+        success, message = storage.transfer_funds(user_id, args["to_account_number"], args["amount"], args.get("idempotency_key"))
+        return {"success": success, "message": message}
+
+    def op_history(self, user_id, args):
+        days = int(args.get("days", TRANSACTION_HISTORY_DAYS))
+        title = f"Transaction History (last {days} days)" if days else "Transaction History"
+        return table_result(title, TRANSACTION_COLUMNS, storage.iter_transaction_history(user_id, days), args.get("format", "table"),
+                            "No transactions found for your account.")
+
+    def op_bills(self, user_id, args):
+        return table_result("My Bills", BILL_COLUMNS, storage.get_user_bills(user_id), args.get("format", "table"), "No bills found.")
+
+    def op_add_bill(self, user_id, args):
+        due_date = datetime.datetime.strptime(args["due_date"], "%Y-%m-%d").date()
+        success, message = storage.add_bill(user_id, args["bill_name"], due_date, args["amount"])
+        return {"success": success, "message": message}
+
+    def op_pay_bill(self, user_id, args):
+        success, message = storage.pay_bill(user_id, int(args["bill_id"]), args.get("idempotency_key"))
+        return {"success": success, "message": message}
+
+    def op_loans(self, user_id, args):
+        return table_result("Your Loans", LOAN_COLUMNS, storage.iter_loans(user_id), args.get("format", "table"), "No loans found for your account.")
+
+    def op_apply_loan(self, user_id, args):
+        success, message = storage.apply_for_loan(user_id, args["amount"], float(args["interest_rate"]), int(args["term_months"]))
+        return {"success": success, "message": message}
+
+    def op_loan_payment(self, user_id, args):
+        success, message = storage.make_loan_payment(user_id, int(args["loan_id"]), args["amount"], args.get("idempotency_key"))
+        return {"success": success, "message": message}
+
+    def op_cards(self, user_id, args):
+        return table_result("Your Cards", CARD_COLUMNS, storage.iter_cards(user_id), args.get("format", "table"), "No cards found for your account.")
+
+    def op_generate_card(self, user_id, args):
+        card_type = args.get("card_type", "debit")
+        if card_type not in ('debit', 'credit'):
+            raise DaemonError("Card type must be 'debit' or 'credit'.")
+        success, message = storage.generate_card(user_id, card_type)
+        return {"success": success, "message": message}
+
+    def op_money_requests(self, user_id, args):
+        return table_result("Pending Money Requests", MONEY_REQUEST_COLUMNS, storage.iter_money_requests(user_id), args.get("format", "table"),
+                            "No pending money requests.")
+
+    def op_request_money(self, user_id, args):
+        success, message = storage.request_money(user_id, args["to_username"], args["amount"])
+        return {"success": success, "message": message}
+
+    def op_request_split(self, user_id, args):
+        success, message = storage.request_money_split(user_id, args["to_usernames"].split(","), args["amount"],
+                                                       args.get("include_self") in (True, "1", "true", "yes"))
+        return {"success": success, "message": message}
+
+    def op_respond(self, user_id, args):
+        success, message = storage.respond_to_money_request(int(args["request_id"]), user_id, args["action"], args.get("idempotency_key"))
+        return {"success": success, "message": message}
+
+    def op_respond_many(self, user_id, args):
+        request_ids = [int(request_id) for request_id in str(args["request_ids"]).split(",") if request_id.strip()]
+        success, message = storage.respond_to_money_requests(request_ids, user_id, args["action"], args.get("idempotency_key"))
+        return {"success": success, "message": message}
+
+class DaemonRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+            except ValueError:
+                response = {"ok": False, "error": "Malformed request."}
+            else:
+                response = self.server.daemon.handle(request)
+            self.wfile.write((json.dumps(response, default=str) + "\n").encode("utf-8"))
+            self.wfile.flush()
+
+class ThreadingUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def check_socket_directory(socket_path, create=False):
+    directory = os.path.dirname(os.path.abspath(socket_path))
+    if directory != os.path.abspath(DAEMON_RUNTIME_DIR):
+        return
+    if create:
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+    info = os.stat(directory)
+    if info.st_uid != os.getuid() or info.st_mode & 0o077:
+        raise DaemonError(f"{directory} must be owned by you and private (mode 0700).")
+
+def serve_daemon(socket_path=DAEMON_SOCKET):
+    try:
+        check_socket_directory(socket_path, create=True)
+    except (OSError, DaemonError) as e:
+        return False, f"Cannot use socket directory: {e}"
+    if os.path.exists(socket_path):
+        try:
+            send_daemon_request("ping", socket_path=socket_path)
+            return False, f"A daemon is already listening on {socket_path}."
+        except (OSError, DaemonError):
+            os.unlink(socket_path)
+    warmed = velocity_screen.warm() if storage.name == "postgres" else 0
+    cards = card_index.warm() if storage.name == "postgres" else 0
+    previous_umask = os.umask(0o077)
+    try:
+        server = ThreadingUnixServer(socket_path, DaemonRequestHandler)
+    finally:
+        os.umask(previous_umask)
+    server.daemon = BankingDaemon()
+    sweeper_stop = threading.Event()
+    if storage.name == "sharded":
+        threading.Thread(target=storage.run_sweeper, args=(sweeper_stop,), name="shard-sweeper", daemon=True).start()
+    print_message(f"ZeldaCLI daemon listening on {socket_path} ({warmed} ledger rows, {cards} cards warmed). Press Ctrl-C to stop.", "info")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sweeper_stop.set()
+        server.server_close()
+        os.unlink(socket_path)
+        connection_pool.close_all()
+    return True, "Daemon stopped."
+
+def send_daemon_request(op, args=None, token=None, socket_path=DAEMON_SOCKET):
+    check_socket_directory(socket_path)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(socket_path)
+        client.sendall((json.dumps({"op": op, "args": args or {}, "token": token}) + "\n").encode("utf-8"))
+        with client.makefile("rb") as response_file:
+            line = response_file.readline()
+    if not line:
+        raise DaemonError("The daemon closed the connection.")
+    response = json.loads(line)
+    if not response.get("ok"):
+        raise DaemonError(response.get("error", "Request failed."))
+    return response["result"]
+
+def load_session_token(path=CLIENT_SESSION_FILE):
+    if not os.path.exists(path):
+        return None
+    with open(path) as session_file:
+        return session_file.read().strip() or None
+
+def save_session_token(token, path=CLIENT_SESSION_FILE):
+    descriptor = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(descriptor, "w") as session_file:
+        session_file.write(token)
+
+def clear_session_token(path=CLIENT_SESSION_FILE):
+    if os.path.exists(path):
+        os.unlink(path)
+
+def run_client_command(op, pairs, socket_path=DAEMON_SOCKET):
+    args = {}
+    for pair in pairs:
+        key, separator, value = pair.partition("=")
+        if not separator:
+            print_message(f"Arguments must be key=value, got '{pair}'.", "error")
+            return 1
+        args[key] = value
+    if op in ("transfer", "pay_bill", "loan_payment", "respond", "respond_many"):
+        args.setdefault("idempotency_key", new_idempotency_key())
+    if op in ("history", "bills", "loans", "cards", "money_requests"):
+        args.setdefault("format", OUTPUT_FORMAT)
+    if op == "login":
+        if "username" not in args:
+            args["username"] = input("Username: ").strip()
+        if "password" not in args:
+            args["password"] = getpass.getpass("Password: ")
+    token = load_session_token() if op != "login" else None
+    try:
+        result = send_daemon_request(op, args, token, socket_path)
+    except OSError as e:
+        print_message(f"Could not reach the daemon at {socket_path}: {e}. Start it with 'python main.py serve'.", "error")
+        return 1
+    except DaemonError as e:
+        print_message(str(e), "error")
+        return 1
+    if op == "login":
+        save_session_token(result["token"])
+        print_message(result["message"], "success")
+        return 0
+    if op == "logout":
+        clear_session_token()
+    if "rows" in result:
+        columns = [Column(column["header"], str, column["align"]) for column in result["columns"]]
+        render_rows(result["title"], columns, iter(result["rows"]), args.get("format"), result["empty_message"])
+        return 0
+    print_message(result["message"], "success" if result["success"] else "error")
+    return 0 if result["success"] else 1
+
+def parse_month(value):
+    try:
+        return datetime.datetime.strptime(value, "%Y-%m").date()
+    except ValueError:
+        raise argparse.ArgumentTypeError("Month must be in YYYY-MM format.")
+
+def parse_date_argument(value):
+    date_obj = parse_date(value)
+    if date_obj is None:
+        raise argparse.ArgumentTypeError("Date must be in YYYY-MM-DD format.")
+    return date_obj
+
+def report_command_result(result):
+    success, message = result
+    print_message(message, "success" if success else "error")
+    return 0 if success else 1
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(prog="main.py", description="ZeldaCLI interactive banking. Run without a command for the interactive menu.")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default=OUTPUT_FORMAT, help="Output format for list screens.")
+    subparsers = parser.add_subparsers(dest="command")
+
+    partitions_parser = subparsers.add_parser("create-partitions", help="Create upcoming monthly transaction partitions.")
+    partitions_parser.add_argument("--months-ahead", type=int, default=TRANSACTION_PARTITION_MONTHS_AHEAD)
+    partitions_parser.set_defaults(handler=lambda args: report_command_result(run_maintenance_command(
+        lambda shard: create_upcoming_partitions(args.months_ahead))))
+
+    archive_parser = subparsers.add_parser("archive-transactions", help="Detach transaction partitions older than a month and export them to gzipped CSV.")
+    archive_parser.add_argument("--before", type=parse_month, required=True, help="First month to keep (YYYY-MM).")
+    archive_parser.add_argument("--dir", default="archive", help="Directory for the exported partitions.")
+    archive_parser.set_defaults(handler=lambda args: report_command_result(run_maintenance_command(
+        lambda shard: archive_transaction_partitions(args.before, args.dir if shard is None else os.path.join(args.dir, f"shard-{shard}")))))
+
+    migrate_parser = subparsers.add_parser("migrate-transactions", help="Partition an existing transactions table online, in batches.")
+    migrate_parser.add_argument("--batch-size", type=int, default=10000)
+    migrate_parser.set_defaults(handler=lambda args: report_command_result(run_maintenance_command(
+        lambda shard: migrate_transactions_to_partitioned(args.batch_size))))
+
+    backfill_parser = subparsers.add_parser("backfill-balances", help="Rebuild daily closing balances from the transaction ledger.")
+    backfill_parser.add_argument("--chunk-size", type=int, default=10000, help="Accounts per chunk.")
+    backfill_parser.add_argument("--workers", type=int, default=4, help="Chunks processed in parallel.")
+    backfill_parser.set_defaults(handler=lambda args: report_command_result(run_maintenance_command(
+        lambda shard: backfill_daily_balances(args.chunk_size, args.workers))))
+
+    interest_parser = subparsers.add_parser("accrue-interest", help="Credit one day of savings interest to every account, in chunks.")
+    interest_parser.add_argument("--date", type=parse_date_argument, default=datetime.date.today(), help="Accrual date (YYYY-MM-DD, default today).")
+    interest_parser.add_argument("--chunk-size", type=int, default=10000, help="Accounts credited per transaction.")
+    interest_parser.set_defaults(handler=lambda args: report_command_result(run_maintenance_command(
+        lambda shard: accrue_interest(args.date, args.chunk_size))))
+
+    import_parser = subparsers.add_parser("import-users", help="Bulk-register customers from a CSV or JSONL file.")
+    import_parser.add_argument("path", help="CSV with a header row, or .jsonl, with username, password, full_name, email, phone_number, address and date_of_birth.")
+    import_parser.add_argument("--report", default="import_errors.csv", help="CSV file for rejected rows.")
+    import_parser.add_argument("--chunk-size", type=int, default=1000, help="Records inserted per transaction.")
+    import_parser.add_argument("--processes", type=int, default=None, help="Password hashing processes (default: one per CPU).")
+    import_parser.set_defaults(handler=lambda args: report_command_result(run_import_command(args.path, args.report, args.chunk_size, args.processes)))
+
+    init_shards_parser = subparsers.add_parser("init-shards", help="Create the shard directory and schemas, and map every user bucket to a shard.")
+    init_shards_parser.set_defaults(handler=lambda args: report_command_result(run_shard_command(lambda shards: shards.init_shards())), uses_database=False)
+
+    rebalance_parser = subparsers.add_parser("rebalance-shards", help="Move user buckets between shards online, one two-phase commit per bucket.")
+    rebalance_parser.add_argument("--bucket", type=int, help=f"Move this bucket (0-{SHARD_BUCKETS - 1}) instead of balancing automatically.")
+    rebalance_parser.add_argument("--to", type=int, help="Target shard index for --bucket.")
+    rebalance_parser.add_argument("--max-moves", type=int, default=SHARD_BUCKETS, help="Most buckets moved when balancing automatically.")
+    rebalance_parser.set_defaults(handler=lambda args: report_command_result(run_shard_command(
+        lambda shards: shards.rebalance(args.max_moves) if args.bucket is None
+        else shards.move_bucket(args.bucket, args.to) if args.to is not None
+        else (False, "--bucket needs --to."))))
+
+    recover_parser = subparsers.add_parser("recover-shards", help="Commit or roll back prepared cross-shard transactions left in doubt.")
+    recover_parser.add_argument("--older-than", type=float, default=SHARD_PREPARED_TIMEOUT, help="Only settle transactions prepared this many seconds ago.")
+    recover_parser.set_defaults(handler=lambda args: report_command_result(run_shard_command(
+        lambda shards: recover_shard_transactions(shards.shards, args.older_than))))
+
+    serve_parser = subparsers.add_parser("serve", help="Run the banking daemon on a local Unix socket.")
+    serve_parser.add_argument("--socket", default=DAEMON_SOCKET)
+    serve_parser.set_defaults(handler=lambda args: report_command_result(serve_daemon(args.socket)))
+
+    client_parser = subparsers.add_parser("client", help="Send one operation to a running daemon, e.g. 'client transfer to_account_number=0123456789 amount=10'.")
+    client_parser.add_argument("op", help="login, logout, authorize, balance, dashboard, balance_history, deposit, withdraw, transfer, history, bills, add_bill, pay_bill, loans, apply_loan, loan_payment, cards, generate_card, money_requests, request_money, request_split, respond, respond_many")
+    client_parser.add_argument("pairs", nargs="*", metavar="key=value")
+    client_parser.add_argument("--socket", default=DAEMON_SOCKET)
+    client_parser.set_defaults(handler=lambda args: run_client_command(args.op, args.pairs, args.socket), uses_database=False)
+
+    return parser
+
+def main(argv=None):
+    global OUTPUT_FORMAT
+    args = build_arg_parser().parse_args(argv)
+    OUTPUT_FORMAT = args.format
+    if getattr(args, "uses_database", True):
+        storage.create_schema()
+    if args.command:
+        return args.handler(args)
     logged_in_user_id = None
     logged_in_username = None
     logged_in_full_name = None
+    session_token = None
+    notifier = None
+    psycopg2.extensions.set_wait_callback(wait_select)
+    resumed = resume_session()
+    if resumed:
+        logged_in_user_id, logged_in_username, session_token = resumed
+        notifier = start_user_session(logged_in_user_id)
 
     while True:
-        if logged_in_user_id is None:
-            print_header("WELCOME TO ZELDABANK")
-            print_menu_item("1", "Register New Account")
-            print_menu_item("2", "Login to Existing Account")
-            print_menu_item("3", "Exit Application")
-            print_footer()
-            choice = input("Enter your choice: ")
-            print(SUB_LINE_SEP)
-
-            if choice == '1':
-                cli_register_user()
-            elif choice == '2':
-                user_id, username, full_name = cli_login_user()
-                if user_id:
-                    logged_in_user_id = user_id
-                    logged_in_username = username
-                    logged_in_full_name = full_name
-            elif choice == '3':
-                print_message("Exiting. Goodbye!", "info")
-                break
-            else:
-                print_message("Invalid choice. Please try again.", "error")
-        else:
-            print_header(f"WELCOME, {logged_in_username.upper()}!")
-            print_menu_item("1", "Account Operations")
-            print_menu_item("2", "Card Operations")
-            print_menu_item("3", "View Transaction History")
-            print_menu_item("4", "Transfer Funds")
-            print_menu_item("5", "Loans")
-            print_menu_item("6", "Search Users")
-            print_menu_item("7", "Money Requests")
-            print_menu_item("8", "Public Transaction Feed")
-            print_menu_item("9", "Bill Payments")
-            print_menu_item("10", "Logout")
-            print_footer()
-            choice = input("Enter your choice: ")
-            print(SUB_LINE_SEP)
-
-            if choice == '1':
-                cli_account_operations(logged_in_user_id)
-            elif choice == '2':
-                cli_card_operations(logged_in_user_id)
-            elif choice == '3':
-                transactions_text = view_transaction_history(logged_in_user_id)
-                print_message(transactions_text, "info")
-            elif choice == '4':
-                cli_transfer_funds(logged_in_user_id)
-            elif choice == '5':
-                cli_loans(logged_in_user_id)
-            elif choice == '6':
-                cli_search_users()
-            elif choice == '7':
-                cli_money_requests(logged_in_user_id)
-            elif choice == '8':
-                cli_public_transaction_feed()
-            elif choice == '9':
-                cli_bill_operations(logged_in_user_id)
-            elif choice == '10':
-                logged_in_user_id = None
-                logged_in_username = None
-                logged_in_full_name = None
-                print_message("Logged out successfully.", "info")
+        try:
+            if logged_in_user_id is None:
+                print_header("WELCOME TO ZELDABANK")
+                print_menu_item("1", "Register New Account")
+                print_menu_item("2", "Login to Existing Account")
+                print_menu_item("3", "Exit Application")
+                print_footer()
+                choice = input("Enter your choice: ")
+                print(SUB_LINE_SEP)
+
+                if choice == '1':
+                    cli_register_user()
+                elif choice == '2':
+                    user_id, username, full_name = cli_login_user()
+                    if user_id:
+                        logged_in_user_id = user_id
+                        logged_in_username = username
+                        logged_in_full_name = full_name
+                        session_token = remember_session(user_id)
+                        notifier = start_user_session(user_id)
+                elif choice == '3':
+                    print_message("Exiting. Goodbye!", "info")
+                    break
+                else:
+                    print_message("Invalid choice. Please try again.", "error")
             else:
-                print_message("Invalid choice. Please try again.", "error")
+                print_header(f"WELCOME, {logged_in_username.upper()}!")
+                breaker = user_db_circuit(logged_in_user_id)
+                if breaker.is_open():
+                    print(f"[READ-ONLY] Database unavailable; showing cached data, changes are disabled (retry in {breaker.retry_in():.0f}s).")
+                    print(SUB_LINE_SEP)
+                summary = storage.get_dashboard(logged_in_user_id)
+                if summary is not None:
+                    print(format_dashboard(summary))
+                    print(SUB_LINE_SEP)
+                if notifier is not None:
+                    for notice in notifier.drain_notices():
+                        print_message(notice, "info")
+                print_menu_item("1", "Account Operations")
+                print_menu_item("2", "Card Operations")
+                print_menu_item("3", "View Transaction History")
+                print_menu_item("4", "Transfer Funds")
+                print_menu_item("5", "Loans")
+                print_menu_item("6", "Search Users")
+                print_menu_item("7", "Money Requests")
+                print_menu_item("8", "Public Transaction Feed")
+                print_menu_item("9", "Bill Payments")
+                print_menu_item("10", "Logout")
+                print_footer()
+                choice = input("Enter your choice: ")
+                print(SUB_LINE_SEP)
+
+                if choice == '1':
+                    cli_account_operations(logged_in_user_id)
+                elif choice == '2':
+                    cli_card_operations(logged_in_user_id)
+                elif choice == '3':
+                    view_transaction_history(logged_in_user_id)
+                elif choice == '4':
+                    cli_transfer_funds(logged_in_user_id)
+                elif choice == '5':
+                    cli_loans(logged_in_user_id)
+                elif choice == '6':
+                    cli_search_users()
+                elif choice == '7':
+                    cli_money_requests(logged_in_user_id, notifier)
+                elif choice == '8':
+                    cli_public_transaction_feed()
+                elif choice == '9':
+                    cli_bill_operations(logged_in_user_id)
+                elif choice == '10':
+                    if notifier is not None:
+                        notifier.stop()
+                        notifier = None
+                    logged_in_user_id = None
+                    logged_in_username = None
+                    logged_in_full_name = None
+                    if session_token is not None:
+                        session_tokens.revoke(session_token)
+                        if load_session_token() == session_token:
+                            clear_session_token()
+                        session_token = None
+                    current_session.set(None)
+                    print_message("Logged out successfully.", "info")
+                else:
+                    print_message("Invalid choice. Please try again.", "error")
+        except KeyboardInterrupt:
+            print()
+            print_message("Cancelled. Returning to the menu.", "info")
 
 if __name__ == "__main__":
-    main()
+    raise SystemExit(main())
@@ -0,0 +1,32 @@
+import datetime
+import os
+import sys
+
+os.environ["DATABASE_URL"] = "postgresql://zeldacli@/zeldacli_tests?host=/nonexistent"
+os.environ["STORAGE_BACKEND"] = "memory"
+os.environ["VELOCITY_LIMITS"] = ""
+os.environ["SCREENING_LOG_FILE"] = ""
+os.environ["SESSION_SECRET"] = "zeldacli-test-session-secret-0123456789"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+import main
+
+@pytest.fixture
+def storage(monkeypatch):
+    memory = main.MemoryStorage(password_rounds=4)
+    monkeypatch.setattr(main, "storage", memory)
+    return memory
+
+@pytest.fixture
+def register(storage):
+    def register(username, deposit=None):
+        success, message = storage.register_user(username, "password123", f"User {username}", f"{username}@example.com",
+                                                 "+10000000000", "1 Test Street", datetime.date(1990, 1, 1))
+        assert success, message
+        user_id = storage.get_user_id_by_username(username)
+        if deposit is not None:
+            storage.deposit_funds(user_id, deposit)
+        return user_id
+    return register
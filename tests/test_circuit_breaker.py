@@ -0,0 +1,105 @@
+import psycopg2
+import pytest
+
+import main
+from main import CircuitBreaker
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(main.time, "monotonic", clock)
+    return clock
+
+def test_opens_after_the_failure_threshold(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_seconds=10)
+    for _ in range(2):
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.CLOSED
+        assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.is_open() and breaker.rejecting()
+    assert not breaker.allow()
+    assert breaker.retry_in() == 10
+
+def test_success_resets_the_failure_count(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=10)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+def test_admits_a_single_probe_after_the_reset_interval(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=10)
+    breaker.record_failure()
+    clock.now += 9.5
+    assert not breaker.allow()
+    clock.now += 0.5
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+    assert breaker.rejecting()
+
+def test_probe_success_closes_and_probe_failure_reopens(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=10)
+    breaker.record_failure()
+    clock.now += 10
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.retry_in() == 10
+
+    clock.now += 10
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert not breaker.rejecting()
+
+@pytest.fixture
+def breakers(monkeypatch):
+    breakers = main.CircuitBreakers()
+    monkeypatch.setattr(main, "db_circuits", breakers)
+    monkeypatch.setattr(main, "print_message", lambda message, kind="info": None)
+    monkeypatch.setattr(main, "DB_CONNECT_RETRIES", 0)
+    return breakers
+
+def test_breakers_are_kept_per_database(breakers):
+    assert breakers.get("postgresql:///a") is breakers.get("postgresql:///a")
+    assert breakers.get("postgresql:///a") is not breakers.get("postgresql:///b")
+    with main.on_shard("postgresql:///b"):
+        assert breakers.get() is breakers.get("postgresql:///b")
+
+def test_failing_shard_does_not_open_the_primary(breakers, monkeypatch):
+    def connect(dsn, *args, **kwargs):
+        raise psycopg2.OperationalError(f"could not connect to {dsn}")
+
+    monkeypatch.setattr(main.psycopg2, "connect", connect)
+    with main.on_shard("postgresql:///shard"):
+        for _ in range(main.CIRCUIT_FAILURE_THRESHOLD):
+            assert main.get_db_connection() is None
+    assert breakers.get("postgresql:///shard").is_open()
+    assert not breakers.get().is_open()
+
+def test_probe_interrupted_by_any_exception_reopens_the_breaker(breakers, clock, monkeypatch):
+    dsn = "postgresql:///probe"
+    breaker = breakers.get(dsn)
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    clock.now += breaker.reset_seconds
+
+    def interrupted(*args, **kwargs):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(main, "open_db_connection", interrupted)
+    with main.on_shard(dsn), pytest.raises(KeyboardInterrupt):
+        main.get_db_connection()
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now += breaker.reset_seconds
+    assert breaker.allow()
@@ -0,0 +1,71 @@
+from decimal import Decimal
+
+import pytest
+
+from main import Money, split_amount
+
+def test_parse_rounds_half_up_to_cents():
+    assert Money.parse("10.005").cents == 1001
+    assert Money.parse("-0.015").cents == -2
+    assert Money.parse(3).cents == 300
+    assert Money.parse(Decimal("1.10")).cents == 110
+
+@pytest.mark.parametrize("value", ["abc", "NaN", "Infinity", ""])
+def test_parse_rejects_invalid_amounts(value):
+    with pytest.raises(ValueError):
+        Money.parse(value)
+
+def test_from_db_and_to_decimal_round_trip():
+    money = Money.from_db(Decimal("1234.56"))
+    assert money.cents == 123456
+    assert money.to_decimal() == Decimal("1234.56")
+    assert Money.from_db(None) is None
+
+def test_arithmetic_stays_in_cents():
+    assert Money.parse("0.10") + Money.parse("0.20") == Money.parse("0.30")
+    assert Money.parse("5.00") - 2 == Money.parse("3.00")
+    assert 10 - Money.parse("0.01") == Money.parse("9.99")
+    assert Money.parse("1.50") + Decimal("0.25") == Money.parse("1.75")
+    assert Money.parse("10.00") * Decimal("0.015") == Money.parse("0.15")
+    assert -Money.parse("1.00") == Money(-100)
+    assert abs(Money(-250)) == Money(250)
+    assert Money.total([Money(1), Money(2), Money(3)]) == Money(6)
+
+def test_arithmetic_rejects_sub_cent_operands():
+    with pytest.raises(TypeError):
+        Money.parse("1.00") + Decimal("0.001")
+    with pytest.raises(TypeError):
+        Money.parse("1.00") < Decimal("1.005")
+
+def test_equality_is_exact():
+    money = Money.parse("1.50")
+    assert money == Decimal("1.5")
+    assert money == Decimal("1.50000")
+    assert money == 1.5
+    assert money != Decimal("1.505")
+    assert money != Decimal("1.495")
+    assert Money(100) == 1
+    assert money != "1.50"
+
+def test_equal_values_hash_alike():
+    assert hash(Money.parse("1.50")) == hash(Decimal("1.5")) == hash(1.5)
+    assert hash(Money(100)) == hash(1)
+    assert len({Money.parse("2.00"), Decimal("2"), 2}) == 1
+
+def test_ordering_and_truthiness():
+    assert Money(1) > 0
+    assert Money.parse("0.99") < 1
+    assert Money(0) <= Decimal("0")
+    assert not Money(0)
+    assert Money(-1)
+
+def test_formatting():
+    assert str(Money(-5)) == "-0.05"
+    assert f"{Money(123456):.2f}" == "1234.56"
+    assert f"{Money(123456):,.2f}" == "1,234.56"
+    assert repr(Money(150)) == "Money('1.50')"
+
+def test_split_amount_spreads_the_remainder():
+    shares = split_amount(Money.parse("10.00"), 3)
+    assert shares == [Money(334), Money(333), Money(333)]
+    assert Money.total(shares) == Money.parse("10.00")
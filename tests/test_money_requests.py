@@ -0,0 +1,77 @@
+from main import Money
+
+def pending_ids(storage, user_id):
+    return sorted(request.request_id for request in storage.iter_money_requests(user_id))
+
+def test_split_request_divides_the_amount(register, storage):
+    alice = register("alice")
+    bob = register("bob")
+    carol = register("carol")
+
+    success, message = storage.request_money_split(alice, ["bob", " carol ", "bob"], "10.00")
+    assert success
+    assert message == "Split $10.00 into 2 money requests: bob $5.00, carol $5.00."
+    assert [request.amount for request in storage.iter_money_requests(bob)] == [Money.parse("5.00")]
+    assert [request.from_username for request in storage.iter_money_requests(carol)] == ["alice"]
+
+def test_split_request_can_include_the_requester(register, storage):
+    alice = register("alice")
+    register("bob")
+    register("carol")
+
+    success, message = storage.request_money_split(alice, ["bob", "carol"], "10.00", include_self=True)
+    assert success
+    assert message == "Split $10.00 into 2 money requests: bob $3.34, carol $3.33."
+
+def test_split_request_validates_every_recipient(register, storage):
+    alice = register("alice")
+    register("bob")
+    register("carol")
+
+    assert storage.request_money_split(alice, ["bob", "nobody"], "10") == (False, "User(s) not found: nobody.")
+    assert storage.request_money_split(alice, ["bob", "alice"], "10") == (False, "You cannot request money from yourself.")
+    assert storage.request_money_split(alice, ["bob"], "0") == (False, "Request amount must be positive.")
+    assert storage.request_money_split(alice, [" "], "10") == (False, "Enter at least one username to split with.")
+    assert storage.request_money_split(alice, ["bob", "carol"], "0.01") == (False, "$0.01 is too small to split 2 ways.")
+    assert storage.money_requests == {}
+
+def test_bulk_accept_moves_the_total_once(register, storage):
+    alice = register("alice")
+    bob = register("bob")
+    carol = register("carol", "50")
+    storage.request_money(alice, "carol", "10")
+    storage.request_money(bob, "carol", "15.50")
+    request_ids = pending_ids(storage, carol)
+
+    success, message = storage.respond_to_money_requests(request_ids, carol, "accept", idempotency_key="bulk-1")
+    assert (success, message) == (True, "Accepted 2 money request(s). $25.50 transferred.")
+    assert storage.respond_to_money_requests(request_ids, carol, "accept", idempotency_key="bulk-1") == (success, message)
+    assert storage.get_user_account(carol).balance == Money.parse("24.50")
+    assert storage.get_user_account(alice).balance == Money.parse("10")
+    assert storage.get_user_account(bob).balance == Money.parse("15.50")
+    assert pending_ids(storage, carol) == []
+
+def test_bulk_accept_is_all_or_nothing(register, storage):
+    alice = register("alice")
+    bob = register("bob", "12")
+    storage.request_money(alice, "bob", "10")
+    storage.request_money(alice, "bob", "5")
+    request_ids = pending_ids(storage, bob)
+
+    success, message = storage.respond_to_money_requests(request_ids, bob, "accept")
+    assert not success
+    assert message == "Insufficient balance to accept 2 request(s) totalling $15.00."
+    assert storage.get_user_account(bob).balance == Money.parse("12")
+    assert pending_ids(storage, bob) == request_ids
+
+def test_bulk_response_reports_unknown_requests(register, storage):
+    alice = register("alice")
+    bob = register("bob")
+    storage.request_money(alice, "bob", "10")
+    request_id = pending_ids(storage, bob)[0]
+
+    assert storage.respond_to_money_requests([request_id, 999], bob, "decline") == \
+        (False, "Money request(s) 999 not found or already processed.")
+    assert storage.respond_to_money_requests([request_id, request_id], bob, "decline") == (True, "Declined 1 money request(s).")
+    assert pending_ids(storage, bob) == []
+    assert storage.respond_to_money_requests([], bob, "decline") == (False, "Enter at least one request ID.")
@@ -0,0 +1,122 @@
+import psycopg2
+import pytest
+
+import main
+
+class FakeIdempotencyTable:
+    def __init__(self):
+        self.rows = {}
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.closed = False
+        self._result = None
+
+    def execute(self, query, params=()):
+        rows = self.conn.pending
+        if query.startswith("INSERT INTO idempotency_keys"):
+            key, user_id, operation = params
+            if key in rows:
+                self._result = None
+            else:
+                rows[key] = [user_id, operation, None, None]
+                self._result = (key,)
+        elif query.startswith("SELECT user_id, operation, success, message FROM idempotency_keys"):
+            self._result = tuple(rows[params[0]])
+        elif query.startswith("UPDATE idempotency_keys"):
+            success, message, key = params
+            rows[key][2:] = [success, message]
+        else:
+            raise AssertionError(f"unexpected query: {query}")
+
+    def fetchone(self):
+        return self._result
+
+    def close(self):
+        self.closed = True
+
+class FakeConnection:
+    def __init__(self, table):
+        self.table = table
+        self.pending = {key: list(row) for key, row in table.rows.items()}
+        self.closed = False
+
+    def set_session(self, **kwargs):
+        pass
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.table.rows = {key: list(row) for key, row in self.pending.items()}
+
+    def rollback(self):
+        self.pending = {key: list(row) for key, row in self.table.rows.items()}
+
+    def close(self):
+        self.closed = True
+
+@pytest.fixture
+def table(monkeypatch):
+    table = FakeIdempotencyTable()
+    monkeypatch.setattr(main, "get_db_connection", lambda *args, **kwargs: FakeConnection(table))
+    monkeypatch.setattr(main.time, "sleep", lambda seconds: None)
+    return table
+
+def test_serialization_failure_is_retried_and_the_result_stored(table):
+    calls = []
+
+    def body(cur):
+        calls.append(len(calls))
+        if len(calls) == 1:
+            raise psycopg2.errors.SerializationFailure("could not serialize access")
+        return True, "Transferred $5.00."
+
+    assert main.run_money_transaction("transfer_funds", 1, body, "key-1") == (True, "Transferred $5.00.")
+    assert len(calls) == 2
+    assert table.rows["key-1"] == [1, "transfer_funds", True, "Transferred $5.00."]
+
+def test_replayed_key_returns_the_stored_result_without_running_the_body(table):
+    main.run_money_transaction("transfer_funds", 1, lambda cur: (True, "Transferred $5.00."), "key-2")
+
+    def body(cur):
+        raise AssertionError("body must not run twice for one idempotency key")
+
+    assert main.run_money_transaction("transfer_funds", 1, body, "key-2") == (True, "Transferred $5.00.")
+
+def test_key_reused_for_another_operation_is_refused(table):
+    main.run_money_transaction("transfer_funds", 1, lambda cur: (True, "done"), "key-3")
+    success, message = main.run_money_transaction("pay_bill", 1, lambda cur: (True, "paid"), "key-3")
+    assert not success
+    assert "different operation" in message
+
+def test_failed_body_releases_the_key(table):
+    assert main.run_money_transaction("transfer_funds", 1, lambda cur: (False, "Insufficient balance."), "key-4") == (False, "Insufficient balance.")
+    assert "key-4" not in table.rows
+    assert main.run_money_transaction("transfer_funds", 1, lambda cur: (True, "done"), "key-4") == (True, "done")
+
+def test_retries_give_up_after_the_limit(table, monkeypatch):
+    monkeypatch.setattr(main, "MONEY_MAX_RETRIES", 2)
+    calls = []
+
+    def body(cur):
+        calls.append(1)
+        raise psycopg2.errors.DeadlockDetected("deadlock detected")
+
+    success, message = main.run_money_transaction("transfer_funds", 1, body, "key-5")
+    assert not success
+    assert "failed after 3 attempts" in message
+    assert len(calls) == 3
+    assert "key-5" not in table.rows
+
+def test_memory_transfer_is_applied_once_per_key(register, storage):
+    sender = register("alice", "100")
+    recipient = register("bob")
+    account_number = storage.get_user_account(recipient).account_number
+
+    first = storage.transfer_funds(sender, account_number, "25", idempotency_key="transfer-1")
+    second = storage.transfer_funds(sender, account_number, "25", idempotency_key="transfer-1")
+    assert first == second == (True, f"Successfully transferred $25.00 to account {account_number}.")
+    assert storage.get_user_account(sender).balance == main.Money.parse("75")
+    assert storage.get_user_account(recipient).balance == main.Money.parse("25")
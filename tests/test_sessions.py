@@ -0,0 +1,61 @@
+import pytest
+
+import main
+
+@pytest.fixture
+def tokens(storage):
+    return main.SessionTokens(ttl=3600, revocation_ttl=30)
+
+def test_issued_token_validates_to_its_user(tokens, register):
+    alice = register("alice")
+    token = tokens.issue(alice)
+    assert token is not None
+    assert tokens.validate(token) == alice
+
+def test_tampered_or_malformed_tokens_are_rejected(tokens, register):
+    alice = register("alice")
+    session_id, user_id, expires_at, signature = tokens.issue(alice).split(".")
+    assert tokens.validate(f"{session_id}.{int(user_id) + 1}.{expires_at}.{signature}") is None
+    assert tokens.validate(f"{session_id}.{user_id}.{int(expires_at) + 60}.{signature}") is None
+    assert tokens.validate("not-a-token") is None
+    assert tokens.validate(None) is None
+
+def test_expired_token_is_rejected(storage, register):
+    tokens = main.SessionTokens(ttl=-1)
+    token = tokens.issue(register("alice"))
+    assert tokens.validate(token) is None
+
+def test_revoked_token_is_rejected_in_every_process(tokens, storage, register):
+    alice = register("alice")
+    token = tokens.issue(alice)
+    other_process = main.SessionTokens()
+    assert other_process.validate(token) == alice
+
+    assert tokens.revoke(token)
+    assert tokens.validate(token) is None
+    other_process.revocations.clear()
+    assert other_process.validate(token) is None
+
+def test_revoke_user_ends_all_of_their_sessions(tokens, register):
+    alice = register("alice")
+    bob = register("bob")
+    alice_tokens = [tokens.issue(alice), tokens.issue(alice)]
+    bob_token = tokens.issue(bob)
+
+    assert tokens.revoke_user(alice)
+    assert [tokens.validate(token) for token in alice_tokens] == [None, None]
+    assert tokens.validate(bob_token) == bob
+
+def test_unknown_session_is_rejected(tokens, storage, register):
+    alice = register("alice")
+    token = tokens.issue(alice)
+    storage.sessions.clear()
+    tokens.revocations.clear()
+    assert tokens.validate(token) is None
+
+def test_short_session_secret_refuses_to_sign(monkeypatch):
+    monkeypatch.setattr(main, "print_message", lambda message, kind="info": None)
+    assert main.load_session_secret("too-short") is None
+    tokens = main.SessionTokens()
+    monkeypatch.setattr(main, "load_session_secret", lambda: None)
+    assert tokens.issue(1) is None
@@ -0,0 +1,57 @@
+import contextlib
+
+import pytest
+
+from main import Money, VelocityScreen, parse_velocity_limits
+
+@pytest.fixture
+def screen():
+    return VelocityScreen(parse_velocity_limits("minute:3:100,hour:5:150"))
+
+def test_count_limit_blocks_within_the_window(screen):
+    for second in range(3):
+        assert screen.check(1, "10", "transfer", now=1000 + second) == (True, "")
+        screen.record(1, "10", at=1000 + second)
+    allowed, reason = screen.check(1, "10", "transfer", now=1010)
+    assert not allowed
+    assert "at most 3" in reason and "minute" in reason
+
+def test_amount_limit_includes_the_new_operation(screen):
+    screen.record(1, "90", at=1000)
+    assert screen.check(1, "10", "withdraw", now=1001)[0]
+    allowed, reason = screen.check(1, "10.01", "withdraw", now=1001)
+    assert not allowed
+    assert "$100.00 per minute" in reason
+
+def test_longer_window_keeps_counting_after_the_short_one_expires(screen):
+    for second in range(3):
+        screen.record(1, "10", at=1000 + second)
+    assert screen.check(1, "10", "transfer", now=1070)[0]
+    screen.record(1, "10", at=1070)
+    screen.record(1, "10", at=1071)
+    allowed, reason = screen.check(1, "10", "transfer", now=1080)
+    assert not allowed
+    assert "hour" in reason
+
+def test_limits_are_per_user(screen):
+    screen.record(1, "100", at=1000)
+    assert not screen.check(1, "1", "transfer", now=1000)[0]
+    assert screen.check(2, "1", "transfer", now=1000)[0]
+
+def test_old_operations_expire(screen):
+    screen.record(1, "100", at=1000)
+    assert screen.check(1, "100", "transfer", now=1000 + 3600 + 600)[0]
+
+def test_empty_limits_disable_screening():
+    screen = VelocityScreen(parse_velocity_limits(""))
+    screen.record(1, Money.parse("1000000"))
+    assert screen.check(1, "1000000", "transfer") == (True, "")
+    assert isinstance(screen.guard(1), contextlib.nullcontext)
+
+def test_guards_are_striped_reentrant_locks(screen):
+    guard = screen.guard(42)
+    assert guard is screen.guard(42)
+    with guard:
+        with screen.guard(42):
+            pass
+    assert len({id(screen.guard(user_id)) for user_id in range(10_000)}) <= len(screen._guards)